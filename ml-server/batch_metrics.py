@@ -0,0 +1,85 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+# scipy ships with ImageHash; phash needs its exact DCT routine to stay bit-identical
+# (a NumPy DCT differs in float rounding, which flips bits at the median and would
+# make duplicate decisions depend on what is installed), so without scipy there is no phash
+try:
+    import scipy.fftpack as fftpack  # pip install scipy
+except ImportError:
+    fftpack = None
+
+PHASH_AVAILABLE = fftpack is not None
+
+# Optional: OpenCV is faster for grayscale conversion + Laplacian; NumPy covers the rest
+try:
+    import cv2  # pip install opencv-python
+except ImportError:
+    cv2 = None
+
+# ---------------- Batched image metrics ----------------
+# Perceptual hash and blur (variance of Laplacian) over stacks of small grayscale
+# images. phash matches imagehash.phash(img) bit-for-bit (hash_size=8,
+# highfreq_factor=4): per-image LANCZOS 32x32 luma thumbnail, then one DCT,
+# median and bit-pack for the whole batch instead of one per image.
+
+HASH_SIZE = 8
+PHASH_THUMB = HASH_SIZE * 4  # imagehash highfreq_factor=4
+
+def phash_thumb(pil_img: Image.Image) -> np.ndarray:
+    """32x32 uint8 luma thumbnail, exactly as imagehash.phash prepares it."""
+    return np.asarray(pil_img.convert("L").resize((PHASH_THUMB, PHASH_THUMB), Image.LANCZOS))
+
+def _dct2_rows_cols(stack: np.ndarray) -> np.ndarray:
+    if fftpack is None:
+        raise ImportError("phash needs scipy (pip install scipy)")
+    return fftpack.dct(fftpack.dct(stack, axis=1), axis=2)
+
+def phash_from_thumbs(thumbs: np.ndarray) -> List[str]:
+    """(N, 32, 32) uint8 thumbnails -> N hex strings, same format as str(imagehash.phash())."""
+    if len(thumbs) == 0:
+        return []
+    dct = _dct2_rows_cols(thumbs)
+    low = dct[:, :HASH_SIZE, :HASH_SIZE].reshape(len(thumbs), HASH_SIZE * HASH_SIZE)
+    med = np.median(low, axis=1)
+    bits = low > med[:, None]
+    return [row.tobytes().hex() for row in np.packbits(bits, axis=1)]
+
+def phash_batch(images: Sequence[Image.Image]) -> List[str]:
+    return phash_from_thumbs(np.stack([phash_thumb(im) for im in images])) if images else []
+
+def phash(pil_img: Image.Image) -> str:
+    return phash_batch([pil_img])[0]
+
+def to_gray_array(pil_img: Image.Image) -> np.ndarray:
+    """2-D uint8 luma array (OpenCV's RGB->GRAY weights when available, Pillow's 'L' otherwise)."""
+    if pil_img.mode == "L":
+        return np.asarray(pil_img)
+    if cv2 is not None and pil_img.mode == "RGB":
+        return cv2.cvtColor(np.asarray(pil_img), cv2.COLOR_RGB2GRAY)
+    return np.asarray(pil_img.convert("L"))
+
+def laplacian_var_batch(grays: np.ndarray) -> np.ndarray:
+    """
+    Variance of the 4-neighbour Laplacian for a (N, H, W) stack, with the same
+    kernel and reflect-101 border as cv2.Laplacian(gray, cv2.CV_64F).
+    """
+    g = np.asarray(grays, dtype=np.float64)
+    p = np.pad(g, ((0, 0), (1, 1), (1, 1)), mode="reflect")
+    lap = (p[:, :-2, 1:-1] + p[:, 2:, 1:-1] + p[:, 1:-1, :-2] + p[:, 1:-1, 2:]
+           - 4.0 * p[:, 1:-1, 1:-1])
+    return lap.reshape(len(g), -1).var(axis=1)
+
+def laplacian_var(gray: np.ndarray) -> float:
+    if cv2 is not None:
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    return float(laplacian_var_batch(gray[None, ...])[0])
+
+def blur_variance(pil_img: Image.Image) -> Optional[float]:
+    """Laplacian variance of one image (OpenCV if installed, else NumPy)."""
+    gray = to_gray_array(pil_img)
+    if gray.ndim != 2:
+        return None
+    return laplacian_var(gray)
@@ -0,0 +1,90 @@
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Run from anywhere: make ml-server/ importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import clean_dataset as cd  # noqa: E402
+
+# ---------------- Full vs fast-check decode for the analyze stage ----------------
+# Each mode runs in its own child process so peak RSS is measured independently.
+
+def make_large_jpegs(out_dir: Path, n: int, size=(4000, 3000), seed: int = 0):
+    """Field-photo-sized JPEGs with some texture (so blur/phash have real work to do)."""
+    import numpy as np
+    from PIL import Image
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    w, h = size
+    for i in range(n):
+        path = out_dir / f"field_{i:03d}.jpg"
+        if path.exists():
+            continue
+        coarse = (rng.random((h // 8, w // 8, 3)) * 255).astype("uint8")
+        img = Image.fromarray(coarse).resize((w, h), Image.BICUBIC)
+        noise = rng.integers(-12, 12, (h, w, 3), dtype=np.int16)
+        arr = np.clip(np.asarray(img, dtype=np.int16) + noise, 0, 255).astype("uint8")
+        Image.fromarray(arr).save(path, quality=90)
+    return sorted(out_dir.glob("*.jpg"))
+
+def peak_rss_mb() -> float:
+    # VmHWM resets on exec; ru_maxrss would inherit the parent's peak from before the fork
+    try:
+        with open("/proc/self/status") as fp:
+            for line in fp:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+def run_child(mode: str, images, use_blur: bool):
+    fast = mode == "fast"
+    t0 = time.perf_counter()
+    for p in images:
+        cd.analyze_image(p, use_blur=use_blur, use_dupes=True, fast_check=fast)
+    dt = time.perf_counter() - t0
+    print(json.dumps({"mode": mode, "n": len(images), "seconds": dt,
+                      "img_per_s": len(images) / dt if dt else 0.0, "peak_rss_mb": peak_rss_mb()}))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and peak RSS: full decode vs --fast-check")
+    parser.add_argument("--images", default="", help="folder of sample photos (default: synthesize)")
+    parser.add_argument("--synth-dir", default="/tmp/agritech_bench_large", help="where to synthesize samples")
+    parser.add_argument("--n", type=int, default=24, help="number of synthesized photos")
+    parser.add_argument("--no-blur", action="store_true", help="skip the blur measurement")
+    parser.add_argument("--child", choices=["full", "fast"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.images:
+        images = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in cd.VALID_EXTS)
+    else:
+        images = make_large_jpegs(Path(args.synth_dir), args.n)
+    use_blur = not args.no_blur
+
+    if args.child:
+        run_child(args.child, images, use_blur)
+        raise SystemExit(0)
+
+    print(f"Samples: {len(images)} images, blur={'ON' if use_blur else 'OFF'}, phash=ON")
+    results = {}
+    for mode in ("full", "fast"):
+        cmd = [sys.executable, __file__, "--child", mode, "--synth-dir", args.synth_dir, "--n", str(args.n)]
+        if args.images:
+            cmd += ["--images", args.images]
+        if args.no_blur:
+            cmd.append("--no-blur")
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.strip().splitlines()[-1]
+        results[mode] = json.loads(out)
+
+    print(f"{'mode':<6} {'img/s':>8} {'peak RSS MB':>12}")
+    for mode, r in results.items():
+        print(f"{mode:<6} {r['img_per_s']:>8.2f} {r['peak_rss_mb']:>12.1f}")
+    full, fast = results["full"], results["fast"]
+    print(f"\nThroughput gain: {fast['img_per_s'] / full['img_per_s']:.2f}x, "
+          f"peak RSS: {full['peak_rss_mb']:.0f} -> {fast['peak_rss_mb']:.0f} MB")
@@ -0,0 +1,133 @@
+import argparse
+import http.client
+import io
+import json
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+from PIL import Image
+
+SERVER = Path(__file__).resolve().parents[1] / "inference_server.py"
+
+# ---------------- Load test for inference_server.py ----------------
+# Each concurrency level runs `clients` threads, each with its own keep-alive
+# connection, sending POST /predict back to back. Reports latency percentiles,
+# throughput and the average micro-batch the server formed.
+
+def sample_payloads(images_dir: str, n: int = 8, seed: int = 0):
+    if images_dir:
+        files = sorted(p for p in Path(images_dir).iterdir() if p.suffix.lower() in {".jpg", ".jpeg", ".png"})
+        return [p.read_bytes() for p in files[:n]]
+    # Mid-brightness textured photos that pass the quality pre-checks
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        coarse = (rng.random((60, 80, 3)) * 120 + 60).astype("uint8")
+        buf = io.BytesIO()
+        Image.fromarray(coarse).resize((640, 480), Image.BICUBIC).save(buf, format="JPEG", quality=90)
+        out.append(buf.getvalue())
+    return out
+
+def wait_ready(host: str, port: int, timeout: float = 120.0) -> None:
+    t_end = time.time() + timeout
+    while time.time() < t_end:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"❌ server on {host}:{port} did not come up")
+
+def run_level(host: str, port: int, payloads, clients: int, requests_per_client: int):
+    latencies, batch_sizes, errors = [], [], []
+    lock = threading.Lock()
+
+    def client(k: int):
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        mine, sizes = [], []
+        for i in range(requests_per_client):
+            body = payloads[(k + i) % len(payloads)]
+            t0 = time.perf_counter()
+            try:
+                conn.request("POST", "/predict", body=body, headers={"Content-Type": "image/jpeg"})
+                resp = conn.getresponse()
+                data = json.loads(resp.read())
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                with lock:
+                    errors.append(repr(e))
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=60)
+                continue
+            mine.append((time.perf_counter() - t0) * 1000)
+            sizes.append(data.get("batch_size", 0))
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            batch_sizes.extend(sizes)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {"clients": clients, "requests": len(latencies), "errors": len(errors),
+            "p50_ms": float(np.percentile(lat, 50)), "p99_ms": float(np.percentile(lat, 99)),
+            "rps": len(latencies) / wall if wall else 0.0,
+            "avg_batch": float(np.mean(batch_sizes)) if batch_sizes else 0.0}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="p50/p99 latency and throughput of inference_server.py")
+    parser.add_argument("--url", default="", help="existing server, e.g. http://127.0.0.1:8000 "
+                                                   "(default: start one for the run)")
+    parser.add_argument("--model", default="", help="best_model.keras for the started server")
+    parser.add_argument("--dummy", action="store_true", help="start the server with its fake model (no TF)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-delay-ms", type=float, default=10.0)
+    parser.add_argument("--concurrency", default="1,4,16,32", help="comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=50, help="requests per client per level")
+    parser.add_argument("--images", default="", help="folder of sample photos (default: synthesize)")
+    parser.add_argument("--out", default="", help="write results as JSON here")
+    args = parser.parse_args()
+
+    proc = None
+    if args.url:
+        u = urlparse(args.url)
+        host, port = u.hostname, u.port or 80
+    else:
+        if not args.dummy and not args.model:
+            raise SystemExit("❌ pass --url, --model or --dummy")
+        host, port = "127.0.0.1", args.port
+        cmd = [sys.executable, str(SERVER), "--port", str(port), "--max-batch", str(args.max_batch),
+               "--max-delay-ms", str(args.max_delay_ms)]
+        cmd += ["--dummy"] if args.dummy else ["--model", args.model]
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    try:
+        wait_ready(host, port)
+        payloads = sample_payloads(args.images)
+        run_level(host, port, payloads, 2, 5)  # warm-up (first-call tracing, connections)
+        results = []
+        print(f"{'clients':>7} {'reqs':>6} {'err':>4} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8} {'avg batch':>9}")
+        for c in [int(x) for x in args.concurrency.split(",") if x]:
+            r = run_level(host, port, payloads, c, args.requests)
+            results.append(r)
+            print(f"{r['clients']:>7} {r['requests']:>6} {r['errors']:>4} {r['p50_ms']:>8.1f} "
+                  f"{r['p99_ms']:>8.1f} {r['rps']:>8.1f} {r['avg_batch']:>9.2f}")
+        if args.out:
+            Path(args.out).write_text(json.dumps({"max_batch": args.max_batch, "max_delay_ms": args.max_delay_ms,
+                                                  "results": results}, indent=2), encoding="utf-8")
+            print(f"Saved: {args.out}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
@@ -0,0 +1,69 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Run from anywhere: make ml-server/ importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import batch_metrics as bm  # noqa: E402
+
+try:
+    import imagehash
+except ImportError:
+    imagehash = None
+
+# ---------------- Batched phash/blur vs per-image imagehash/cv2 ----------------
+
+def sample_images(n: int, seed: int):
+    """Mixed content: noise, flat fills (median ties) and blocky textures, various sizes."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(n):
+        kind = i % 3
+        if kind == 0:
+            arr = (rng.random((200 + i % 50, 300, 3)) * 255).astype("uint8")
+        elif kind == 1:
+            arr = np.full((256, 256, 3), i % 256, dtype="uint8")
+        else:
+            arr = np.kron((rng.random((8, 8, 3)) * 255).astype("uint8"), np.ones((40, 40, 1), "uint8"))
+        out.append(Image.fromarray(arr))
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check bit-identity and time batched metrics")
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    images = sample_images(args.n, args.seed)
+
+    t0 = time.perf_counter()
+    batched = bm.phash_batch(images)
+    t_batch = time.perf_counter() - t0
+    print(f"batch_metrics.phash_batch: {t_batch / len(images) * 1e6:8.1f} us/image")
+
+    if imagehash is not None:
+        t0 = time.perf_counter()
+        ref = [str(imagehash.phash(im)) for im in images]
+        t_ref = time.perf_counter() - t0
+        mismatches = sum(a != b for a, b in zip(batched, ref))
+        print(f"imagehash.phash (per image): {t_ref / len(images) * 1e6:6.1f} us/image")
+        print(f"bit-identical: {len(images) - mismatches}/{len(images)}")
+        if mismatches:
+            raise SystemExit("❌ batched phash differs from imagehash")
+
+    grays = np.stack([bm.to_gray_array(im.resize((256, 256))) for im in images])
+    t0 = time.perf_counter()
+    lv_batch = bm.laplacian_var_batch(grays)
+    t_lb = time.perf_counter() - t0
+    print(f"laplacian_var_batch (NumPy): {t_lb / len(images) * 1e6:6.1f} us/image (256x256)")
+    if bm.cv2 is not None:
+        t0 = time.perf_counter()
+        lv_cv = np.array([bm.cv2.Laplacian(g, bm.cv2.CV_64F).var() for g in grays])
+        t_cv = time.perf_counter() - t0
+        print(f"cv2.Laplacian per image:     {t_cv / len(images) * 1e6:6.1f} us/image")
+        print(f"max |NumPy - cv2| blur var:  {np.max(np.abs(lv_batch - lv_cv)):.3g}")
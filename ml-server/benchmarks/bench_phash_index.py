@@ -0,0 +1,94 @@
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Run from anywhere: make ml-server/ importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from phash_index import PHashIndex, popcount  # noqa: E402
+
+try:
+    import imagehash
+except ImportError:
+    imagehash = None
+
+# ---------------- Synthetic hashes ----------------
+def make_hashes(n: int, dup_rate: float, radius: int, seed: int):
+    """n random 64-bit hashes; dup_rate of them are flipped copies of an earlier one (within radius)."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        if out and rng.random() < dup_rate:
+            h = rng.choice(out)
+            for bit in rng.sample(range(64), rng.randint(0, radius)):
+                h ^= 1 << bit
+        else:
+            h = rng.getrandbits(64)
+        out.append(h)
+    return out
+
+# ---------------- Strategies (same keep/reject loop as clean_dataset) ----------------
+def run_index(hashes, radius):
+    idx = PHashIndex(radius=radius)
+    dups = 0
+    for h in hashes:
+        if idx.any_within(h):
+            dups += 1
+        else:
+            idx.add(h)
+    return dups
+
+def run_linear_int(hashes, radius):
+    kept, dups = [], 0
+    for h in hashes:
+        if any(popcount(h ^ k) <= radius for k in kept):
+            dups += 1
+        else:
+            kept.append(h)
+    return dups
+
+def run_linear_imagehash(hashes, radius):
+    # The original clean_dataset loop: hex strings, hex_to_hash on both sides per comparison
+    kept, dups = [], 0
+    for h in hashes:
+        ph = f"{h:016x}"
+        if any((imagehash.hex_to_hash(ph) - imagehash.hex_to_hash(k)) <= radius for k in kept):
+            dups += 1
+        else:
+            kept.append(ph)
+    return dups
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - t0, out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Near-duplicate index scaling benchmark (1k -> 100k hashes)")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated hash counts")
+    parser.add_argument("--radius", type=int, default=5, help="Hamming radius (PHASH_CUTOFF)")
+    parser.add_argument("--dup-rate", type=float, default=0.2, help="fraction of planted near-duplicates")
+    parser.add_argument("--linear-max", type=int, default=10000,
+                        help="skip linear scans above this size (they are O(n^2))")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    print(f"radius={args.radius} dup_rate={args.dup_rate}")
+    print(f"{'n':>8} {'index s':>10} {'linear-int s':>13} {'linear-imagehash s':>19} {'dups':>7}")
+    for n in sizes:
+        hashes = make_hashes(n, args.dup_rate, args.radius, args.seed)
+        t_idx, dups = timed(run_index, hashes, args.radius)
+
+        t_lin = t_img = None
+        if n <= args.linear_max:
+            t_lin, d_lin = timed(run_linear_int, hashes, args.radius)
+            assert d_lin == dups, "index and linear scan disagree"
+            if imagehash is not None and n <= args.linear_max // 10:
+                t_img, d_img = timed(run_linear_imagehash, hashes, args.radius)
+                assert d_img == dups, "index and imagehash scan disagree"
+
+        fmt = lambda t: f"{t:.3f}" if t is not None else "skipped"
+        print(f"{n:>8} {t_idx:>10.3f} {fmt(t_lin):>13} {fmt(t_img):>19} {dups:>7}")
@@ -0,0 +1,268 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Run from anywhere: make ml-server/ importable
+ML_SERVER = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ML_SERVER))
+
+from bench_phash_index import make_hashes, run_index, timed  # noqa: E402
+from synth_dataset import add_spec_args, generate, read_truth, spec_from_args  # noqa: E402
+
+# ---------------- ml-server benchmark suite on synthetic data ----------------
+# Stages (the pipeline scripts run as child processes with DATASET_PATH, INTERIM_PATH
+# and PROCESSED_PATH pointed into --work, so the real datasets are never touched):
+#   clean    clean_dataset.py --all-crops --with-blur: cold run, then warm (cache) rerun,
+#            img/s, plus how many planted rejects / near-duplicates were caught
+#   dupes    PHashIndex keep/reject loop at 1k..100k hashes (bench_phash_index)
+#   prepare  prepare_v1.py --all-crops per materialize mode, then --split hash with
+#            160px derivatives and a no-change incremental rerun
+#   input    train_tf_v1's input pipeline alone (input_pipeline.benchmark_input) on the
+#            prepared derivatives, img/s; skipped when TensorFlow isn't installed
+# Results go to <work>/results/bench_<time>[_<tag>].json (or --results-dir): host, git commit, dataset
+# fingerprint, settings and a flat {metric: value} map. --compare prints each metric
+# against an earlier result and flags changes for the worse beyond --threshold.
+
+STAGES = ("clean", "dupes", "prepare", "input")
+RESULTS_DIR = "results"  # under --work, kept across runs so --compare latest has a baseline
+DUPE_SIZES = (1000, 10000, 100000)
+PREPARE_MODES = ("copy", "hardlink", "symlink", "manifest-only")
+INPUT_SIZE = 160  # train_tf_v1 IMG_SIZE
+
+# ---------------- Helpers ----------------
+def stage_env(work: Path) -> Dict[str, str]:
+    out = str(work / "out")
+    return {**os.environ, "DATASET_PATH": str(work), "INTERIM_PATH": out, "PROCESSED_PATH": out}
+
+def run_script(work: Path, script: str, *args: str) -> float:
+    """Run an ml-server script against the work dir; wall seconds (raises on failure)."""
+    cmd = [sys.executable, str(ML_SERVER / script), *args]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ML_SERVER, env=stage_env(work), capture_output=True, text=True)
+    seconds = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd[1:])} failed:\n{proc.stdout[-2000:]}{proc.stderr[-2000:]}")
+    return seconds
+
+def higher_is_better(metric: str) -> bool:
+    """Throughput and detection rates; everything else (seconds, µs) is lower-is-better."""
+    return metric.endswith(("_per_s", "caught", "kept"))
+
+# ---------------- Stages ----------------
+def bench_clean(work: Path, crops: List[str], n_images: int, workers: int) -> Dict[str, float]:
+    interim = work / "out" / "interim"
+    if interim.exists():
+        shutil.rmtree(interim)
+    args = ["--all-crops", "--with-blur", "--workers", str(workers)]
+    cold = run_script(work, "clean_dataset.py", *args)
+    warm = run_script(work, "clean_dataset.py", *args)
+
+    # Score the decisions against what synth_dataset planted
+    expected = {"small": "too_small", "aspect": "bad_aspect_ratio", "blur": "blurry",
+                "near_dup": "near_duplicate"}
+    truth = {(r["crop"], r["file"]): r["kind"] for r in read_truth(work)}
+    planted = caught = ok_total = ok_kept = 0
+    for crop in crops:
+        with open(interim / crop / "_clean_index.csv", newline="", encoding="utf-8") as fp:
+            for row in csv.DictReader(fp):
+                kind = truth.get((crop, Path(row["src_path"]).name), "ok")
+                if kind == "ok":
+                    ok_total += 1
+                    ok_kept += row["status_or_reason"] == "ok"
+                else:
+                    planted += 1
+                    caught += row["status_or_reason"] == expected[kind]
+    return {"clean.cold_s": cold, "clean.cold_img_per_s": n_images / cold,
+            "clean.warm_s": warm, "clean.warm_img_per_s": n_images / warm,
+            "clean.planted_caught": caught / max(planted, 1), "clean.ok_kept": ok_kept / max(ok_total, 1)}
+
+def bench_dupes(seed: int, sizes=DUPE_SIZES, radius: int = 5, dup_rate: float = 0.2,
+                repeats: int = 3) -> Dict[str, float]:
+    out = {}
+    for n in sizes:
+        hashes = make_hashes(n, dup_rate, radius, seed)
+        seconds = min(timed(run_index, hashes, radius)[0] for _ in range(repeats))  # best of: less noise
+        out[f"dupes.{n}.us_per_image"] = seconds / n * 1e6
+        out[f"dupes.{n}.img_per_s"] = n / seconds if seconds else 0.0
+    return out
+
+def kept_images(work: Path, crops: List[str]) -> int:
+    n = 0
+    for crop in crops:
+        with open(work / "out" / "interim" / crop / "_clean_index.csv", newline="", encoding="utf-8") as fp:
+            n += sum(1 for row in csv.DictReader(fp) if row["status_or_reason"] == "ok")
+    return n
+
+def bench_prepare(work: Path, crops: List[str]) -> Dict[str, float]:
+    processed = work / "out" / "processed"
+    n = kept_images(work, crops)
+    out = {}
+    for mode in PREPARE_MODES:
+        if processed.exists():
+            shutil.rmtree(processed)
+        seconds = run_script(work, "prepare_v1.py", "--all-crops", "--materialize", mode)
+        out[f"prepare.{mode}_s"] = seconds
+        out[f"prepare.{mode}_files_per_s"] = n / seconds
+    shutil.rmtree(processed)
+    args = ["--all-crops", "--split", "hash", "--derivatives", str(INPUT_SIZE)]
+    out["prepare.deriv_s"] = run_script(work, "prepare_v1.py", *args)
+    out["prepare.incremental_s"] = run_script(work, "prepare_v1.py", *args)
+    return out
+
+def input_child(crop: str, epochs: int, batch: int) -> None:
+    """Runs in a child process (env from stage_env); prints one JSON line."""
+    try:
+        from input_pipeline import LoaderConfig, benchmark_input, select_source
+    except ImportError as e:
+        print(json.dumps({"skipped": f"{e.name or e} not installed"}))
+        return
+    from prepare_v1 import PROCESSED_ROOT
+    src = select_source(PROCESSED_ROOT / crop, (INPUT_SIZE, INPUT_SIZE))
+    results = benchmark_input(src, [LoaderConfig(), LoaderConfig(cache="memory")],
+                              batch_size=batch, epochs=epochs)
+    print(json.dumps({"source": src.describe(),
+                      "img_per_s": {r["config"].split()[0]: r["img_per_s"][-1] for r in results}}))
+
+def bench_input(work: Path, crops: List[str], epochs: int, batch: int) -> Tuple[Dict[str, float], Optional[str]]:
+    if not (work / "out" / "processed" / crops[0] / "manifest.csv").exists():
+        run_script(work, "prepare_v1.py", "--all-crops", "--split", "hash", "--derivatives", str(INPUT_SIZE))
+    cmd = [sys.executable, __file__, "--child-input", crops[0], "--epochs", str(epochs), "--batch", str(batch)]
+    proc = subprocess.run(cmd, cwd=ML_SERVER, env=stage_env(work), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"input benchmark failed:\n{proc.stderr[-2000:]}")
+    res = json.loads(proc.stdout.strip().splitlines()[-1])
+    if "skipped" in res:
+        return {}, res["skipped"]
+    return {f"input.{cfg.replace('=', '_')}_img_per_s": v for cfg, v in res["img_per_s"].items()}, None
+
+# ---------------- Results ----------------
+def git_info() -> Dict[str, object]:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(["git", *args], cwd=ML_SERVER, capture_output=True, text=True).stdout.strip()
+        except OSError:
+            return ""
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", "."))}
+
+def host_info() -> Dict[str, object]:
+    versions = {}
+    for pkg in ("numpy", "Pillow", "scipy", "opencv-python", "tensorflow"):
+        try:
+            versions[pkg] = metadata.version(pkg)
+        except metadata.PackageNotFoundError:
+            pass
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "packages": versions}
+
+def latest_result(results_dir: Path, exclude: Optional[Path] = None) -> Optional[Path]:
+    files = sorted(p for p in results_dir.glob("bench_*.json") if p != exclude)
+    return files[-1] if files else None
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> int:
+    """Print metric-by-metric change; returns how many got worse by more than threshold."""
+    if current["dataset"]["fingerprint"] != baseline["dataset"]["fingerprint"]:
+        print("⚠️  datasets differ (spec or generator changed); numbers are not directly comparable")
+    worse = 0
+    print(f"\n{'metric':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for metric in sorted(set(current["metrics"]) | set(baseline["metrics"])):
+        cur, base = current["metrics"].get(metric), baseline["metrics"].get(metric)
+        if cur is None or base is None:
+            cells = [f"{v:>12.4g}" if v is not None else f"{'-':>12}" for v in (base, cur)]
+            print(f"{metric:<40} {cells[0]} {cells[1]}")
+            continue
+        change = (cur - base) / base if base else 0.0
+        better = change >= 0 if higher_is_better(metric) else change <= 0
+        flag = "" if better or abs(change) <= threshold else "  ❌"
+        worse += bool(flag)
+        print(f"{metric:<40} {base:>12.4g} {cur:>12.4g} {change:>+8.1%}{flag}")
+    return worse
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark clean -> prepare -> input pipeline on a synthetic dataset")
+    parser.add_argument("--work", default="/tmp/agritech_bench_suite", help="synthetic dataset + outputs")
+    add_spec_args(parser)
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"subset of {','.join(STAGES)}")
+    parser.add_argument("--workers", type=int, default=1, help="clean_dataset --workers")
+    parser.add_argument("--epochs", type=int, default=2, help="input stage epochs (the last one is reported)")
+    parser.add_argument("--batch", type=int, default=32, help="input stage batch size")
+    parser.add_argument("--tag", default="", help="suffix for the result file, e.g. a branch name")
+    parser.add_argument("--results-dir", help=f"where result JSONs go (default: <work>/{RESULTS_DIR})")
+    parser.add_argument("--compare", default="latest",
+                        help="result file to compare against, 'latest' (previous run) or 'none'")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if any metric regressed")
+    parser.add_argument("--compare-only", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="compare two stored results without running anything")
+    parser.add_argument("--child-input", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_input:
+        input_child(args.child_input, args.epochs, args.batch)
+        raise SystemExit(0)
+    if args.compare_only:
+        base, cur = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare_only)
+        raise SystemExit(1 if compare(cur, base, args.threshold) and args.fail_on_regression else 0)
+
+    stages = [s for s in args.stages.split(",") if s]
+    if any(s not in STAGES for s in stages):
+        raise SystemExit(f"❌ --stages must be from {', '.join(STAGES)}")
+    work = Path(args.work)
+    work.mkdir(parents=True, exist_ok=True)
+    spec = spec_from_args(args)
+    crops = list(spec.crops)
+
+    t0 = time.perf_counter()
+    dataset = generate(work, spec)
+    print(f"Dataset: {dataset['images']} images ({dataset['bytes'] / 1e6:.1f} MB), planted {dataset['kinds']}, "
+          f"ready in {time.perf_counter() - t0:.1f}s")
+
+    metrics: Dict[str, float] = {}
+    skipped: Dict[str, str] = {}
+    needs_clean = any(s in stages for s in ("prepare", "input"))
+    if "clean" in stages or (needs_clean and not (work / "out" / "interim" / crops[0]).exists()):
+        print("▶  clean")
+        metrics.update(bench_clean(work, crops, dataset["images"], args.workers))
+    if "dupes" in stages:
+        print("▶  dupes")
+        metrics.update(bench_dupes(spec.seed))
+    if "prepare" in stages:
+        print("▶  prepare")
+        metrics.update(bench_prepare(work, crops))
+    if "input" in stages:
+        print("▶  input")
+        found, reason = bench_input(work, crops, args.epochs, args.batch)
+        metrics.update(found)
+        if reason:
+            skipped["input"] = reason
+            print(f"⏭  input skipped: {reason}")
+
+    result = {"started": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": git_info(), "host": host_info(),
+              "dataset": {k: dataset[k] for k in ("spec", "images", "bytes", "kinds", "fingerprint")},
+              "settings": {"stages": stages, "workers": args.workers, "epochs": args.epochs, "batch": args.batch},
+              "skipped": skipped, "metrics": metrics}
+    results_dir = Path(args.results_dir) if args.results_dir else Path(args.work) / RESULTS_DIR
+    results_dir.mkdir(parents=True, exist_ok=True)
+    out = results_dir / f"bench_{time.strftime('%Y%m%d-%H%M%S')}{'_' + args.tag if args.tag else ''}.json"
+    out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+
+    print(f"\n{'metric':<40} {'value':>12}")
+    for metric, value in sorted(metrics.items()):
+        print(f"{metric:<40} {value:>12.4g}")
+    print(f"\n✅ Results: {out}")
+
+    baseline = None if args.compare == "none" else \
+        latest_result(results_dir, exclude=out) if args.compare == "latest" else Path(args.compare)
+    if baseline is not None:
+        print(f"Compared with: {baseline}")
+        worse = compare(result, json.loads(baseline.read_text(encoding="utf-8")), args.threshold)
+        if worse and args.fail_on_regression:
+            raise SystemExit(f"❌ {worse} metric(s) regressed by more than {args.threshold:.0%}")
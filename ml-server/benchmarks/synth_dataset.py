@@ -0,0 +1,178 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import shutil
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+# Run from anywhere: make ml-server/ importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from clean_dataset import ASPECT_MAX, MIN_SIDE  # noqa: E402
+
+# ---------------- Deterministic synthetic raw/ dataset ----------------
+# Writes <out>/raw/<crop>/<class>/ with a planted mix the cleaning rules must sort out:
+#   ok          textured photo-like image, JPEG or PNG, short side in [short_min, short_max]
+#   small       short side below MIN_SIDE                      -> too_small
+#   aspect      aspect ratio beyond ASPECT_MAX                 -> bad_aspect_ratio
+#   blur        heavy Gaussian blur                            -> blurry (with --with-blur)
+#   near_dup    resized / re-encoded / brightened copy of an earlier ok image -> near_duplicate
+# Every image comes from its own seeded RNG, so the same spec gives byte-identical
+# files on any machine with the same Pillow. <out>/synth_truth.csv records what was
+# planted, <out>/synth_spec.json the spec and a fingerprint of the generated bytes;
+# an existing dataset with the same spec is reused instead of regenerated.
+
+GENERATOR_VERSION = 1  # bump when the images change for the same spec
+
+@dataclass
+class SynthSpec:
+    crops: Tuple[str, ...] = ("rice", "tomato")
+    classes: Tuple[str, ...] = ("healthy", "brown_spot", "leaf_blast")
+    per_class: int = 200
+    seed: int = 42
+    short_min: int = 320
+    short_max: int = 640
+    png_rate: float = 0.15
+    small_rate: float = 0.05
+    aspect_rate: float = 0.05
+    blur_rate: float = 0.08
+    dup_rate: float = 0.12
+
+    def key(self) -> str:
+        data = {**asdict(self), "generator": GENERATOR_VERSION}
+        return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+TRUTH_HEADER = ["crop", "class", "file", "kind", "dup_of", "width", "height", "format"]
+
+def texture(rng: np.random.Generator, w: int, h: int, tint: np.ndarray) -> Image.Image:
+    """Leaf-ish texture: coarse random field upsampled plus fine noise (sharp enough for the blur check)."""
+    coarse = (rng.random((max(h // 16, 2), max(w // 16, 2), 3)) * 160 + tint).clip(0, 255).astype("uint8")
+    img = Image.fromarray(coarse).resize((w, h), Image.BICUBIC)
+    noise = rng.integers(-14, 15, (h, w, 3), dtype=np.int16)
+    return Image.fromarray(np.clip(np.asarray(img, dtype=np.int16) + noise, 0, 255).astype("uint8"))
+
+def encode(img: Image.Image, fmt: str, quality: int = 90) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "PNG":
+        img.save(buf, format="PNG", compress_level=1)
+    else:
+        img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+def near_duplicate(src: Image.Image, rng: np.random.Generator) -> Image.Image:
+    """Small resize, brightness change and recompression: same phash neighbourhood, different bytes."""
+    w, h = src.size
+    scale = rng.uniform(0.88, 0.97)
+    img = src.resize((max(int(w * scale), MIN_SIDE), max(int(h * scale), MIN_SIDE)), Image.LANCZOS)
+    return ImageEnhance.Brightness(img).enhance(rng.uniform(0.92, 1.08))
+
+def pick_kind(rng: np.random.Generator, spec: SynthSpec, have_originals: bool) -> str:
+    r = rng.random()
+    for kind, rate in (("small", spec.small_rate), ("aspect", spec.aspect_rate),
+                       ("blur", spec.blur_rate), ("near_dup", spec.dup_rate if have_originals else 0.0)):
+        if r < rate:
+            return kind
+        r -= rate
+    return "ok"
+
+def generate_class(out_root: Path, spec: SynthSpec, ci: int, crop: str, ki: int, cls: str) -> List[List]:
+    folder = out_root / "raw" / crop / cls
+    folder.mkdir(parents=True, exist_ok=True)
+    tint = np.random.default_rng([spec.seed, ci, ki]).integers(0, 96, 3)
+    originals: List[Tuple[str, Image.Image]] = []
+    rows = []
+    for i in range(spec.per_class):
+        rng = np.random.default_rng([spec.seed, ci, ki, i])
+        kind = pick_kind(rng, spec, bool(originals))
+        fmt = "PNG" if rng.random() < spec.png_rate else "JPEG"
+        short = int(rng.integers(spec.short_min, spec.short_max + 1))
+        aspect = rng.uniform(0.75, 1.5)
+        dup_of = ""
+        if kind == "small":
+            short = int(rng.integers(64, MIN_SIDE))
+        elif kind == "aspect":
+            aspect = ASPECT_MAX * rng.uniform(1.2, 1.6)
+        if kind == "near_dup":
+            dup_of, src = originals[int(rng.integers(len(originals)))]
+            img = near_duplicate(src, rng)
+        else:
+            w, h = (int(short * aspect), short) if aspect >= 1 else (short, int(short / aspect))
+            img = texture(rng, w, h, tint)
+            if kind == "blur":
+                img = img.filter(ImageFilter.GaussianBlur(radius=6))
+        name = f"{cls}_{i:05d}.{'png' if fmt == 'PNG' else 'jpg'}"
+        (folder / name).write_bytes(encode(img, fmt, int(rng.integers(80, 96))))
+        if kind == "ok":
+            originals.append((name, img))
+            originals = originals[-32:]  # bounded memory; duplicates come from recent originals
+        rows.append([crop, cls, name, kind, dup_of, img.size[0], img.size[1], fmt])
+    return rows
+
+def tree_fingerprint(raw_root: Path) -> str:
+    h = hashlib.sha1()
+    for p in sorted(raw_root.rglob("*")):
+        if p.is_file():
+            h.update(p.relative_to(raw_root).as_posix().encode())
+            h.update(hashlib.sha1(p.read_bytes()).digest())
+    return h.hexdigest()
+
+def generate(out_root: Path, spec: SynthSpec, force: bool = False) -> Dict:
+    """Create (or reuse) the dataset; returns the synth_spec.json contents."""
+    spec_path = out_root / "synth_spec.json"
+    if not force and spec_path.exists():
+        info = json.loads(spec_path.read_text(encoding="utf-8"))
+        if info.get("key") == spec.key():
+            return info
+    raw = out_root / "raw"
+    if raw.exists():
+        shutil.rmtree(raw)
+    rows = []
+    for ci, crop in enumerate(spec.crops):
+        for ki, cls in enumerate(spec.classes):
+            rows += generate_class(out_root, spec, ci, crop, ki, cls)
+    with open(out_root / "synth_truth.csv", "w", newline="", encoding="utf-8") as fp:
+        w = csv.writer(fp)
+        w.writerow(TRUTH_HEADER)
+        w.writerows(rows)
+    kinds: Dict[str, int] = {}
+    for r in rows:
+        kinds[r[3]] = kinds.get(r[3], 0) + 1
+    info = {"key": spec.key(), "spec": asdict(spec), "images": len(rows), "kinds": kinds,
+            "bytes": sum(p.stat().st_size for p in raw.rglob("*") if p.is_file()),
+            "fingerprint": tree_fingerprint(raw)}
+    spec_path.write_text(json.dumps(info, indent=2), encoding="utf-8")
+    return info
+
+def read_truth(out_root: Path) -> List[Dict[str, str]]:
+    with open(out_root / "synth_truth.csv", newline="", encoding="utf-8") as fp:
+        return list(csv.DictReader(fp))
+
+def spec_from_args(args: argparse.Namespace) -> SynthSpec:
+    return SynthSpec(crops=tuple(c for c in args.crops.split(",") if c),
+                     classes=tuple(c for c in args.classes.split(",") if c),
+                     per_class=args.per_class, seed=args.seed)
+
+def add_spec_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--crops", default="rice,tomato")
+    parser.add_argument("--classes", default="healthy,brown_spot,leaf_blast")
+    parser.add_argument("--per-class", type=int, default=200, help="images per class folder")
+    parser.add_argument("--seed", type=int, default=42)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic raw/ dataset for benchmarks")
+    parser.add_argument("--out", default="/tmp/agritech_synth", help="dataset root (raw/ is created inside)")
+    add_spec_args(parser)
+    parser.add_argument("--force", action="store_true", help="regenerate even if the spec is unchanged")
+    args = parser.parse_args()
+
+    info = generate(Path(args.out), spec_from_args(args), force=args.force)
+    print(f"✅ {info['images']} images ({info['bytes'] / 1e6:.1f} MB) in {Path(args.out) / 'raw'}")
+    print(f"   Planted: {info['kinds']}")
+    print(f"   Fingerprint: {info['fingerprint']}")
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+# ---------------- Persistent per-file cleaning cache ----------------
+# One SQLite file per crop (interim/<crop>/_clean_cache.sqlite). Rows hold the
+# measurements taken from a decoded source image (dimensions, blur variance,
+# exposure, phash) plus the last decision, keyed by source path + size + mtime, with the
+# content hash as a second key so touched-but-unchanged files still hit.
+# Decisions are re-derived from measurements on every run, so changing a
+# threshold does not require re-decoding anything the cache already measured.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    src_path   TEXT PRIMARY KEY,
+    size       INTEGER NOT NULL,
+    mtime_ns   INTEGER NOT NULL,
+    sha1       TEXT NOT NULL,
+    corrupt    INTEGER NOT NULL DEFAULT 0,
+    width      INTEGER,
+    height     INTEGER,
+    blur_var   REAL,
+    luma_mean  REAL,
+    clip_frac  REAL,
+    phash      TEXT,
+    check_side INTEGER NOT NULL DEFAULT 0,
+    decision   TEXT,
+    dst_path   TEXT,
+    updated_at REAL
+);
+"""
+
+COMMIT_EVERY = 256  # rows between commits; an interrupted run loses at most this many
+
+def file_sha1(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class CleanCache:
+    def __init__(self, db_path: Path):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.row_factory = sqlite3.Row
+        # WAL keeps readers happy and makes frequent small commits cheap
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Caches written before check_side existed hold full-resolution measurements
+        cols = {r["name"] for r in self.conn.execute("PRAGMA table_info(files)")}
+        if "check_side" not in cols:
+            self.conn.execute("ALTER TABLE files ADD COLUMN check_side INTEGER NOT NULL DEFAULT 0")
+        for col in ("luma_mean", "clip_frac"):  # exposure stats (quality.py), added later
+            if col not in cols:
+                self.conn.execute(f"ALTER TABLE files ADD COLUMN {col} REAL")
+        self._dirty = 0
+
+    def lookup(self, path: Path, st: os.stat_result) -> Optional[Dict]:
+        """
+        Cached record for path if the file is unchanged, else None.
+        Same size+mtime -> trusted without reading the file. If only the stat
+        changed, the content hash decides (e.g. a copy that refreshed mtime).
+        """
+        row = self.conn.execute("SELECT * FROM files WHERE src_path = ?", (str(path),)).fetchone()
+        if row is None:
+            return None
+        if row["size"] == st.st_size and row["mtime_ns"] == st.st_mtime_ns:
+            return dict(row)
+        if row["size"] == st.st_size and file_sha1(path) == row["sha1"]:
+            self.conn.execute("UPDATE files SET mtime_ns = ? WHERE src_path = ?",
+                              (st.st_mtime_ns, str(path)))
+            self._bump()
+            return dict(row)
+        return None
+
+    def store(self, path: Path, st: os.stat_result, sha1: str, res: Dict,
+              decision: str, dst_path: str = "") -> None:
+        """
+        Record measurements from analyze_image() plus this run's decision.
+        Measurements this run skipped (None) keep their cached value while the
+        content and check resolution are the same.
+        """
+        meta = res.get("meta") or {}
+        w, h = meta.get("width"), meta.get("height")
+        self.conn.execute(
+            "INSERT INTO files (src_path, size, mtime_ns, sha1, corrupt, width, height,"
+            " blur_var, luma_mean, clip_frac, phash, check_side, decision, dst_path, updated_at)"
+            " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
+            " ON CONFLICT(src_path) DO UPDATE SET"
+            " blur_var = COALESCE(excluded.blur_var, CASE WHEN sha1 = excluded.sha1"
+            "   AND check_side = excluded.check_side THEN blur_var END),"
+            " luma_mean = COALESCE(excluded.luma_mean, CASE WHEN sha1 = excluded.sha1"
+            "   AND check_side = excluded.check_side THEN luma_mean END),"
+            " clip_frac = COALESCE(excluded.clip_frac, CASE WHEN sha1 = excluded.sha1"
+            "   AND check_side = excluded.check_side THEN clip_frac END),"
+            " phash = COALESCE(excluded.phash, CASE WHEN sha1 = excluded.sha1"
+            "   AND check_side = excluded.check_side THEN phash END),"
+            " check_side = excluded.check_side, size = excluded.size, mtime_ns = excluded.mtime_ns, sha1 = excluded.sha1,"
+            " corrupt = excluded.corrupt, width = excluded.width, height = excluded.height,"
+            " decision = excluded.decision, dst_path = excluded.dst_path, updated_at = excluded.updated_at",
+            (str(path), st.st_size, st.st_mtime_ns, sha1,
+             1 if res.get("reason") == "corrupt" else 0,
+             int(w) if w is not None else None, int(h) if h is not None else None,
+             res.get("blur_var"), res.get("luma_mean"), res.get("clip_frac"),
+             res.get("phash"), res.get("check_side", 0),
+             decision, dst_path, time.time()),
+        )
+        self._bump()
+
+    def kept_outputs(self) -> Dict[str, str]:
+        """src_path -> dst_path for every file the cache last recorded as kept."""
+        rows = self.conn.execute("SELECT src_path, dst_path FROM files WHERE decision = 'ok'")
+        return {r["src_path"]: r["dst_path"] for r in rows if r["dst_path"]}
+
+    def _bump(self) -> None:
+        self._dirty += 1
+        if self._dirty >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self) -> None:
+        self.conn.commit()
+        self._dirty = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.conn.close()
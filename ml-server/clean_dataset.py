@@ -1,18 +1,20 @@
 import os
 import uuid
+import io
 import csv
+import hashlib
 import shutil
+import time
+from collections import Counter
+from functools import partial
 from pathlib import Path
-from typing import Optional, Dict, Tuple
+from typing import Any, Optional, Dict, List, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
 
-# Pillow + imagehash for robust image handling & near-dup detection
+# Pillow for robust image handling; near-dup phash is computed in batch_metrics
 from PIL import Image, ImageOps, UnidentifiedImageError
-try:
-    import imagehash  # pip install ImageHash
-except ImportError:
-    imagehash = None
 
 # Optional: OpenCV for blur detection (variance of Laplacian)
 try:
@@ -20,12 +22,23 @@ try:
 except ImportError:
     cv2 = None
 
+import batch_metrics as bm
+from clean_cache import CleanCache, COMMIT_EVERY
+from clean_pipeline import StagedPipeline
+from clean_profile import NO_LAP, CleanProfile, Lap, NullLap
+from materialize import MODES as MATERIALIZE_MODES, materialize
+from phash_index import PHashIndex, hex_to_int, popcount
+from quality import measure_batch as measure_quality_batch, quality_issues
+from work_units import WorkUnit, largest_first, list_crops
+
 # ---------------- Config (tweak thresholds here) ----------------
 MIN_SIDE = 256         # reject if min(width, height) < MIN_SIDE
 ASPECT_MIN = 0.5       # reject if (w/h) < 0.5
 ASPECT_MAX = 2.0       # reject if (w/h) > 2.0
 BLUR_VAR_MIN = 80.0    # reject if Laplacian variance < BLUR_VAR_MIN (if OpenCV available)
-PHASH_CUTOFF = 5       # near-duplicate if Hamming distance <= PHASH_CUTOFF (if imagehash available)
+PHASH_CUTOFF = 5       # near-duplicate if Hamming distance <= PHASH_CUTOFF
+MAX_PIXELS = 64_000_000  # reject if width*height > MAX_PIXELS (decompression-bomb guard, checked from header)
+CHECK_SIDE = 512       # --fast-check: blur/phash run on a reduced decode with short side >= CHECK_SIDE
 
 # ---------------- Resolve paths/env ----------------
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -41,67 +54,82 @@ INTERIM_ROOT = INTERIM_BASE / "interim"
 
 VALID_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"}
 SKIP_NAMES = {"Thumbs.db", ".DS_Store"}
+EXIF_ORIENTATION = 0x0112
 
 # ---------------- Helpers ----------------
 def ensure_dirs(*paths: Path):
     for p in paths:
         p.mkdir(parents=True, exist_ok=True)
 
-def to_rgb_autoorient(img: Image.Image) -> Image.Image:
+def to_rgb_autoorient(img: Image.Image, lap: NullLap = NO_LAP) -> Image.Image:
     # Auto-orient by EXIF then convert to RGB
+    img.load()
+    lap("decode")
     img = ImageOps.exif_transpose(img)
+    lap("exif_transpose")
     if img.mode != "RGB":
         img = img.convert("RGB")
+    lap("convert")
+    return img
+
+def oriented_size(img: Image.Image) -> Tuple[int, int]:
+    """(width, height) as they will be after EXIF transpose, from the header only."""
+    w, h = img.size
+    if img.format == "PNG" and "exif" not in img.info:
+        return w, h  # PNG getexif() would decode the whole image looking for a trailing eXIf chunk
+    if img.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):  # 90/270 degree variants
+        return h, w
+    return w, h
+
+def to_gray_for_checks(img: Image.Image, lap: NullLap = NO_LAP) -> Image.Image:
+    """
+    Reduced-resolution, auto-oriented grayscale copy for blur/phash.
+    JPEGs are decoded directly at 1/2..1/8 scale (and as luma only) via draft();
+    other formats are decoded fully and then reduced by an integer factor.
+    """
+    w, h = img.size
+    scale = min(w, h) / CHECK_SIDE
+    if scale > 1 and img.format == "JPEG":
+        img.draft("L", (int(w / scale), int(h / scale)))
+    img.load()
+    factor = int(min(img.size) // CHECK_SIDE)
+    if factor >= 2:
+        img = img.reduce(factor)
+    lap("decode")
+    img = ImageOps.exif_transpose(img)
+    lap("exif_transpose")
+    if img.mode != "L":
+        img = img.convert("L")
+    lap("convert")
     return img
 
 def blur_variance(pil_img: Image.Image) -> Optional[float]:
-    if cv2 is None:
-        return None
-    try:
-        arr = cv2.cvtColor(
-            cv2.imdecode(
-                # Fast path: convert PIL -> bytes -> OpenCV array
-                # but simplest is to convert to numpy array directly
-                # However, Pillow to numpy is straightforward:
-                # np.asarray(pil_img) gives RGB array, then cvtColor to GRAY
-                # We'll do that simpler:
-                None,  # placeholder, we won't use imdecode here
-                cv2.IMREAD_GRAYSCALE
-            ), cv2.COLOR_BGR2GRAY
-        )
-    except Exception:
-        # simpler approach:
-        import numpy as np
-        arr = np.asarray(pil_img)
-        if arr.ndim == 3:
-            arr = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
-        elif arr.ndim == 2:
-            pass
-        else:
-            return None
-    return cv2.Laplacian(arr, cv2.CV_64F).var()
+    # OpenCV when installed, pure NumPy otherwise (see batch_metrics.py)
+    return bm.blur_variance(pil_img)
 
 def compute_phash(pil_img: Image.Image) -> Optional[str]:
-    if imagehash is None:
-        return None
-    return str(imagehash.phash(pil_img))
+    # Bit-identical to str(imagehash.phash(pil_img)); None without scipy (no dupe check)
+    return bm.phash(pil_img) if bm.PHASH_AVAILABLE else None
 
 def hamming(a: str, b: str) -> int:
-    # imagehash strings are hex; imagehash lib compares directly, but we’ll be simple:
-    # Use imagehash library distance if available; else fallback hex->bin distance
-    if imagehash is not None:
-        return imagehash.hex_to_hash(a) - imagehash.hex_to_hash(b)
-    # Fallback (rough): compare hex chars
-    return sum(ch1 != ch2 for ch1, ch2 in zip(a, b))
+    # phash hex strings -> exact bit distance (same as imagehash's hash subtraction)
+    return popcount(hex_to_int(a) ^ hex_to_int(b))
 
 def accept_or_reason(pil_img: Image.Image) -> Tuple[bool, str, Dict[str, float]]:
     """
     Returns (ok: bool, reason: str, meta: dict).
     Always returns a tuple; never None.
     """
-    w, h = pil_img.size
+    return accept_dims(*pil_img.size)
+
+def accept_dims(w: int, h: int) -> Tuple[bool, str, Dict[str, float]]:
+    """Size/aspect checks from dimensions alone (same contract as accept_or_reason)."""
     meta: Dict[str, float] = {"width": float(w), "height": float(h)}
 
+    # Pixel budget check (huge panoramas / decompression bombs)
+    if w * h > MAX_PIXELS:
+        return False, "too_large", meta
+
     # Min side check
     if min(w, h) < MIN_SIDE:
         return False, "too_small", meta
@@ -123,7 +151,7 @@ def clean_crop(crop: str, dry_run: bool = False):
     ensure_dirs(dst_crop, rejects_root)
 
     # Per-class duplicate memory (phash -> first path)
-    phash_memory: Dict[str, Dict[str, str]] = {}  # class_name -> {hash -> filename}
+    phash_memory: Dict[str, PHashIndex] = {}  # class_name -> index of kept hashes (payload: filename)
 
     index_rows = []
     total_ok = total_reject = 0
@@ -138,7 +166,7 @@ def clean_crop(crop: str, dry_run: bool = False):
         rej_cls = rejects_root / cls
         ensure_dirs(dst_cls, rej_cls)
 
-        phash_memory.setdefault(cls, {})
+        phash_memory.setdefault(cls, PHashIndex(radius=PHASH_CUTOFF))
 
         for f in cls_dir.iterdir():
             if not f.is_file() or f.name in SKIP_NAMES or f.suffix.lower() not in VALID_EXTS:
@@ -164,15 +192,11 @@ def clean_crop(crop: str, dry_run: bool = False):
 
             # If OK so far and we have a phash, check near duplicates within same class
             if ok and ph is not None:
-                dup_found = False
-                for existing_ph, _path in phash_memory[cls].items():
-                    if hamming(ph, existing_ph) <= PHASH_CUTOFF:
-                        ok = False
-                        reason = "near_duplicate"
-                        dup_found = True
-                        break
-                if not dup_found:
-                    phash_memory[cls][ph] = f.name
+                if phash_memory[cls].any_within(ph):
+                    ok = False
+                    reason = "near_duplicate"
+                else:
+                    phash_memory[cls].add(ph, f.name)
 
             if ok:
                 total_ok += 1
@@ -211,161 +235,653 @@ def clean_crop(crop: str, dry_run: bool = False):
     print(f"   Output: {INTERIM_ROOT / crop}")
     print(f"   Rejects: {INTERIM_ROOT / '_rejects'}")
 
+# ---------------- Toggled engine (staged pipeline) ----------------
+QUALITY_KEYS = ("blur_var", "luma_mean", "clip_frac")
+
+def quality_rejects(grays: List[np.ndarray], use_blur: bool,
+                    use_exposure: bool) -> List[Tuple[Optional[str], Dict[str, Optional[float]]]]:
+    """
+    Optional blur / exposure checks (quality.py) on a batch of check images, measured
+    together -> [(first failed check or None, measurements), ...].
+    """
+    if not (use_blur or use_exposure):
+        return [(None, dict.fromkeys(QUALITY_KEYS)) for _ in grays]
+    try:
+        all_stats = measure_quality_batch(grays, blur=use_blur)
+    except Exception:
+        # If a measurement fails, just skip the checks without rejecting
+        return [(None, dict.fromkeys(QUALITY_KEYS)) for _ in grays]
+    out = []
+    for stats in all_stats:
+        issues = quality_issues(stats, blur_min=BLUR_VAR_MIN if use_blur else 0.0, exposure=use_exposure)
+        out.append(((issues[0] if issues else None), stats))
+    return out
+
+def list_class_files(cls_dir: Path) -> List[Path]:
+    """Valid image files directly under cls_dir, sorted so every run sees the same order."""
+    return sorted(
+        f for f in cls_dir.iterdir()
+        if f.is_file() and f.name not in SKIP_NAMES and f.suffix.lower() in VALID_EXTS
+    )
+
+def triage_header(path: Path, check_side: int = 0) -> Optional[Dict]:
+    """
+    Header-only pre-check (no pixel decode): corrupt header, decompression bomb,
+    too small, bad aspect, too large. Returns a final reject result in
+    analyze_image()'s format, or None if the file must go on to the full analysis.
+    """
+    reject = {"ok": False, "phash": None, "blur_var": None, "sha1": "", "check_side": check_side}
+    try:
+        with Image.open(path) as im:
+            w, h = oriented_size(im)
+    except Image.DecompressionBombError:
+        return {**reject, "reason": "too_large", "meta": {}}
+    except (UnidentifiedImageError, OSError):
+        return {**reject, "reason": "corrupt", "meta": {}}
+    ok, reason, meta = accept_dims(w, h)
+    return None if ok else {**reject, "reason": reason, "meta": meta}
+
+METRIC_BATCH = 16  # images per analyze_batch() call (--fast-check); quality + phash DCT run once per batch
+
+def _decode_and_check(path: Path, fast_check: bool, data: Optional[bytes] = None, lap: NullLap = NO_LAP):
+    """
+    Content hash, decode and size/aspect for one file -> (result, check image or None).
+    Blur/exposure are measured afterwards for the whole batch (analyze_batch).
+    data is the file's bytes when a reader already fetched them. lap times the steps (--profile).
+    """
+    check_side = CHECK_SIDE if fast_check else 0
+    corrupt = {"ok": False, "reason": "corrupt", "meta": {}, "phash": None, "blur_var": None,
+               "sha1": None, "check_side": check_side}
+    if data is None:
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return corrupt, None
+        lap("read")
+        lap.add_bytes(len(data))
+    sha1 = hashlib.sha1(data).hexdigest()
+    lap("sha1")
+
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            if fast_check:
+                full_size = oriented_size(im)
+                lap("header")
+                im = to_gray_for_checks(im, lap)
+            else:
+                lap("header")
+                im = to_rgb_autoorient(im, lap)
+    except Image.DecompressionBombError:
+        return {**corrupt, "reason": "too_large", "sha1": sha1}, None
+    except (UnidentifiedImageError, OSError):
+        return {**corrupt, "sha1": sha1}, None
+
+    # Base checks (size/aspect) always use full-resolution dimensions
+    ok, reason, meta = accept_dims(*full_size) if fast_check else accept_or_reason(im)
+    return {"ok": ok, "reason": reason, "meta": meta, "phash": None, **dict.fromkeys(QUALITY_KEYS),
+            "sha1": sha1, "check_side": check_side}, im
+
+def analyze_batch(paths: List[Path], use_blur: bool, use_dupes: bool, keep_image: bool = False,
+                  fast_check: bool = False, blobs: Optional[List[bytes]] = None,
+                  use_exposure: bool = False, profile: bool = False,
+                  read_times: Optional[List[Dict[str, float]]] = None,
+                  encode_kept: bool = False) -> List[Dict]:
+    """
+    Per-image work that does not depend on any other image: content hash, decode,
+    size/aspect, optional blur/exposure and phash. Safe to run in a worker process.
+    Each result is {"ok", "reason", "meta", "phash", "blur_var", "luma_mean",
+    "clip_frac", "sha1", "check_side"}
+    (+ "image" when keep_image=True and the full-resolution image was decoded;
+    + "encoded", the interim JPEG bytes, when encode_kept=True and its output is
+    missing, so a worker process's decode is the only one a keeper gets).
+    With fast_check, size/aspect come from the header and blur/phash from a
+    reduced grayscale decode; check_side records which resolution was used.
+    Blur/exposure (quality.measure_batch) and the phash DCT each run as one
+    vectorized pass over the batch's check images.
+    The near-duplicate decision is NOT made here; it depends on file order.
+    blobs, if given, are the files' prefetched bytes (same order as paths).
+    With profile, each result also carries "profile": {"times", "bytes_read"}
+    (read_times: the reader's timings for the same files).
+    """
+    outs: List[Dict] = []
+    laps: List[NullLap] = []
+    ims: List[Optional[Image.Image]] = []
+    grays, gray_slots = [], []
+    for i, path in enumerate(paths):
+        lap = Lap() if profile else NO_LAP
+        blob = blobs[i] if blobs is not None else None
+        if profile and blob is not None:
+            lap.times.update(read_times[i] if read_times else {})
+            lap.add_bytes(len(blob))
+        out, im = _decode_and_check(path, fast_check, blob, lap)
+        if out["ok"] and (use_blur or use_exposure):
+            try:
+                grays.append(bm.to_gray_array(im))
+                gray_slots.append(i)
+            except Exception:
+                pass  # unmeasurable: skip the checks without rejecting
+            lap("quality")
+        outs.append(out)
+        laps.append(lap)
+        ims.append(im)
+
+    if grays:
+        t0 = time.perf_counter()
+        verdicts = quality_rejects(grays, use_blur, use_exposure)
+        share = (time.perf_counter() - t0) / len(gray_slots)  # one pass for the batch, split evenly
+        for i, (q_reason, stats) in zip(gray_slots, verdicts):
+            out = outs[i]
+            out.update(stats)
+            if q_reason:
+                out["ok"], out["reason"] = False, q_reason
+                out["meta"].update({k: float(v) for k, v in stats.items() if v is not None})
+            if profile:
+                laps[i].times["quality"] = laps[i].times.get("quality", 0.0) + share
+        del grays
+
+    thumbs, slots = [], []
+    for i, (out, im, lap) in enumerate(zip(outs, ims, laps)):
+        # Hash only what can still be kept; the duplicate lookup happens in order later
+        if out["ok"] and use_dupes:
+            lap.restart()
+            try:
+                thumbs.append(bm.phash_thumb(im))
+                slots.append(i)
+            except Exception:
+                # if hashing fails, just skip dupe logic
+                pass
+            lap("phash")
+        if not fast_check and im is not None and out["ok"]:
+            if keep_image:
+                out["image"] = im
+            elif encode_kept and not is_complete_jpeg(interim_dst(paths[i], out["sha1"])):
+                lap.restart()
+                out["encoded"] = encode_clean(im)
+                lap("encode")
+    del ims
+
+    if thumbs:
+        t0 = time.perf_counter()
+        for i, ph in zip(slots, bm.phash_from_thumbs(np.stack(thumbs))):
+            outs[i]["phash"] = ph
+        if profile:
+            share = (time.perf_counter() - t0) / len(slots)  # one DCT pass for the batch, split evenly
+            for i in slots:
+                laps[i].times["phash"] = laps[i].times.get("phash", 0.0) + share
+    if profile:
+        for out, lap in zip(outs, laps):
+            out["profile"] = lap.to_dict()
+    return outs
+
+def analyze_image(path: Path, use_blur: bool, use_dupes: bool, keep_image: bool = False,
+                  fast_check: bool = False, use_exposure: bool = False) -> Dict:
+    """Single-file analyze_batch()."""
+    return analyze_batch([path], use_blur, use_dupes, keep_image, fast_check,
+                         use_exposure=use_exposure)[0]
+
+def read_for_check(path: Path, check_side: int = 0, profile: bool = False) -> Tuple[Any, Optional[Dict]]:
+    """
+    Reader stage: header triage first, then the whole file for survivors
+    -> (bytes, None), or (None, final reject) when the header settles it.
+    With profile the bytes come as (bytes, {"header": s, "read": s}).
+    """
+    lap = Lap() if profile else NO_LAP
+    early = triage_header(path, check_side)
+    lap("header")
+    if early is not None:
+        if profile:
+            early["profile"] = lap.to_dict()
+        return None, early
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None, None  # the check stage retries the read and records it as corrupt
+    lap("read")
+    return ((data, lap.times) if profile else data), None
+
+def analyze_prefetched(items: List[Tuple[Path, Any]], use_blur: bool, use_dupes: bool,
+                       keep_image: bool = False, fast_check: bool = False,
+                       use_exposure: bool = False, profile: bool = False,
+                       encode_kept: bool = False) -> List[Dict]:
+    """Check stage: analyze_batch() over reader output [(path, bytes), ...]."""
+    if not profile:
+        return analyze_batch([p for p, _ in items], use_blur, use_dupes, keep_image, fast_check,
+                             blobs=[d for _, d in items], use_exposure=use_exposure,
+                             encode_kept=encode_kept)
+    blobs = [d[0] if isinstance(d, tuple) else d for _, d in items]
+    read_times = [d[1] if isinstance(d, tuple) else {} for _, d in items]
+    return analyze_batch([p for p, _ in items], use_blur, use_dupes, keep_image, fast_check,
+                         blobs=blobs, use_exposure=use_exposure, profile=True, read_times=read_times,
+                         encode_kept=encode_kept)
+
+def verdict_from_cache(rec: Dict, use_blur: bool, use_dupes: bool,
+                       check_side: int = 0, use_exposure: bool = False) -> Optional[Dict]:
+    """
+    Rebuild analyze_image()'s result from cached measurements with the current
+    thresholds, or None if this run needs a measurement the cache doesn't have
+    (or only has at a different check resolution).
+    """
+    same_res = rec["check_side"] == check_side
+    base = {"phash": None, **{k: rec.get(k) for k in QUALITY_KEYS},
+            "sha1": rec["sha1"], "check_side": rec["check_side"]}
+    if rec["corrupt"]:
+        return {**base, "ok": False, "reason": "corrupt", "meta": {}}
+    if rec["width"] is None or rec["height"] is None:
+        return None
+
+    ok, reason, meta = accept_dims(rec["width"], rec["height"])
+    if not ok:
+        return {**base, "ok": ok, "reason": reason, "meta": meta}
+
+    if use_blur or use_exposure:
+        if (not same_res or (use_blur and rec["blur_var"] is None)
+                or (use_exposure and rec.get("luma_mean") is None)):
+            return None
+        issues = quality_issues(rec, blur_min=BLUR_VAR_MIN if use_blur else 0.0, exposure=use_exposure)
+        if issues:
+            meta.update({k: float(rec[k]) for k in QUALITY_KEYS if rec.get(k) is not None})
+            return {**base, "ok": False, "reason": issues[0], "meta": meta}
+
+    if use_dupes:
+        if rec["phash"] is None or not same_res:
+            return None
+        base["phash"] = rec["phash"]
+    if not rec["sha1"]:
+        return None  # only header-triaged so far; a keeper needs the content hash for its name
+    return {**base, "ok": True, "reason": "ok", "meta": meta}
+
+def encode_clean(im: Image.Image) -> bytes:
+    """The standardized interim JPEG for an already-decoded RGB image."""
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG", quality=92, optimize=True)
+    return buf.getvalue()
+
+def write_clean_bytes(data: bytes, dst: Path, lap: NullLap = NO_LAP) -> None:
+    """Write encoded interim JPEG bytes to dst (writer side)."""
+    lap.restart()
+    # Write next to dst and rename, so an interrupted run never leaves a truncated
+    # file that later runs would take as already written (unique name: two writer
+    # threads may target the same content-addressed dst under --no-dupes)
+    tmp = dst.with_name(f"{dst.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, dst)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    lap("write")
+
+def save_image(im: Image.Image, dst: Path, lap: NullLap = NO_LAP) -> None:
+    """Write an already-decoded RGB image as the standardized interim JPEG."""
+    lap.restart()
+    data = encode_clean(im)
+    lap("encode")
+    write_clean_bytes(data, dst, lap)
+
+def is_complete_jpeg(path: Path) -> bool:
+    """dst exists and ends with the JPEG EOI marker (catches files truncated before atomic writes)."""
+    try:
+        with open(path, "rb") as fp:
+            fp.seek(-2, os.SEEK_END)
+            return fp.read(2) == b"\xff\xd9"
+    except OSError:  # missing, or shorter than 2 bytes
+        return False
+
+def save_clean_copy(src: Path, dst: Path, lap: NullLap = NO_LAP) -> None:
+    """Re-decode src and write it as the standardized interim JPEG (writer side)."""
+    lap.restart()
+    with Image.open(src) as im:
+        im = to_rgb_autoorient(im)
+        lap("full_decode")
+        save_image(im, dst, lap)
+
+def clean_name(cls: str, sha1: str) -> str:
+    # Content-addressed, so a rerun rewrites the same file instead of adding a copy
+    return f"{cls}_{sha1[:32]}.jpg"
+
+def interim_dst(src: Path, sha1: str) -> Path:
+    """Where raw/<crop>/<class>/<file> lands if kept."""
+    cls = src.parent.name
+    return INTERIM_ROOT / src.parent.parent.name / cls / clean_name(cls, sha1)
+
+INDEX_HEADER = ["crop", "class", "src_path", "dst_path", "status_or_reason",
+                "width", "height", "aspect_ratio", "blur_var"]
+
+class ClassOrderedIndex:
+    """
+    _clean_index.csv writer that keeps the single-crop row order (classes healthy
+    first, files in listing order) however the classes are scheduled: rows of the
+    class that is due stream straight to disk, rows of classes running ahead of it
+    wait in memory until it finishes.
+    """
+
+    def __init__(self, path: Path, classes: List[str]):
+        self.fp = open(path, "w", newline="", encoding="utf-8")
+        self.w = csv.writer(self.fp)
+        self.w.writerow(INDEX_HEADER)
+        self.order = list(classes)
+        self.pos = 0
+        self.pending: Dict[str, List[list]] = {c: [] for c in classes}
+        self.done: set = set()
+        self.rows = 0
+
+    def add(self, cls: str, row: list) -> None:
+        if self.pos < len(self.order) and self.order[self.pos] == cls:
+            self.w.writerow(row)
+        else:
+            self.pending[cls].append(row)
+        self.rows += 1
+        if self.rows % COMMIT_EVERY == 0:
+            self.fp.flush()
+
+    def finish(self, cls: str) -> None:
+        self.done.add(cls)
+        while self.pos < len(self.order) and self.order[self.pos] in self.done:
+            self.pos += 1
+            if self.pos < len(self.order):
+                self.w.writerows(self.pending.pop(self.order[self.pos]))
+
+    def close(self) -> None:
+        self.fp.close()
+
+class CropRun:
+    """Per-crop state of a clean run; with --all-crops several share one StagedPipeline."""
+
+    def __init__(self, crop: str, use_blur: bool, use_dupes: bool, use_cache: bool,
+                 fast_check: bool, use_exposure: bool):
+        self.crop = crop
+        self.dst_crop = INTERIM_ROOT / crop
+        self.rejects_root = INTERIM_ROOT / "_rejects"
+        ensure_dirs(self.dst_crop, self.rejects_root)
+
+        class_dirs = [d for d in (RAW_ROOT / crop).iterdir() if d.is_dir()]
+        class_dirs.sort(key=lambda p: (p.name != "healthy", p.name))
+
+        self.cache = CleanCache(self.dst_crop / "_clean_cache.sqlite") if use_cache else None
+        self.prev_kept = self.cache.kept_outputs() if self.cache is not None else {}
+        self.phash_memory: Dict[str, PHashIndex] = {}
+        self.kept_now: Dict[str, str] = {}
+        self.total_ok = self.total_reject = self.total_written = 0
+        self.header_settled = 0
+
+        # One unit per class; cache hits carry their result already, misses get decoded
+        self.units: List[WorkUnit] = []
+        for cls_dir in class_dirs:
+            cls = cls_dir.name
+            ensure_dirs(self.dst_crop / cls, self.rejects_root / cls)
+            self.phash_memory.setdefault(cls, PHashIndex(radius=PHASH_CUTOFF))
+            unit = WorkUnit(crop, cls)
+            for f in list_class_files(cls_dir):
+                st = f.stat()
+                cached = None
+                if self.cache is not None:
+                    rec = self.cache.lookup(f, st)
+                    if rec is not None:
+                        cached = verdict_from_cache(rec, use_blur, use_dupes,
+                                                    CHECK_SIDE if fast_check else 0, use_exposure)
+                unit.items.append((self, cls, f, st, cached))
+                if cached is None:
+                    unit.cost += st.st_size
+            self.units.append(unit)
+        self.n_files = sum(len(u.items) for u in self.units)
+        self.n_misses = sum(1 for u in self.units for *_, cached in u.items if cached is None)
+
+        # Index is streamed as decisions are made, so an interrupted run leaves a usable partial log
+        self.out_csv = self.dst_crop / "_clean_index.csv"
+        self.index = ClassOrderedIndex(self.out_csv, [u.cls for u in self.units])
+        for unit in self.units:
+            if not unit.items:
+                self.index.finish(unit.cls)
+
+    def decide(self, pipe: StagedPipeline, cls: str, f: Path, st: os.stat_result,
+               cached: Optional[Dict], res: Dict, dry_run: bool, materialize_mode: str,
+               prof: Optional[CleanProfile] = None) -> None:
+        if cached is None and res["sha1"] == "":
+            self.header_settled += 1
+        ok, reason, meta, ph = res["ok"], res["reason"], res["meta"], res["phash"]
+        rej_cls = self.rejects_root / cls
+
+        # Near-duplicate check within class (order-dependent, so done here)
+        if ok and ph is not None:
+            t0 = time.perf_counter() if prof is not None else 0.0
+            if self.phash_memory[cls].any_within(ph):
+                ok = False
+                reason = "near_duplicate"
+            else:
+                self.phash_memory[cls].add(ph, f.name)
+            if prof is not None:
+                prof.add_times({"dupe_scan": time.perf_counter() - t0})
+
+        dst_path = ""
+        if ok:
+            self.total_ok += 1
+            dst = self.dst_crop / cls / clean_name(cls, res["sha1"])
+            dst_path = str(dst)
+            self.kept_now[str(f)] = dst_path
+            if not dry_run and not is_complete_jpeg(dst):
+                self.total_written += 1
+                if "image" in res:
+                    fn, src = save_image, res["image"]
+                elif "encoded" in res:  # encoded by the worker process that decoded it
+                    fn, src = write_clean_bytes, res["encoded"]
+                else:
+                    fn, src = save_clean_copy, f
+                if prof is None:
+                    pipe.write("kept", fn, src, dst)
+                else:
+                    pipe.write("kept", prof.kept_write, fn, src, dst)
+        else:
+            self.total_reject += 1
+            rej = rej_cls / f.name
+            if (not dry_run and materialize_mode != "manifest-only"
+                    and not (rej.exists() and rej.stat().st_size == st.st_size)):
+                if prof is None:
+                    pipe.write("reject", materialize, f, rej, materialize_mode)
+                else:
+                    pipe.write("reject", prof.reject_write, materialize, f, rej, materialize_mode)
+        res.pop("image", None)
+        res.pop("encoded", None)
+
+        self.index.add(cls, [
+            self.crop, cls, str(f), dst_path, "ok" if ok else reason,
+            meta.get("width", ""), meta.get("height", ""),
+            meta.get("aspect_ratio", ""), meta.get("blur_var", "")
+        ])
+        if self.cache is not None and res["sha1"] is not None and not dry_run:
+            # A dry run writes nothing, so its decisions must not make a real run skip work
+            self.cache.store(f, st, res["sha1"], res, "ok" if ok else reason, dst_path)
+
+    def close(self) -> None:
+        self.index.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def prune(self) -> int:
+        """Drop outputs this cache wrote earlier that are no longer kept (threshold change, removed source)."""
+        pruned = 0
+        still_kept = set(self.kept_now.values())
+        for src, old_dst in self.prev_kept.items():
+            if old_dst not in still_kept and Path(old_dst).exists():
+                Path(old_dst).unlink()
+                pruned += 1
+        return pruned
+
+def clean_crops(crops: List[str], dry_run: bool = False, use_blur: bool = False,
+                use_dupes: bool = True, workers: int = 1, use_cache: bool = True,
+                fast_check: bool = False, materialize_mode: str = "copy",
+                writers: int = 2, prefetch: int = 16, use_exposure: bool = False,
+                profile: bool = False) -> None:
+    """
+    Clean raw/<crop> into interim/<crop> for each crop, all through one pipeline.
+    Files stream through bounded stages (see clean_pipeline.py): reader threads
+    triage headers and prefetch up to `prefetch` files, checks run on `workers`
+    processes (a single thread when workers == 1), and `writers` threads do the
+    JPEG encodes and reject copies. Duplicate decisions are still taken in the
+    main process in file order, so the index rows and keep/reject decisions
+    match the serial run exactly.
+    With several crops, every (crop, class) is one work unit and units are fed
+    largest first (work_units.py); a single crop keeps its class order. Near-
+    duplicates are per class, so scheduling never changes a decision, and each
+    crop's _clean_index.csv comes out in the single-crop order.
+    With use_cache, unchanged files are not decoded again (see clean_cache.py)
+    and kept images whose output already exists are not re-encoded.
+    With fast_check, checks run on a reduced decode and only kept images are
+    decoded at full resolution (for the interim JPEG).
+    use_exposure rejects too-dark / overexposed photos (quality.py thresholds).
+    materialize_mode decides how rejects land in _rejects/ (see materialize.py);
+    _clean_index.csv always records the source path either way.
+    With profile, per-step timings, bytes and per-class throughput are printed and
+    written to interim/_profile/ (see clean_profile.py).
+    """
+    use_dupes = use_dupes and bm.PHASH_AVAILABLE  # no scipy, no phash: same as --no-dupes
+    prof = CleanProfile() if profile else None
+    runs: List[CropRun] = []
+    try:
+        for crop in crops:
+            runs.append(CropRun(crop, use_blur, use_dupes, use_cache, fast_check, use_exposure))
+        units = [u for run in runs for u in run.units]
+        if len(runs) > 1:
+            units = largest_first(units)
+
+        # read (triage + prefetch) -> check (decode/metrics) -> decide here, in order -> write.
+        # Checks run in processes when workers > 1; a lone check thread otherwise. A full
+        # decode is never repeated for the write: the single check thread hands its image
+        # to the writer (one file per batch, so at most a few full-resolution images are
+        # alive), worker processes return the encoded JPEG instead of pickling pixels.
+        check_side = CHECK_SIDE if fast_check else 0
+        keep_image = workers == 1 and not fast_check
+        encode_kept = workers > 1 and not fast_check and not dry_run
+        pipe = StagedPipeline(
+            read_fn=partial(read_for_check, check_side=check_side, profile=profile),
+            check_fn=partial(analyze_prefetched, use_blur=use_blur, use_dupes=use_dupes,
+                             keep_image=keep_image, fast_check=fast_check, use_exposure=use_exposure,
+                             profile=profile, encode_kept=encode_kept),
+            workers=workers, readers=max(2, workers), writers=writers, prefetch=prefetch,
+            # Full-resolution checks go one file per batch: a batch holds all its
+            # decoded images until its quality pass, which only pays off for small ones
+            batch=METRIC_BATCH if fast_check else 1,
+        )
+
+        with pipe:
+            # Units are contiguous in the stream: a new (run, class) means the last one is done
+            current: Optional[Tuple[CropRun, str]] = None
+            stream = pipe.run((item, item[2], item[4]) for unit in units for item in unit.items)
+            for (run, cls, f, st, cached), res in stream:
+                if current is not None and current != (run, cls):
+                    current[0].index.finish(current[1])
+                current = (run, cls)
+                if prof is not None:
+                    prof.add_result(run.crop, cls, cached, res)
+                run.decide(pipe, cls, f, st, cached, res, dry_run, materialize_mode, prof)
+            if current is not None:
+                current[0].index.finish(current[1])
+        # Leaving the with-block waited for the writers and surfaced any write error
+        reject_modes: Counter = pipe.outcomes.get("reject", Counter())
+    finally:
+        for run in runs:
+            run.close()
+
+    for run in runs:
+        pruned = run.prune() if not dry_run else 0
+        print(f"\n✅ Cleaned '{run.crop}': kept={run.total_ok}, rejected={run.total_reject}")
+        if run.cache is not None:
+            print(f"   Cache: {run.n_files - run.n_misses} unchanged, {run.header_settled} "
+                  f"settled from headers, {run.n_misses - run.header_settled} decoded, "
+                  f"{run.total_written} written, {pruned} stale outputs removed")
+        print(f"   Index: {run.out_csv}")
+        print(f"   Output: {INTERIM_ROOT / run.crop}")
+    print(f"   Rejects: {INTERIM_ROOT / '_rejects'}", end="")
+    if materialize_mode == "manifest-only":
+        print(" (not materialized; see src_path in the index)")
+    else:
+        print(f" ({', '.join(f'{m}: {n}' for m, n in sorted(reject_modes.items())) or 'unchanged'})")
+    print(f"   Stages ({pipe.wall:.1f}s wall):")
+    for line in pipe.report():
+        print(line)
+
+    if prof is not None:
+        prof.finish()
+        print("   Profile (per file; phash is the file's share of its batch's DCT):")
+        for line in prof.summary():
+            print(line)
+        out_json = INTERIM_ROOT / "_profile" / f"clean_{time.strftime('%Y%m%d-%H%M%S')}.json"
+        out_csv = prof.write(out_json, {"crops": crops, "workers": workers, "writers": writers,
+                                        "prefetch": prefetch, "fast_check": fast_check, "use_blur": use_blur,
+                                        "use_exposure": use_exposure, "use_dupes": use_dupes,
+                                        "use_cache": use_cache})
+        print(f"   Profile: {out_json}\n            {out_csv}")
+
+def clean_crop_with_toggles(crop: str, **kwargs) -> None:
+    """Single-crop entry point; see clean_crops() for the options."""
+    clean_crops([crop], **kwargs)
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Clean crop images from raw/ to interim/")
-    parser.add_argument("--crop", required=True, help="e.g., rice, tomato")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--crop", help="e.g., rice, tomato")
+    target.add_argument("--all-crops", action="store_true",
+                        help="Clean every crop under raw/ in one run, classes from all crops sharing the workers")
     parser.add_argument("--dry-run", action="store_true", help="Process but do not write outputs")
     parser.add_argument("--with-blur", action="store_true",
-                        help="Enable blur detection (slower; needs OpenCV)")
+                        help="Enable blur detection (slower; OpenCV if installed, else NumPy)")
+    parser.add_argument("--with-exposure", action="store_true",
+                        help="Reject very dark / overexposed photos (same checks as the inference server)")
     parser.add_argument("--no-dupes", action="store_true",
                         help="Disable near-duplicate removal (phash)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for decode/checks (default 1 = one check thread)")
+    parser.add_argument("--writers", type=int, default=2,
+                        help="Writer threads for JPEG encodes and reject copies")
+    parser.add_argument("--prefetch", type=int, default=16,
+                        help="Files read ahead of the check workers (bounds memory)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore interim/<crop>/_clean_cache.sqlite and decode every file")
+    parser.add_argument("--materialize", choices=MATERIALIZE_MODES, default="copy",
+                        help="How rejects land in interim/_rejects (link modes fall back to copy)")
+    parser.add_argument("--fast-check", action="store_true",
+                        help=f"Run blur/phash on a reduced decode (short side >= {CHECK_SIDE}); "
+                             "full decode only for kept images")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time every step per file (decode, EXIF, convert, phash, dupe scan, blur, "
+                             "encode, reject copy), count bytes and per-class throughput; "
+                             "writes interim/_profile/clean_<time>.json/.csv")
 
     args = parser.parse_args()
-    crop = args.crop.strip().lower()
-    src = RAW_ROOT / crop
-    if not src.exists():
-        raise SystemExit(f"❌ raw crop folder not found: {src}")
+    crops = list_crops(RAW_ROOT) if args.all_crops else [args.crop.strip().lower()]
+    if not crops:
+        raise SystemExit(f"❌ no crop folders found under {RAW_ROOT}")
+    for crop in crops:
+        src = RAW_ROOT / crop
+        if not src.exists():
+            raise SystemExit(f"❌ raw crop folder not found: {src}")
+    if args.workers < 1 or args.writers < 1 or args.prefetch < 1:
+        raise SystemExit("❌ --workers, --writers and --prefetch must be >= 1")
 
     # Show config summary
     print("Project root:", PROJECT_ROOT)
     print("Dataset root:", DATASET_ROOT)
     print("RAW:", RAW_ROOT)
     print("INTERIM:", INTERIM_ROOT)
-    print(f"Crop: {crop}")
-    print(f"Thresholds: MIN_SIDE={MIN_SIDE}, AR=({ASPECT_MIN}, {ASPECT_MAX})")
-    print(f"Blur check: {'ON' if args.with_blur and cv2 is not None else 'OFF'} "
-          f"({('OpenCV not installed' if cv2 is None else 'cv2 available')})")
-    print(f"Near-duplicates: {'OFF' if args.no_dupes else 'ON'} "
-          f"({('ImageHash not installed' if imagehash is None else 'ImageHash available')})")
-
-    # Inject runtime toggles into global state via closures (simple approach):
-    USE_BLUR = bool(args.with_blur and cv2 is not None)
-    USE_DUPES = not args.no_dupes and (imagehash is not None)
-
-    # Wrap original helpers with toggles
-    def maybe_blur_reject(pil_img):
-        """Return (ok, reason, meta) or (None,None,None) if not applying blur."""
-        if not USE_BLUR:
-            return None, None, None
-        try:
-            import numpy as np
-            arr = np.asarray(pil_img)
-            if arr.ndim == 3:
-                gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
-            else:
-                gray = arr
-            bv = cv2.Laplacian(gray, cv2.CV_64F).var()
-            if bv < BLUR_VAR_MIN:
-                return False, "blurry", {"blur_var": float(bv)}
-            return True, "ok", {"blur_var": float(bv)}
-        except Exception:
-            # If blur computation fails, just skip blur without rejecting
-            return None, None, None
-
-    # Patch clean_crop to reference toggles without heavy refactor:
-    original_clean_crop = clean_crop
-    def clean_crop_with_toggles(crop: str, dry_run: bool = False):
-        src_crop = RAW_ROOT / crop
-        dst_crop = INTERIM_ROOT / crop
-        rejects_root = INTERIM_ROOT / "_rejects"
-
-        ensure_dirs(dst_crop, rejects_root)
-
-        phash_memory: Dict[str, Dict[str, str]] = {}
-
-        index_rows = []
-        total_ok = total_reject = 0
-
-        class_dirs = [d for d in src_crop.iterdir() if d.is_dir()]
-        class_dirs.sort(key=lambda p: (p.name != "healthy", p.name))
-
-        for cls_dir in class_dirs:
-            cls = cls_dir.name
-            dst_cls = dst_crop / cls
-            rej_cls = rejects_root / cls
-            ensure_dirs(dst_cls, rej_cls)
-
-            phash_memory.setdefault(cls, {})
-
-            for f in cls_dir.iterdir():
-                if not f.is_file() or f.name in SKIP_NAMES or f.suffix.lower() not in VALID_EXTS:
-                    continue
-                try:
-                    with Image.open(f) as im:
-                        im = ImageOps.exif_transpose(im)
-                        if im.mode != "RGB":
-                            im = im.convert("RGB")
-                except (UnidentifiedImageError, OSError):
-                    reason = "corrupt"
-                    total_reject += 1
-                    if not dry_run:
-                        shutil.copy2(f, rej_cls / f.name)
-                    index_rows.append([crop, cls, str(f), "", reason, "", "", "", ""])
-                    continue
-
-                # Base checks (size/aspect)
-                ok, reason, meta = accept_or_reason(im)
-
-                # Optional blur check
-                if ok:
-                    b_ok, b_reason, b_meta = maybe_blur_reject(im)
-                    if b_ok is False:  # explicit reject by blur
-                        ok, reason = False, b_reason
-                        meta.update(b_meta or {})
-
-                # Optional near-duplicate check
-                ph = None
-                if ok and USE_DUPES:
-                    try:
-                        ph = str(imagehash.phash(im))
-                        # check within class
-                        dup_found = False
-                        for existing_ph, _path in phash_memory[cls].items():
-                            if (imagehash.hex_to_hash(ph) - imagehash.hex_to_hash(existing_ph)) <= PHASH_CUTOFF:
-                                ok = False
-                                reason = "near_duplicate"
-                                dup_found = True
-                                break
-                        if not dup_found:
-                            phash_memory[cls][ph] = f.name
-                    except Exception:
-                        # if hashing fails, just skip dupe logic
-                        pass
-
-                if ok:
-                    total_ok += 1
-                    new_name = f"{cls}_{uuid.uuid4().hex}.jpg"
-                    dst_path = dst_cls / new_name
-                    if not dry_run:
-                        im.save(dst_path, format="JPEG", quality=92, optimize=True)
-                    index_rows.append([
-                        crop, cls, str(f), str(dst_path), "ok",
-                        meta.get("width", ""), meta.get("height", ""),
-                        meta.get("aspect_ratio", ""), meta.get("blur_var", "")
-                    ])
-                else:
-                    total_reject += 1
-                    if not dry_run:
-                        shutil.copy2(f, rej_cls / f.name)
-                    index_rows.append([
-                        crop, cls, str(f), "", reason,
-                        meta.get("width", ""), meta.get("height", ""),
-                        meta.get("aspect_ratio", ""), meta.get("blur_var", "")
-                    ])
-
-        out_csv = INTERIM_ROOT / crop / "_clean_index.csv"
-        ensure_dirs(out_csv.parent)
-        with open(out_csv, "w", newline="", encoding="utf-8") as fp:
-            w = csv.writer(fp)
-            w.writerow(["crop", "class", "src_path", "dst_path", "status_or_reason",
-                        "width", "height", "aspect_ratio", "blur_var"])
-            w.writerows(index_rows)
-
-        print(f"\n✅ Cleaned '{crop}': kept={total_ok}, rejected={total_reject}")
-        print(f"   Index: {out_csv}")
-        print(f"   Output: {INTERIM_ROOT / crop}")
-        print(f"   Rejects: {INTERIM_ROOT / '_rejects'}")
+    print(f"Crop{'s' if len(crops) > 1 else ''}: {', '.join(crops)}")
+    print(f"Thresholds: MIN_SIDE={MIN_SIDE}, AR=({ASPECT_MIN}, {ASPECT_MAX}), MAX_PIXELS={MAX_PIXELS}")
+    print(f"Blur check: {'ON' if args.with_blur else 'OFF'} "
+          f"({('OpenCV not installed, NumPy Laplacian' if cv2 is None else 'cv2 available')})")
+    print(f"Exposure check: {'ON' if args.with_exposure else 'OFF'}")
+    if args.no_dupes:
+        print("Near-duplicates: OFF")
+    else:
+        print(f"Near-duplicates: {'ON (batched DCT phash)' if bm.PHASH_AVAILABLE else 'OFF (scipy not installed)'}")
+    print(f"Workers: {args.workers} check, {args.writers} writers, prefetch {args.prefetch}")
+    print(f"Rejects materialize: {args.materialize}")
+    print(f"Fast check: {'ON (check side ' + str(CHECK_SIDE) + ')' if args.fast_check else 'OFF'}")
+
+    USE_BLUR = bool(args.with_blur)
+    USE_DUPES = not args.no_dupes and bm.PHASH_AVAILABLE
 
     # Run with toggles
-    clean_crop_with_toggles(crop, dry_run=args.dry_run)
+    clean_crops(crops, dry_run=args.dry_run, use_blur=USE_BLUR,
+                use_dupes=USE_DUPES, workers=args.workers,
+                use_cache=not args.no_cache, fast_check=args.fast_check,
+                materialize_mode=args.materialize, writers=args.writers,
+                prefetch=args.prefetch, use_exposure=args.with_exposure, profile=args.profile)
@@ -0,0 +1,237 @@
+import multiprocessing
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from queue import Queue
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# ---------------- Staged streaming pipeline ----------------
+#   read   (I/O threads)      header triage + whole-file prefetch
+#   check  (CPU workers)      decode, checks, hashes; processes when workers > 1
+#   decide (caller, in order) anything order-dependent (near-duplicates, index rows)
+#   write  (writer threads)   JPEG encodes and reject copies
+# Every hop is bounded: at most `prefetch` files read ahead, 2*workers check batches
+# in flight (1 with a single check thread) and one queued write per writer thread,
+# so memory stays flat however big the crop is.
+# Each stage accumulates the time it spent working; busy% = busy / (wall * slots).
+# "waited" is how long the caller sat blocked on that stage, i.e. where the bottleneck is.
+
+class StageMeter:
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self.slots = slots
+        self.items = 0
+        self.busy = 0.0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, n: int = 1) -> None:
+        with self._lock:
+            self.busy += seconds
+            self.items += n
+
+    def busy_pct(self, wall: float) -> float:
+        return 100.0 * self.busy / (wall * self.slots) if wall > 0 else 0.0
+
+def _timed(fn: Callable, arg: Any) -> Tuple[Any, float]:
+    # Module-level so it pickles into worker processes
+    t0 = time.perf_counter()
+    out = fn(arg)
+    return out, time.perf_counter() - t0
+
+class StagedPipeline:
+    """
+    Stream items through read -> check -> (caller) -> write with bounded queues.
+
+    read_fn(path) -> (payload, early): early is a final result (skip check) or None.
+    check_fn([(path, payload), ...]) -> [result, ...], one call per batch; it runs in
+    a worker process when workers > 1, so it must be a picklable top-level function.
+    run() yields (key, result) in input order; write() hands work to writer threads.
+    """
+
+    def __init__(self, read_fn: Callable, check_fn: Callable, workers: int = 1,
+                 readers: int = 2, writers: int = 2, prefetch: int = 32, batch: int = 8):
+        self.read_fn = read_fn
+        self.check_fn = check_fn
+        self.prefetch = max(1, prefetch)
+        self.batch = max(1, batch)
+        # Processes get a second batch queued so they never wait on the main thread;
+        # the single check thread gets one, since its results may hold full-size images
+        self.max_checks = 2 * workers if workers > 1 else 1
+        self.meters: Dict[str, StageMeter] = {
+            "read": StageMeter("read", readers),
+            "check": StageMeter("check", workers),
+            "decide": StageMeter("decide", 1),
+            "write": StageMeter("write", writers),
+        }
+        self.outcomes: Dict[str, Counter] = {}  # kind -> Counter of write_fn return values
+
+        self._read_ex = ThreadPoolExecutor(max_workers=readers)
+        # One check thread is enough to overlap with reads/writes; PIL and NumPy drop the GIL.
+        # Worker processes start lazily, after the reader/writer threads are running, so
+        # they must not be forked: a child could inherit a lock another thread holds.
+        self._check_ex = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) \
+            if workers > 1 else ThreadPoolExecutor(max_workers=1)
+        self._inflight: set = set()
+        self._writes: Queue = Queue(maxsize=writers)
+        self._write_error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._writers = [threading.Thread(target=self._write_loop, daemon=True) for _ in range(writers)]
+        for t in self._writers:
+            t.start()
+        self._t0 = time.perf_counter()
+        self.wall = 0.0
+
+    # ---- write stage ----
+    def _write_loop(self) -> None:
+        while True:
+            job = self._writes.get()
+            if job is None:
+                return
+            kind, fn, args = job
+            if self._write_error is not None:
+                continue  # drain without working once something failed
+            t0 = time.perf_counter()
+            try:
+                ret = fn(*args)
+            except BaseException as e:
+                with self._lock:
+                    self._write_error = self._write_error or e
+                continue
+            self.meters["write"].add(time.perf_counter() - t0)
+            with self._lock:
+                self.outcomes.setdefault(kind, Counter())[ret] += 1
+
+    def write(self, kind: str, fn: Callable, *args) -> None:
+        """Queue fn(*args) for a writer thread; blocks while the write queue is full."""
+        if self._write_error is not None:
+            raise self._write_error
+        t0 = time.perf_counter()
+        self._writes.put((kind, fn, args))
+        self.meters["write"].waited += time.perf_counter() - t0
+
+    # ---- read/check stages ----
+    def _can_submit(self) -> bool:
+        self._inflight = {f for f in self._inflight if not f.done()}
+        return len(self._inflight) < self.max_checks
+
+    def _flush(self, batch: List) -> None:
+        if not batch:
+            return
+        fut = self._check_ex.submit(_timed, self.check_fn, [(p, payload) for p, payload, _ in batch])
+        n = len(batch)
+        fut.add_done_callback(
+            lambda f: f.exception() is None and self.meters["check"].add(f.result()[1], n))
+        for i, (_, _, slot) in enumerate(batch):
+            slot[:] = ["batch", fut, i]
+        self._inflight.add(fut)
+        batch.clear()
+
+    def _result(self, stage: str, fut: Future):
+        if not fut.done():
+            t0 = time.perf_counter()
+            wait([fut])
+            self.meters[stage].waited += time.perf_counter() - t0
+        return fut.result()[0]
+
+    def run(self, items: Iterable[Tuple[Any, Any, Any]]) -> Iterator[Tuple[Any, Any]]:
+        """
+        items: (key, path, ready) where ready is a known result (e.g. a cache hit)
+        or None to send path through read and check. Yields (key, result) in order.
+        """
+        it = iter(items)
+        exhausted = False
+        reads: deque = deque()  # (key, path, read future or None, ready)
+        out: deque = deque()    # (key, slot); slot = ["ready", res] | ["pending"] | ["batch", fut, i]
+        batch: List = []        # (path, payload, slot) not yet submitted
+        max_out = self.prefetch + self.batch * self.max_checks
+
+        while True:
+            # Keep the read window full
+            while not exhausted and len(reads) < self.prefetch:
+                nxt = next(it, None)
+                if nxt is None:
+                    exhausted = True
+                    break
+                key, path, ready = nxt
+                fut = None
+                if ready is None:
+                    fut = self._read_ex.submit(_timed, self.read_fn, path)
+                    fut.add_done_callback(
+                        lambda f: f.exception() is None and self.meters["read"].add(f.result()[1]))
+                reads.append((key, path, fut, ready))
+
+            # Move finished reads (in order) towards the check workers; only block
+            # on a read when there is nothing else to hand back to the caller
+            while reads and len(out) < max_out:
+                if len(batch) >= self.batch:
+                    if not self._can_submit():
+                        break
+                    self._flush(batch)
+                key, path, fut, ready = reads[0]
+                if fut is not None and not fut.done() and out:
+                    break
+                reads.popleft()
+                if fut is None:
+                    out.append((key, ["ready", ready]))
+                    continue
+                payload, early = self._result("read", fut)
+                if early is not None:
+                    out.append((key, ["ready", early]))
+                    continue
+                slot = ["pending"]
+                batch.append((path, payload, slot))
+                out.append((key, slot))
+                if len(batch) >= self.batch and self._can_submit():
+                    self._flush(batch)
+
+            if not out:
+                if exhausted and not reads:
+                    break
+                continue
+
+            key, slot = out[0]
+            if slot[0] == "pending" or (slot[0] == "batch" and not slot[1].done()
+                                        and batch and self._can_submit()):
+                self._flush(batch)  # don't leave workers idle behind a partial batch
+            out.popleft()
+            res = slot[1] if slot[0] == "ready" else self._result("check", slot[1])[slot[2]]
+            t0, w0 = time.perf_counter(), self.meters["write"].waited
+            yield key, res
+            # Time blocked on a full write queue is the writers' fault, not the decision's
+            self.meters["decide"].add(time.perf_counter() - t0 - (self.meters["write"].waited - w0))
+
+    # ---- lifecycle ----
+    def close(self) -> None:
+        """Wait for queued writes and shut the stages down; re-raises the first write error."""
+        for _ in self._writers:
+            self._writes.put(None)
+        for t in self._writers:
+            t.join()
+        self._read_ex.shutdown(wait=True, cancel_futures=True)
+        self._check_ex.shutdown(wait=True, cancel_futures=True)
+        self.wall = time.perf_counter() - self._t0
+        if self._write_error is not None:
+            raise self._write_error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._write_error = self._write_error or exc  # stop writers picking up more work
+        try:
+            self.close()
+        except BaseException:
+            if exc_type is None:
+                raise
+        return False
+
+    def report(self) -> List[str]:
+        wall = self.wall or (time.perf_counter() - self._t0)
+        lines = [f"   {'stage':<7} {'slots':>5} {'items':>7} {'busy s':>8} {'busy %':>7} {'waited s':>9}"]
+        for m in self.meters.values():
+            lines.append(f"   {m.name:<7} {m.slots:>5} {m.items:>7} {m.busy:>8.2f} "
+                         f"{m.busy_pct(wall):>6.0f}% {m.waited:>9.2f}")
+        return lines
@@ -0,0 +1,213 @@
+import csv
+import json
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# ---------------- clean_dataset --profile ----------------
+# Per-file wall time of every sub-stage, as log2 histograms (1 µs .. ~2 min):
+#   header          header triage (reader)         read      whole-file read (reader)
+#   sha1            content hash                   decode    pixel decode (+ draft/reduce)
+#   exif_transpose  EXIF orientation               convert   to RGB / L
+#   quality         blur + exposure measurements   phash     thumbnail + batched DCT share
+#   dupe_scan       near-duplicate lookup (in order, main process)
+#   full_decode     writer re-decode (--fast-check keepers)
+#   encode          interim JPEG encode (writer; worker process with --workers > 1)
+#   write           interim JPEG write             reject_copy  materialize into _rejects
+# plus bytes read / written and per-class throughput. Worker processes time their own
+# files with a Lap and return the numbers inside the result dict; everything is summed
+# here in the main process. With profiling off the workers get NO_LAP, whose calls
+# are no-ops, and nothing else changes.
+
+STAGE_ORDER = ("header", "read", "sha1", "decode", "exif_transpose", "convert", "quality",
+               "phash", "dupe_scan", "full_decode", "encode", "write", "reject_copy")
+HIST_EDGES = [1e-6 * 2 ** i for i in range(28)]  # upper bucket edges in seconds; last bucket is open
+
+class NullLap:
+    """Stand-in stopwatch used when profiling is off."""
+    __slots__ = ()
+
+    def __call__(self, name: str) -> None:
+        pass
+
+    def add_bytes(self, n: int) -> None:
+        pass
+
+    def restart(self) -> None:
+        pass
+
+NO_LAP = NullLap()
+
+class Lap(NullLap):
+    """Per-file stopwatch: lap(name) books the time since the previous lap to name."""
+    __slots__ = ("times", "bytes_read", "t0")
+
+    def __init__(self):
+        self.times: Dict[str, float] = {}
+        self.bytes_read = 0
+        self.t0 = time.perf_counter()
+
+    def __call__(self, name: str) -> None:
+        now = time.perf_counter()
+        self.times[name] = self.times.get(name, 0.0) + now - self.t0
+        self.t0 = now
+
+    def add_bytes(self, n: int) -> None:
+        self.bytes_read += n
+
+    def restart(self) -> None:
+        self.t0 = time.perf_counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"times": self.times, "bytes_read": self.bytes_read}
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(HIST_EDGES) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        i = 0
+        while i < len(HIST_EDGES) and seconds > HIST_EDGES[i]:
+            i += 1
+        self.counts[i] += 1
+        self.n += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """q-th percentile, interpolated inside its bucket (at most max)."""
+        if not self.n:
+            return 0.0
+        need, seen = q / 100.0 * self.n, 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= need:
+                lo = HIST_EDGES[i - 1] if i > 0 else 0.0
+                hi = HIST_EDGES[i] if i < len(HIST_EDGES) else self.max
+                return min(lo + (hi - lo) * (need - seen) / c, self.max)
+            seen += c
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.n, "total_s": self.total, "mean_ms": 1000 * self.total / max(self.n, 1),
+                "p50_ms": 1000 * self.percentile(50), "p90_ms": 1000 * self.percentile(90),
+                "p99_ms": 1000 * self.percentile(99), "max_ms": 1000 * self.max,
+                "buckets": [{"le_s": edge, "count": c} for edge, c in zip(HIST_EDGES + [None], self.counts) if c]}
+
+class CleanProfile:
+    """Collects per-file timings, bytes and per-class throughput for one clean run."""
+
+    def __init__(self):
+        self.stages: Dict[str, Histogram] = {}
+        self.bytes = Counter()  # read / written
+        self.classes: Dict[Tuple[str, str], Counter] = {}
+        self._lock = threading.Lock()  # writer threads report here too
+        self._t0 = self._last = time.perf_counter()
+        self.wall = 0.0
+
+    def add_times(self, times: Dict[str, float]) -> None:
+        with self._lock:
+            for stage, seconds in times.items():
+                self.stages.setdefault(stage, Histogram()).add(seconds)
+
+    def add_result(self, crop: str, cls: str, cached: Optional[Dict], res: Dict) -> None:
+        """Book one decided file. The time since the previous decision goes to its class,
+        which is exact because each class is contiguous in the stream."""
+        prof = res.pop("profile", None)
+        now = time.perf_counter()
+        c = self.classes.setdefault((crop, cls), Counter())
+        c["files"] += 1
+        c["seconds"] += now - self._last
+        self._last = now
+        if cached is not None:
+            c["cached"] += 1
+        elif prof is not None:
+            c["checked"] += 1
+            c["bytes_read"] += prof["bytes_read"]
+            self.bytes["read"] += prof["bytes_read"]
+            self.add_times(prof["times"])
+
+    # ---- writer-side wrappers (run on the pipeline's writer threads) ----
+    def kept_write(self, fn: Callable, src: Any, dst: Path) -> None:
+        lap = Lap()
+        fn(src, dst, lap=lap)
+        size = dst.stat().st_size
+        self.add_times(lap.times)
+        with self._lock:
+            self.bytes["written"] += size
+
+    def reject_write(self, fn: Callable, src: Path, dst: Path, *args) -> Any:
+        t0 = time.perf_counter()
+        storage = fn(src, dst, *args)
+        self.add_times({"reject_copy": time.perf_counter() - t0})
+        if storage == "copy":
+            with self._lock:
+                self.bytes["written"] += src.stat().st_size
+        return storage
+
+    def finish(self) -> None:
+        self.wall = time.perf_counter() - self._t0
+
+    # ---- output ----
+    def to_dict(self) -> Dict[str, Any]:
+        stage_total = sum(h.total for h in self.stages.values()) or 1.0
+        stages = {s: {**self.stages[s].to_dict(), "share": self.stages[s].total / stage_total}
+                  for s in self._stage_names()}
+        classes = []
+        for (crop, cls), c in self.classes.items():
+            secs = c["seconds"]
+            classes.append({"crop": crop, "class": cls, "files": c["files"], "checked": c["checked"],
+                            "cached": c["cached"], "bytes_read": c["bytes_read"], "seconds": secs,
+                            "files_per_s": c["files"] / secs if secs else 0.0,
+                            "mb_per_s": c["bytes_read"] / 1e6 / secs if secs else 0.0})
+        return {"wall_s": self.wall, "bytes_read": self.bytes["read"],
+                "bytes_written": self.bytes["written"], "stages": stages, "classes": classes}
+
+    def _stage_names(self) -> List[str]:
+        return [s for s in STAGE_ORDER if s in self.stages] + \
+               sorted(s for s in self.stages if s not in STAGE_ORDER)
+
+    def write(self, out_json: Path, extra: Optional[Dict[str, Any]] = None) -> Path:
+        """JSON with everything (histogram buckets included) and a flat CSV next to it."""
+        data = {**(extra or {}), **self.to_dict()}
+        out_json.parent.mkdir(parents=True, exist_ok=True)
+        out_json.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        out_csv = out_json.with_suffix(".csv")
+        with open(out_csv, "w", newline="", encoding="utf-8") as fp:
+            w = csv.writer(fp)
+            w.writerow(["kind", "name", "count", "total_s", "mean_ms", "p50_ms", "p90_ms", "p99_ms",
+                        "max_ms", "bytes", "files_per_s", "mb_per_s"])
+            for s, d in data["stages"].items():
+                w.writerow(["stage", s, d["count"], f"{d['total_s']:.6f}", f"{d['mean_ms']:.4f}",
+                            f"{d['p50_ms']:.4f}", f"{d['p90_ms']:.4f}", f"{d['p99_ms']:.4f}",
+                            f"{d['max_ms']:.4f}", "", "", ""])
+            for d in data["classes"]:
+                w.writerow(["class", f"{d['crop']}/{d['class']}", d["files"], f"{d['seconds']:.6f}",
+                            "", "", "", "", "", d["bytes_read"], f"{d['files_per_s']:.2f}",
+                            f"{d['mb_per_s']:.2f}"])
+            w.writerow(["total", "bytes_read", "", f"{self.wall:.6f}", "", "", "", "", "",
+                        self.bytes["read"], "", ""])
+            w.writerow(["total", "bytes_written", "", "", "", "", "", "", "", self.bytes["written"], "", ""])
+        return out_csv
+
+    def summary(self) -> List[str]:
+        data = self.to_dict()
+        lines = [f"   {'stage':<15} {'files':>7} {'total s':>8} {'share':>6} {'mean ms':>8} "
+                 f"{'p50 ms':>7} {'p90 ms':>7} {'p99 ms':>7} {'max ms':>8}"]
+        for s, d in data["stages"].items():
+            lines.append(f"   {s:<15} {d['count']:>7} {d['total_s']:>8.2f} {d['share']:>6.0%} "
+                         f"{d['mean_ms']:>8.2f} {d['p50_ms']:>7.2f} {d['p90_ms']:>7.2f} "
+                         f"{d['p99_ms']:>7.2f} {d['max_ms']:>8.2f}")
+        lines.append(f"   Bytes: {data['bytes_read'] / 1e6:.1f} MB read, "
+                     f"{data['bytes_written'] / 1e6:.1f} MB written in {data['wall_s']:.1f}s")
+        lines.append(f"   {'crop/class':<28} {'files':>7} {'checked':>8} {'cached':>7} "
+                     f"{'MB read':>8} {'s':>7} {'files/s':>8} {'MB/s':>6}")
+        for d in data["classes"]:
+            lines.append(f"   {d['crop'] + '/' + d['class']:<28} {d['files']:>7} {d['checked']:>8} "
+                         f"{d['cached']:>7} {d['bytes_read'] / 1e6:>8.1f} {d['seconds']:>7.2f} "
+                         f"{d['files_per_s']:>8.1f} {d['mb_per_s']:>6.1f}")
+        return lines
@@ -0,0 +1,289 @@
+import os
+import csv
+import sqlite3
+import time
+import multiprocessing as mp
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from PIL import Image, UnidentifiedImageError
+
+import batch_metrics as bm
+from clean_dataset import PHASH_CUTOFF, VALID_EXTS, to_gray_for_checks
+from phash_index import PHashIndex
+
+# ---------------- Global near-duplicate / leakage scan ----------------
+# Cleaning only dedupes inside one class folder of one crop. This scan hashes
+# everything under interim/ and processed/ (cached per file), groups
+# near-duplicates with PHashIndex + union-find, and reports:
+#   - cross-class / cross-crop collisions among cleaned images (interim/)
+#   - train/val/test leakage among prepared splits (processed/)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+ENV_PATH = PROJECT_ROOT / ".env"
+load_dotenv(dotenv_path=ENV_PATH)
+
+DATASET_ROOT = Path(os.getenv("DATASET_PATH", "")).resolve()
+INTERIM_BASE = Path(os.getenv("INTERIM_PATH", str(DATASET_ROOT))).resolve()
+PROCESSED_BASE = Path(os.getenv("PROCESSED_PATH", str(INTERIM_BASE))).resolve()
+INTERIM_ROOT = INTERIM_BASE / "interim"
+PROCESSED_ROOT = PROCESSED_BASE / "processed"
+
+SPLITS = ("train", "val", "test")
+
+# ---------------- Collect ----------------
+def collect_entries() -> List[Dict[str, str]]:
+    """
+    One entry per image:
+      interim/<crop>/<class>/<file>           -> area=interim, class=<class>
+      processed/<crop>/<split>/<Label>/<file> -> area=processed, class=<Label>, split=<split>
+    Processed entries come from manifest.csv when present, else from the folders.
+    Folders starting with '_' (_rejects, caches) are skipped.
+    entry['image'] = (crop, interim class, cleaned name) identifies the interim image an
+    entry stands for, so an image and its processed copies share it (from the manifest
+    'source'; for folders, from the content-addressed name <class>_<sha1>.jpg).
+    """
+    entries: List[Dict[str, str]] = []
+
+    def images_in(d: Path):
+        with os.scandir(d) as it:
+            for e in it:
+                if e.is_file() and os.path.splitext(e.name)[1].lower() in VALID_EXTS:
+                    yield e
+
+    if INTERIM_ROOT.exists():
+        for crop_dir in sorted(p for p in INTERIM_ROOT.iterdir() if p.is_dir() and not p.name.startswith("_")):
+            for cls_dir in sorted(p for p in crop_dir.iterdir() if p.is_dir() and not p.name.startswith("_")):
+                for e in images_in(cls_dir):
+                    entries.append({"path": e.path, "area": "interim", "crop": crop_dir.name,
+                                    "class": cls_dir.name, "split": "",
+                                    "image": (crop_dir.name, cls_dir.name, e.name)})
+    if PROCESSED_ROOT.exists():
+        for crop_dir in sorted(p for p in PROCESSED_ROOT.iterdir() if p.is_dir()):
+            manifest = crop_dir / "manifest.csv"
+            if manifest.exists():
+                # The manifest is the source of truth (links and manifest-only prepares included)
+                with open(manifest, newline="", encoding="utf-8") as fp:
+                    for row in csv.DictReader(fp):
+                        if row.get("storage") == "manifest-only":
+                            path = row["source"]
+                        else:
+                            path = str(PROCESSED_ROOT / row["filepath"])
+                        entries.append({"path": path, "area": "processed", "crop": crop_dir.name,
+                                        "class": row["class"], "split": row["split"],
+                                        "image": (crop_dir.name, Path(row["source"]).parent.name,
+                                                  Path(row["source"]).name)})
+                continue
+            for split in SPLITS:
+                split_dir = crop_dir / split
+                if not split_dir.is_dir():
+                    continue
+                for lbl_dir in sorted(p for p in split_dir.iterdir() if p.is_dir()):
+                    for e in images_in(lbl_dir):
+                        entries.append({"path": e.path, "area": "processed", "crop": crop_dir.name,
+                                        "class": lbl_dir.name, "split": split,
+                                        "image": (crop_dir.name, e.name.rsplit("_", 1)[0], e.name)})
+    return entries
+
+# ---------------- Hash (cached) ----------------
+class HashCache:
+    """(path, size, mtime_ns) -> phash, so a rescan only hashes new or changed files."""
+
+    def __init__(self, db_path: Path):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, phash TEXT)"
+        )
+        self._rows = {r[0]: (r[1], r[2], r[3]) for r in self.conn.execute("SELECT * FROM hashes")}
+
+    def get(self, path: str, st: os.stat_result) -> Optional[str]:
+        row = self._rows.get(path)
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        return None
+
+    def put_many(self, rows: List[Tuple[str, int, int, str]]) -> None:
+        self.conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?,?,?,?)", rows)
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+def hash_file(path: str) -> Optional[str]:
+    """phash on the same reduced grayscale decode as clean_dataset --fast-check (worker side)."""
+    try:
+        with Image.open(path) as im:
+            return bm.phash(to_gray_for_checks(im))
+    except (UnidentifiedImageError, OSError):
+        return None
+
+def hash_entries(entries: List[Dict[str, str]], workers: int, cache: HashCache) -> int:
+    """Fill entry['phash'] for every entry; returns how many files had to be decoded."""
+    todo: List[Tuple[Dict[str, str], os.stat_result]] = []
+    for e in entries:
+        try:
+            st = os.stat(e["path"])
+        except OSError as err:
+            # Broken symlink (--materialize symlink) or a file removed mid-scan
+            print(f"⚠️  Skipping {e['path']}: {err.strerror}")
+            e["phash"] = None
+            continue
+        e["phash"] = cache.get(e["path"], st)
+        if e["phash"] is None:
+            todo.append((e, st))
+    if not todo:
+        return 0
+
+    paths = [e["path"] for e, _ in todo]
+    if workers > 1:
+        with mp.Pool(processes=workers) as pool:
+            hashes = pool.map(hash_file, paths, chunksize=max(1, len(paths) // (workers * 8)))
+    else:
+        hashes = [hash_file(p) for p in paths]
+
+    rows = []
+    for (e, st), ph in zip(todo, hashes):
+        e["phash"] = ph
+        if ph is not None:
+            rows.append((e["path"], st.st_size, st.st_mtime_ns, ph))
+    cache.put_many(rows)
+    return len(todo)
+
+# ---------------- Group ----------------
+def group_near_duplicates(entries: List[Dict[str, str]], radius: int) -> List[List[int]]:
+    """Union-find over radius queries; returns groups (entry indices) with 2+ distinct images."""
+    parent = list(range(len(entries)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    index = PHashIndex(radius=radius)
+    for i, e in enumerate(entries):
+        if e.get("phash") is None:
+            continue
+        for _d, j in index.query(e["phash"]):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[ri] = rj
+        index.add(e["phash"], i)
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for i, e in enumerate(entries):
+        if e.get("phash") is not None:
+            groups[find(i)].append(i)
+    # One image plus its processed copies is an expected group, not a duplicate;
+    # keep groups with 2+ distinct images (by identity: basenames repeat across crops)
+    return [g for g in groups.values() if len({entries[i]["image"] for i in g}) > 1]
+
+def classify_group(entries: List[Dict[str, str]], group: List[int]) -> Dict[str, object]:
+    """What makes this group a problem (if anything)."""
+    interim_classes = sorted({(entries[i]["crop"], entries[i]["class"]) for i in group
+                              if entries[i]["area"] == "interim"})
+    splits_by_crop: Dict[str, set] = defaultdict(set)
+    labels_by_crop: Dict[str, set] = defaultdict(set)
+    for i in group:
+        e = entries[i]
+        if e["area"] == "processed":
+            splits_by_crop[e["crop"]].add(e["split"])
+            labels_by_crop[e["crop"]].add(e["class"])
+    return {
+        "cross_class": len(interim_classes) > 1,
+        "cross_crop": len({c for c, _ in interim_classes}) > 1,
+        "split_leak": any(len(s) > 1 for s in splits_by_crop.values()),
+        "label_conflict": any(len(s) > 1 for s in labels_by_crop.values()),
+        "classes": [f"{c}/{k}" for c, k in interim_classes],
+        "splits": {c: sorted(s) for c, s in splits_by_crop.items()},
+    }
+
+# ---------------- Report ----------------
+def write_reports(entries, groups, findings, out_csv: Path, out_md: Path, radius: int, elapsed: float):
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_csv, "w", newline="", encoding="utf-8") as fp:
+        w = csv.writer(fp)
+        w.writerow(["group", "issues", "area", "crop", "class", "split", "phash", "path"])
+        for gi, (group, f) in enumerate(zip(groups, findings)):
+            issues = ";".join(k for k in ("cross_class", "cross_crop", "split_leak", "label_conflict") if f[k])
+            if not issues:
+                continue
+            for i in group:
+                e = entries[i]
+                w.writerow([gi, issues, e["area"], e["crop"], e["class"], e["split"], e["phash"], e["path"]])
+
+    def count(key):
+        return sum(1 for f in findings if f[key])
+
+    leaked_images = sum(len(g) for g, f in zip(groups, findings) if f["split_leak"])
+    out_md.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_md, "w", encoding="utf-8") as f:
+        f.write("# Duplicate / Leakage Scan\n\n")
+        f.write(f"- **INTERIM root**: `{INTERIM_ROOT}`\n")
+        f.write(f"- **PROCESSED root**: `{PROCESSED_ROOT}`\n")
+        f.write(f"- **Images scanned**: {len(entries)} (radius {radius}, {elapsed:.1f}s)\n")
+        f.write(f"- **Near-duplicate groups**: {len(groups)}\n\n")
+        f.write(f"- **Cross-class groups (interim)**: {count('cross_class')}\n")
+        f.write(f"- **Cross-crop groups (interim)**: {count('cross_crop')}\n")
+        f.write(f"- **Split-leakage groups (processed)**: {count('split_leak')} ({leaked_images} images)\n")
+        f.write(f"- **Label-conflict groups (processed)**: {count('label_conflict')}\n\n")
+
+        leaks = [(g, fi) for g, fi in zip(groups, findings) if fi["split_leak"]]
+        if leaks:
+            f.write("### Split leakage by crop\n")
+            per_crop: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+            for _g, fi in leaks:
+                for crop, splits in fi["splits"].items():
+                    if len(splits) > 1:
+                        per_crop[crop]["/".join(splits)] += 1
+            for crop in sorted(per_crop):
+                pretty = ", ".join(f"{k}: {v}" for k, v in sorted(per_crop[crop].items()))
+                f.write(f"- **{crop}**: {pretty}\n")
+            f.write("\n")
+        f.write(f"Details: `{out_csv}`\n")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Global near-duplicate and train/val/test leakage scan")
+    parser.add_argument("--radius", type=int, default=PHASH_CUTOFF, help="Hamming radius (default PHASH_CUTOFF)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="processes for hashing new/changed files")
+    parser.add_argument("--fail-on-leak", action="store_true", help="exit 1 if any split leakage is found")
+    parser.add_argument("--out", default="", help="Markdown report path (default <INTERIM>/_dupe_scan.md)")
+    args = parser.parse_args()
+    if not bm.PHASH_AVAILABLE:
+        raise SystemExit("❌ dupe_scan needs scipy for phash (pip install scipy)")
+
+    t0 = time.perf_counter()
+    entries = collect_entries()
+    print(f"Found {len(entries)} images under {INTERIM_ROOT} and {PROCESSED_ROOT}")
+
+    cache = HashCache(INTERIM_ROOT / "_dupe_scan_cache.sqlite")
+    try:
+        decoded = hash_entries(entries, args.workers, cache)
+    finally:
+        cache.close()
+    t_hash = time.perf_counter() - t0
+    print(f"Hashed: {decoded} new/changed, {len(entries) - decoded} from cache ({t_hash:.1f}s)")
+
+    groups = group_near_duplicates(entries, args.radius)
+    findings = [classify_group(entries, g) for g in groups]
+    elapsed = time.perf_counter() - t0
+
+    out_csv = INTERIM_ROOT / "_dupe_groups.csv"
+    out_md = Path(args.out) if args.out else INTERIM_ROOT / "_dupe_scan.md"
+    write_reports(entries, groups, findings, out_csv, out_md, args.radius, elapsed)
+
+    n_leak = sum(1 for f in findings if f["split_leak"])
+    print(f"\n✅ {len(groups)} near-duplicate groups: "
+          f"{sum(1 for f in findings if f['cross_class'])} cross-class, "
+          f"{sum(1 for f in findings if f['cross_crop'])} cross-crop, {n_leak} split-leak "
+          f"({elapsed:.1f}s)")
+    print(f"   Report: {out_md}")
+    print(f"   Groups: {out_csv}")
+    if args.fail_on_leak and n_leak:
+        raise SystemExit(1)
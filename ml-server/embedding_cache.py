@@ -0,0 +1,89 @@
+import json
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+# ---------------- Frozen-backbone embedding cache ----------------
+# With base.trainable = False only the Dense head learns, so the backbone's pooled
+# output per image never changes. Run it once (plus N fixed augmentation views for
+# train) and keep the features on disk:
+#   processed/<crop>/_embeddings/<manifest sha1[:16]>_<backbone>_<H>x<W>_v<views>/
+#     <split>_x.npy (float16, (N * views, D))  <split>_y.npy (int32)  meta.json
+#     <split>_keys.npy (manifest filepaths, when the datasets carry them)
+# Head-only epochs then take seconds, and changing dropout/learning rate re-trains
+# from the same files.
+
+EMB_DIR = "_embeddings"
+
+def embedding_model(base: tf.keras.Model, img_size: Tuple[int, int],
+                    preprocess: Callable) -> tf.keras.Model:
+    """Same path as the classifier up to GlobalAveragePooling2D (no augmentation)."""
+    inputs = tf.keras.Input(shape=(*img_size, 3))
+    x = tf.keras.layers.Lambda(preprocess)(inputs)
+    x = base(x, training=False)
+    outputs = tf.keras.layers.GlobalAveragePooling2D()(x)
+    return tf.keras.Model(inputs, outputs, name="embed")
+
+def cache_dir_for(root: Path, manifest_sha1: str, backbone: str, img_size: Tuple[int, int],
+                  views: int) -> Path:
+    h, w = img_size
+    return root / EMB_DIR / f"{manifest_sha1[:16]}_{backbone}_{h}x{w}_v{views}"
+
+def _embed(embed: tf.keras.Model, ds: tf.data.Dataset,
+           augment: Optional[tf.keras.Model]) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    xs, ys, ks = [], [], []
+    for imgs, labels, *keys in ds:
+        if augment is not None:
+            imgs = augment(imgs, training=True)
+        xs.append(embed(imgs, training=False).numpy().astype(np.float16))
+        ys.append(labels.numpy().astype(np.int32))
+        if keys:
+            ks.append(keys[0].numpy().astype(str))
+    return np.concatenate(xs), np.concatenate(ys), (np.concatenate(ks) if ks else None)
+
+def load_or_build(cache_dir: Path, datasets: Dict[str, tf.data.Dataset], embed: tf.keras.Model,
+                  augment: Optional[tf.keras.Model] = None, views: int = 1,
+                  meta: Optional[Dict] = None) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    {split: (features, labels)} from cache_dir, computing it first if missing.
+    datasets must be unshuffled and keep the remainder batch (every image once);
+    built with make_dataset(..., with_keys=True) the filepaths are kept too (load_keys).
+    train gets `views` passes: the clean image, then views-1 augmented ones;
+    val/test are embedded once, clean.
+    """
+    if not (cache_dir / "meta.json").exists():
+        tmp = cache_dir.with_name(cache_dir.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        counts = {}
+        for split, ds in datasets.items():
+            n_views = views if split == "train" else 1
+            parts = [_embed(embed, ds, augment if v > 0 else None) for v in range(n_views)]
+            x = np.concatenate([p[0] for p in parts])
+            y = np.concatenate([p[1] for p in parts])
+            np.save(tmp / f"{split}_x.npy", x)
+            np.save(tmp / f"{split}_y.npy", y)
+            if parts[0][2] is not None:
+                np.save(tmp / f"{split}_keys.npy", np.concatenate([p[2] for p in parts]))
+            counts[split] = int(len(y))
+        with open(tmp / "meta.json", "w", encoding="utf-8") as fp:
+            json.dump({**(meta or {}), "views": views, "rows": counts}, fp, indent=2)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        tmp.rename(cache_dir)
+    return {split: (np.load(cache_dir / f"{split}_x.npy"), np.load(cache_dir / f"{split}_y.npy"))
+            for split in datasets}
+
+def load_keys(cache_dir: Path, split: str) -> Optional[np.ndarray]:
+    """Manifest filepath per row of <split>_x.npy, or None for caches built without keys."""
+    path = cache_dir / f"{split}_keys.npy"
+    return np.load(path) if path.exists() else None
+
+def make_head(dim: int, dropout: float, n_classes: int = 2) -> tf.keras.Model:
+    """Dropout + softmax Dense, layer names matching the full classifier's head."""
+    inputs = tf.keras.Input(shape=(dim,))
+    x = tf.keras.layers.Dropout(dropout, name="head_dropout")(inputs)
+    outputs = tf.keras.layers.Dense(n_classes, activation="softmax", name="head")(x)
+    return tf.keras.Model(inputs, outputs, name="head_only")
@@ -0,0 +1,166 @@
+import csv
+import json
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from inference_server import CLASS_NAMES, decide
+
+# ---------------- Single-pass streaming evaluation ----------------
+# One pass over a split scores every sample (no drop_remainder) and feeds two sinks:
+#   StreamingMetrics   confusion matrix, loss, accuracy, per-class P/R/F1, At-Risk rate
+#   predictions CSV    filepath, label, pred, probabilities, decision, At-Risk flag/reasons
+# Nothing is held per sample in memory, and later analysis (error review, threshold
+# tuning) reads the CSV instead of re-running the model.
+# The At-Risk flag uses the serving rules (inference_server.decide) on the
+# probabilities alone; the photo quality pre-checks need the raw upload.
+
+PRED_HEADER = ["filepath", "label", "pred"] + [f"p_{c}" for c in CLASS_NAMES] + \
+              ["decision", "at_risk", "reasons"]
+
+class StreamingMetrics:
+    """Accumulates per batch; report() can be called at any point."""
+
+    def __init__(self, class_names: Sequence[str] = CLASS_NAMES):
+        self.class_names = list(class_names)
+        k = len(self.class_names)
+        self.cm = np.zeros((k, k), dtype=np.int64)  # rows = true, cols = predicted
+        self.loss_sum = 0.0
+        self.at_risk = 0
+        self.confident_correct = 0  # correct among samples not flagged At-Risk
+
+    @property
+    def n(self) -> int:
+        return int(self.cm.sum())
+
+    def update(self, y_true: np.ndarray, probs: np.ndarray, at_risk: np.ndarray) -> None:
+        k = len(self.class_names)
+        y_pred = probs.argmax(axis=1)
+        self.cm += np.bincount(y_true * k + y_pred, minlength=k * k).reshape(k, k)
+        p_true = probs[np.arange(len(y_true)), y_true]
+        self.loss_sum += float(-np.log(np.clip(p_true, 1e-7, 1.0)).sum())
+        self.at_risk += int(at_risk.sum())
+        self.confident_correct += int(((y_pred == y_true) & ~at_risk).sum())
+
+    def report(self) -> Dict:
+        n = max(self.n, 1)
+        tp = np.diag(self.cm).astype(np.float64)
+        predicted = self.cm.sum(axis=0)
+        support = self.cm.sum(axis=1)
+        precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+        recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+        denom = precision + recall
+        f1 = np.divide(2 * precision * recall, denom, out=np.zeros_like(tp), where=denom > 0)
+        confident = self.n - self.at_risk
+        return {
+            "samples": self.n,
+            "loss": self.loss_sum / n,
+            "accuracy": float(tp.sum() / n),
+            "per_class": {c: {"precision": float(precision[i]), "recall": float(recall[i]),
+                              "f1": float(f1[i]), "support": int(support[i])}
+                          for i, c in enumerate(self.class_names)},
+            "macro_f1": float(f1.mean()),
+            "at_risk": self.at_risk,
+            "at_risk_rate": self.at_risk / n,
+            "confident_accuracy": self.confident_correct / confident if confident else 0.0,
+            "confusion_matrix": self.cm.tolist(),
+        }
+
+def evaluate_stream(batches: Iterable[Tuple[np.ndarray, np.ndarray, Sequence[str]]],
+                    predict_fn: Callable[[np.ndarray], np.ndarray],
+                    out_csv: Optional[Path] = None, log_every: int = 0) -> Dict:
+    """
+    batches yields (images or features, int labels, filepaths); predict_fn maps the first
+    to (B, n_classes) probabilities. Each batch is scored once, folded into the metrics
+    and appended to out_csv.
+    """
+    metrics = StreamingMetrics()
+    fp = open(out_csv, "w", newline="", encoding="utf-8") if out_csv else None
+    writer = csv.writer(fp) if fp else None
+    if writer:
+        writer.writerow(PRED_HEADER)
+    t0 = time.perf_counter()
+    try:
+        for b, (x, y, keys) in enumerate(batches, 1):
+            probs = np.asarray(predict_fn(x), dtype=np.float32)
+            y = np.asarray(y, dtype=np.int64)
+            decisions = [decide(p, []) for p in probs]
+            at_risk = np.array([d["label"] == "At-Risk" for d in decisions], dtype=bool)
+            metrics.update(y, probs, at_risk)
+            if writer:
+                pred = probs.argmax(axis=1)
+                writer.writerows(
+                    [key, CLASS_NAMES[yi], CLASS_NAMES[pi], *(f"{v:.6f}" for v in p),
+                     d["label"], int(r), ";".join(d["reasons"])]
+                    for key, yi, pi, p, d, r in zip(keys, y, pred, probs, decisions, at_risk))
+            if log_every and b % log_every == 0:
+                print(f"  {metrics.n} samples, acc so far {metrics.report()['accuracy']:.4f}")
+    finally:
+        if fp:
+            fp.close()
+    report = metrics.report()
+    report["seconds"] = time.perf_counter() - t0
+    return report
+
+def tf_batches(ds) -> Iterator[Tuple[np.ndarray, np.ndarray, List[str]]]:
+    """Adapt make_dataset(..., with_keys=True) to evaluate_stream."""
+    for imgs, labels, keys in ds:
+        yield imgs.numpy(), labels.numpy(), [k.decode() for k in keys.numpy()]
+
+def array_batches(x: np.ndarray, y: np.ndarray, keys: Optional[np.ndarray],
+                  batch_size: int = 256) -> Iterator[Tuple[np.ndarray, np.ndarray, List[str]]]:
+    """Same, for in-memory features (head-only training)."""
+    for i in range(0, len(y), batch_size):
+        k = keys[i:i + batch_size].tolist() if keys is not None else [""] * len(y[i:i + batch_size])
+        yield x[i:i + batch_size].astype(np.float32), y[i:i + batch_size], k
+
+def print_report(report: Dict) -> None:
+    print(f"\nSamples: {report['samples']}  loss {report['loss']:.4f}  "
+          f"accuracy {report['accuracy']:.4f}  macro F1 {report['macro_f1']:.4f}")
+    print("Confusion matrix (rows = true, cols = predicted):")
+    names = list(report["per_class"])
+    print(f"  {'':<10}" + "".join(f"{c:>10}" for c in names))
+    for c, row in zip(names, report["confusion_matrix"]):
+        print(f"  {c:<10}" + "".join(f"{v:>10}" for v in row))
+    print(f"\n  {'class':<10}{'precision':>10}{'recall':>10}{'f1':>10}{'support':>10}")
+    for c, m in report["per_class"].items():
+        print(f"  {c:<10}{m['precision']:>10.4f}{m['recall']:>10.4f}{m['f1']:>10.4f}{m['support']:>10}")
+    print(f"\nAt-Risk: {report['at_risk']} ({report['at_risk_rate']:.1%}); "
+          f"accuracy on the rest {report['confident_accuracy']:.4f}")
+
+def save_report(report: Dict, out_json: Path, **extra) -> None:
+    with open(out_json, "w", encoding="utf-8") as fp:
+        json.dump({**extra, **report}, fp, indent=2)
+
+if __name__ == "__main__":
+    import argparse
+    from input_pipeline import LoaderConfig, make_dataset, select_source
+    from inference_server import IMG_SIZE, keras_predict_fn, tflite_predict_fn
+    from prepare_v1 import PROCESSED_ROOT
+
+    parser = argparse.ArgumentParser(description="Score every sample of a split once; write metrics + per-sample predictions")
+    parser.add_argument("--crop", required=True, help="e.g., tomato, rice")
+    parser.add_argument("--split", default="test", choices=["train", "val", "test"])
+    parser.add_argument("--model", default="", help=".keras or .tflite (default: processed/<crop>/best_model.keras)")
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0, help="TFLite interpreter threads")
+    args = parser.parse_args()
+
+    root = PROCESSED_ROOT / args.crop.strip().lower()
+    model_path = Path(args.model) if args.model else root / "best_model.keras"
+    if not model_path.exists():
+        raise SystemExit(f"❌ model not found: {model_path}. Run train_tf_v1.py first.")
+    predict = (tflite_predict_fn(str(model_path), args.threads) if model_path.suffix == ".tflite"
+               else keras_predict_fn(str(model_path)))
+
+    source = select_source(root, IMG_SIZE)
+    ds = make_dataset(source, args.split, LoaderConfig(), shuffle=False, batch_size=args.batch,
+                      drop_remainder=False, verbose=False, with_keys=True)
+    out_csv = root / f"predictions_{args.split}.csv"
+    report = evaluate_stream(tf_batches(ds), predict, out_csv)
+    print_report(report)
+    out_json = root / f"eval_{args.split}.json"
+    save_report(report, out_json, model=str(model_path), split=args.split, source=source.describe())
+    print(f"\n✅ {report['samples']} samples in {report['seconds']:.1f}s\n   Predictions: {out_csv}\n   Report: {out_json}")
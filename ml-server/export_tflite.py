@@ -0,0 +1,144 @@
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import tensorflow as tf
+
+from inference_server import TFLiteModel
+from input_pipeline import LoaderConfig, make_dataset, select_source
+from prepare_v1 import PROCESSED_ROOT
+
+# ---------------- TFLite export + CPU benchmarks ----------------
+# Writes <crop>/export/model_{fp32,fp16,int8}.tflite from best_model.keras and compares
+# them on the test split: accuracy (and agreement with Keras), file size, single-image
+# latency and batch throughput, all on CPU.
+#   fp32  plain conversion (baseline for the runtime itself)
+#   fp16  float16 weights, float compute on CPU
+#   int8  full integer: weights + activations int8, uint8 0..255 image input,
+#         calibrated on a representative sample of the train split
+
+IMG_SIZE = (160, 160)
+VARIANTS = ("fp32", "fp16", "int8")
+
+def load_keras(model_path: Path) -> tf.keras.Model:
+    try:
+        # train_tf_v1 wraps preprocess_input in a Lambda layer; Keras 3 needs safe_mode off
+        return tf.keras.models.load_model(model_path, safe_mode=False)
+    except TypeError:
+        return tf.keras.models.load_model(model_path)
+
+def split_arrays(source, split: str, limit: int = 0):
+    """(uint8 images (N, H, W, 3), int32 labels) for a split, in manifest order."""
+    ds = make_dataset(source, split, LoaderConfig(), shuffle=False, batch_size=32,
+                      drop_remainder=False, verbose=False)
+    xs, ys = [], []
+    for imgs, labels in ds:
+        xs.append(imgs.numpy().astype(np.uint8))
+        ys.append(labels.numpy())
+        if limit and sum(len(x) for x in xs) >= limit:
+            break
+    x, y = np.concatenate(xs), np.concatenate(ys)
+    return (x[:limit], y[:limit]) if limit else (x, y)
+
+def convert(model: tf.keras.Model, variant: str, rep_images: Optional[np.ndarray] = None) -> bytes:
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant == "fp16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        def representative():
+            for img in rep_images:
+                yield [img[None].astype(np.float32)]
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8   # pixels are 0..255 already
+        converter.inference_output_type = tf.float32  # keep probabilities readable
+    return converter.convert()
+
+def predict_all(fn, x: np.ndarray, batch: int = 32) -> np.ndarray:
+    return np.concatenate([fn(x[i:i + batch]) for i in range(0, len(x), batch)])
+
+def time_single(fn, x: np.ndarray, runs: int) -> Dict[str, float]:
+    fn(x[:1])  # warm-up / allocate
+    lat = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        fn(x[i % len(x):i % len(x) + 1])
+        lat.append((time.perf_counter() - t0) * 1000)
+    return {"p50_ms": float(np.percentile(lat, 50)), "p99_ms": float(np.percentile(lat, 99))}
+
+def time_batch(fn, x: np.ndarray, batch: int, rounds: int) -> float:
+    xb = np.resize(x, (batch, *x.shape[1:])) if len(x) < batch else x[:batch]
+    fn(xb)
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn(xb)
+    return batch * rounds / (time.perf_counter() - t0)
+
+def print_report(rows: List[Dict]) -> None:
+    print(f"\n{'variant':<8} {'size MB':>8} {'acc':>7} {'Δacc':>7} {'agree':>7} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'img/s':>8}")
+    for r in rows:
+        print(f"{r['variant']:<8} {r['size_mb']:>8.2f} {r['accuracy']:>7.4f} {r['delta_acc']:>+7.4f} "
+              f"{r['agreement']:>7.4f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['batch_img_per_s']:>8.1f}")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export best_model.keras to TFLite fp32/fp16/int8 and benchmark on CPU")
+    parser.add_argument("--crop", required=True, help="e.g., tomato, rice")
+    parser.add_argument("--model", default="", help="default: processed/<crop>/best_model.keras")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="subset of fp32,fp16,int8")
+    parser.add_argument("--rep-samples", type=int, default=200, help="train images used to calibrate int8")
+    parser.add_argument("--threads", type=int, default=0, help="interpreter threads (default: runtime's choice)")
+    parser.add_argument("--latency-runs", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=32, help="batch size for the throughput number")
+    args = parser.parse_args()
+
+    crop = args.crop.strip().lower()
+    root = PROCESSED_ROOT / crop
+    model_path = Path(args.model) if args.model else root / "best_model.keras"
+    if not model_path.exists():
+        raise SystemExit(f"❌ model not found: {model_path}. Run train_tf_v1.py first.")
+    variants = [v for v in args.variants.split(",") if v]
+    if any(v not in VARIANTS for v in variants):
+        raise SystemExit(f"❌ --variants must be from {', '.join(VARIANTS)}")
+
+    source = select_source(root, IMG_SIZE)
+    model = load_keras(model_path)
+    x_test, y_test = split_arrays(source, "test")
+    print(f"Model: {model_path} ({model_path.stat().st_size / 1e6:.2f} MB)")
+    print(f"Test images: {len(y_test)} ({source.describe()})")
+
+    def keras_fn(x: np.ndarray) -> np.ndarray:
+        return model(x.astype(np.float32), training=False).numpy()
+
+    keras_pred = predict_all(keras_fn, x_test).argmax(axis=1)
+    keras_acc = float((keras_pred == y_test).mean())
+    rows = [{"variant": "keras", "size_mb": model_path.stat().st_size / 1e6, "accuracy": keras_acc,
+             "delta_acc": 0.0, "agreement": 1.0, **time_single(keras_fn, x_test, args.latency_runs),
+             "batch_img_per_s": time_batch(keras_fn, x_test, args.batch, 5)}]
+
+    out_dir = root / "export"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rep = split_arrays(source, "train", limit=args.rep_samples)[0] if "int8" in variants else None
+    for variant in variants:
+        path = out_dir / f"model_{variant}.tflite"
+        path.write_bytes(convert(model, variant, rep))
+        fn = TFLiteModel(path, args.threads)
+        pred = predict_all(fn, x_test).argmax(axis=1)
+        acc = float((pred == y_test).mean())
+        rows.append({"variant": variant, "path": str(path), "size_mb": path.stat().st_size / 1e6,
+                     "accuracy": acc, "delta_acc": acc - keras_acc,
+                     "agreement": float((pred == keras_pred).mean()),
+                     **time_single(fn, x_test, args.latency_runs),
+                     "batch_img_per_s": time_batch(fn, x_test, args.batch, 5)})
+
+    print_report(rows)
+    report = out_dir / "export_report.json"
+    report.write_text(json.dumps({"model": str(model_path), "test_images": int(len(y_test)),
+                                  "threads": args.threads, "batch": args.batch, "results": rows},
+                                 indent=2), encoding="utf-8")
+    print(f"\n✅ Exported to {out_dir}\n   Report: {report}")
@@ -0,0 +1,304 @@
+import io
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from quality import check_image
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+ENV_PATH = PROJECT_ROOT / ".env"
+load_dotenv(dotenv_path=ENV_PATH)
+
+# ---------------- Config ----------------
+CLASS_NAMES = ["Healthy", "Diseased"]  # model output order (train_tf_v1)
+IMG_SIZE = (160, 160)
+
+# At-Risk rules, docs/feature_scope.md
+AT_RISK_MAX_PROB = 0.70   # max(p_healthy, p_diseased) below this -> At-Risk
+AT_RISK_TIE = 0.15        # |p_healthy - p_diseased| below this -> At-Risk
+RETAKE_ADVICE = "Retake photo in good light, fill the frame with the leaf"
+
+# Image-quality pre-checks (quality.py holds the exposure thresholds shared with cleaning)
+MIN_SIDE = 128            # shorter side below this -> subject too small to judge
+BLUR_MIN = float(os.getenv("BLUR_MIN", "0"))  # Laplacian variance at quality.THUMB_SIDE; 0 = off
+
+MODEL_PATH = os.getenv("MODEL_PATH", "")
+
+# ---------------- Pre/post-processing ----------------
+def load_image(data: bytes) -> Image.Image:
+    with Image.open(io.BytesIO(data)) as im:
+        im.draft("RGB", (IMG_SIZE[1] * 2, IMG_SIZE[0] * 2))  # JPEG: decode near the model size
+        im = ImageOps.exif_transpose(im)
+        return im.convert("RGB")
+
+def to_model_input(img: Image.Image) -> np.ndarray:
+    """(H, W, 3) float32 in 0..255, stretched like tf.image.resize in training."""
+    h, w = IMG_SIZE
+    return np.asarray(img.resize((w, h), Image.BILINEAR), dtype=np.float32)
+
+def decide(probs: Optional[np.ndarray], issues: List[str]) -> Dict:
+    """Healthy / Diseased / At-Risk per docs/feature_scope.md."""
+    if issues:
+        return {"label": "At-Risk", "reasons": issues, "advice": RETAKE_ADVICE, "probs": None}
+    p = {name: float(probs[i]) for i, name in enumerate(CLASS_NAMES)}
+    reasons = []
+    if max(p.values()) < AT_RISK_MAX_PROB:
+        reasons.append("low_confidence")
+    if abs(p["Healthy"] - p["Diseased"]) < AT_RISK_TIE:
+        reasons.append("near_tie")
+    label = "At-Risk" if reasons else max(p, key=p.get)
+    out = {"label": label, "reasons": reasons, "probs": p}
+    if reasons:
+        out["advice"] = RETAKE_ADVICE
+    return out
+
+# ---------------- Dynamic micro-batching ----------------
+class MicroBatcher:
+    """
+    Request threads submit one input each; a single worker thread runs the model on
+    whatever has arrived, up to max_batch items, waiting at most max_delay_ms after
+    the first one. One model call per batch amortizes framework overhead across
+    concurrent requests. The worker only waits while other requests are still being
+    decoded (begin() .. submit()/cancel()), so a lone request never pays the delay.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch: int = 16, max_delay_ms: float = 10.0):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self._q: queue.Queue = queue.Queue()
+        self._incoming = 0
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self._worker = threading.Thread(target=self._loop, daemon=True)
+        self._worker.start()
+
+    def begin(self) -> None:
+        """A request started decoding and will submit (or cancel) soon."""
+        with self._lock:
+            self._incoming += 1
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._incoming -= 1
+
+    def submit(self, x: np.ndarray) -> Future:
+        fut: Future = Future()
+        self._q.put((x, fut))
+        self.cancel()
+        return fut
+
+    def _loop(self) -> None:
+        while True:
+            first = self._q.get()
+            batch = [first]
+            deadline = time.perf_counter() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._q.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                left = deadline - time.perf_counter()
+                if left <= 0 or self._incoming == 0:
+                    break  # nobody else is on the way
+                try:
+                    batch.append(self._q.get(timeout=min(left, 0.001)))
+                except queue.Empty:
+                    pass
+            try:
+                probs = self.predict_fn(np.stack([x for x, _ in batch]))
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, fut), p in zip(batch, probs):
+                fut.set_result((p, len(batch)))
+
+# ---------------- Model backends ----------------
+def keras_predict_fn(model_path: str) -> Callable[[np.ndarray], np.ndarray]:
+    import tensorflow as tf
+    try:
+        # train_tf_v1 wraps preprocess_input in a Lambda layer; Keras 3 needs safe_mode off
+        model = tf.keras.models.load_model(model_path, safe_mode=False)
+    except TypeError:
+        model = tf.keras.models.load_model(model_path)
+    model(np.zeros((1, *IMG_SIZE, 3), np.float32), training=False)  # build/trace once up front
+
+    def predict(x: np.ndarray) -> np.ndarray:
+        return model(x, training=False).numpy()
+    return predict
+
+class TFLiteModel:
+    """Batch-resizable interpreter wrapper; quantizes inputs when the model expects integers."""
+
+    def __init__(self, path: Path, threads: int = 0):
+        try:
+            # The standalone runtime is what CPU serving nodes install; full TF works too
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.interp = Interpreter(model_path=str(path), num_threads=threads or None)
+        self.inp = self.interp.get_input_details()[0]
+        self.out = self.interp.get_output_details()[0]
+        self.batch = 0
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        if len(x) != self.batch:
+            self.interp.resize_tensor_input(self.inp["index"], [len(x), *x.shape[1:]])
+            self.interp.allocate_tensors()
+            self.batch = len(x)
+        dtype = self.inp["dtype"]
+        if dtype in (np.uint8, np.int8):
+            scale, zero = self.inp["quantization"]
+            if scale:
+                x = np.round(x.astype(np.float32) / scale + zero)
+            info = np.iinfo(dtype)
+            x = np.clip(x, info.min, info.max).astype(dtype)
+        else:
+            x = x.astype(np.float32)
+        self.interp.set_tensor(self.inp["index"], x)
+        self.interp.invoke()
+        y = self.interp.get_tensor(self.out["index"])
+        if self.out["dtype"] != np.float32:
+            scale, zero = self.out["quantization"]
+            y = (y.astype(np.float32) - zero) * scale
+        return y
+
+def tflite_predict_fn(model_path: str, threads: int = 0) -> Callable[[np.ndarray], np.ndarray]:
+    """Models from export_tflite.py (fp32/fp16/int8); the batcher's single thread owns the interpreter."""
+    return TFLiteModel(Path(model_path), threads)
+
+def dummy_predict_fn(ms_per_batch: float = 5.0, ms_per_image: float = 1.0) -> Callable[[np.ndarray], np.ndarray]:
+    """Stand-in model with a fixed per-call + per-image cost, for measuring server/batching overhead."""
+    def predict(x: np.ndarray) -> np.ndarray:
+        time.sleep((ms_per_batch + ms_per_image * len(x)) / 1000.0)
+        g = x.reshape(len(x), -1).mean(axis=1) / 255.0
+        return np.stack([g, 1.0 - g], axis=1)
+    return predict
+
+# ---------------- HTTP ----------------
+class InferenceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients can reuse connections
+    disable_nagle_algorithm = True  # headers and body go out as separate writes; don't stall on ACKs
+    batcher: MicroBatcher = None
+    blur_min: float = BLUR_MIN
+
+    def log_message(self, fmt, *args):  # quiet: one line per request is too much under load
+        pass
+
+    def _send(self, code: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            b = self.batcher
+            self._send(200, {"status": "ok", "batches": b.batches, "items": b.items,
+                             "avg_batch": round(b.items / b.batches, 2) if b.batches else 0.0})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        """POST /predict with the raw image bytes as the body."""
+        if self.path != "/predict":
+            self._send(404, {"error": "not found"})
+            return
+        t0 = time.perf_counter()
+        n = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(n)
+        self.batcher.begin()
+        submitted = False  # submit() takes over the begin(); until then we owe a cancel()
+        try:
+            try:
+                with Image.open(io.BytesIO(data)) as probe:
+                    full_size = probe.size
+                img = load_image(data)
+                issues, _ = check_image(img, full_size, MIN_SIDE, self.blur_min)
+            except (UnidentifiedImageError, OSError, Image.DecompressionBombError, ValueError) as e:
+                self._send(400, {"error": f"body is not a usable image: {e}"})
+                return
+
+            batch_size = 0
+            probs = None
+            if not issues:  # failed pre-checks are At-Risk regardless of the model
+                fut = self.batcher.submit(to_model_input(img))
+                submitted = True
+                try:
+                    probs, batch_size = fut.result()
+                except Exception as e:
+                    self._send(500, {"error": f"model error: {e}"})
+                    return
+            out = decide(probs, issues)
+            out["batch_size"] = batch_size
+            out["latency_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            self._send(200, out)
+        finally:
+            if not submitted:
+                self.batcher.cancel()
+
+class InferenceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # listen backlog; the default 5 drops connections under load
+
+def serve(predict_fn: Callable[[np.ndarray], np.ndarray], host: str = "127.0.0.1", port: int = 8000,
+          max_batch: int = 16, max_delay_ms: float = 10.0, blur_min: float = BLUR_MIN) -> ThreadingHTTPServer:
+    handler = type("Handler", (InferenceHandler,), {"batcher": MicroBatcher(predict_fn, max_batch, max_delay_ms),
+                                                    "blur_min": blur_min})
+    return InferenceHTTPServer((host, port), handler)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Local Healthy/Diseased/At-Risk inference server")
+    parser.add_argument("--model", default=MODEL_PATH,
+                        help="best_model.keras or an export_tflite.py .tflite (default: MODEL_PATH in .env)")
+    parser.add_argument("--threads", type=int, default=0, help=".tflite interpreter threads")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=16, help="largest micro-batch per model call")
+    parser.add_argument("--max-delay-ms", type=float, default=10.0,
+                        help="how long the first request in a batch may wait for company")
+    parser.add_argument("--blur-min", type=float, default=BLUR_MIN,
+                        help="retake advice below this Laplacian variance (0 = blur check off)")
+    parser.add_argument("--dummy", action="store_true",
+                        help="no TensorFlow: fake model with a fixed cost (server/batching overhead only)")
+    args = parser.parse_args()
+
+    if args.dummy:
+        predict_fn = dummy_predict_fn()
+    else:
+        if not args.model or not Path(args.model).exists():
+            raise SystemExit(f"❌ model not found: {args.model!r} (pass --model or set MODEL_PATH)")
+        if args.model.endswith(".tflite"):
+            predict_fn = tflite_predict_fn(args.model, args.threads)
+        else:
+            predict_fn = keras_predict_fn(args.model)
+
+    server = serve(predict_fn, args.host, args.port, args.max_batch, args.max_delay_ms, args.blur_min)
+    print(f"✅ Serving on http://{args.host}:{args.port}  (POST /predict, GET /health)")
+    print(f"   Model: {'dummy' if args.dummy else args.model}")
+    print(f"   Micro-batching: max {args.max_batch} images, max {args.max_delay_ms} ms wait")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
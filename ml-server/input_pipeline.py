@@ -0,0 +1,295 @@
+import hashlib
+import json
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from tensor_cache import find_tensor_cache, open_split
+
+# ---------------- tf.data input pipeline ----------------
+# One loader for every on-disk layout prepare_v1/tensor_cache can produce, picked in
+# this order:
+#   tensor  pre-decoded uint8 memmaps (tensor_cache.py)        no decode
+#   shards  TFRecord shards (prepare_v1 --shards)               sequential reads + decode
+#   files   loose JPEGs, derivatives (deriv_<size>) if present  one open + decode per image
+# Decoded images are kept as uint8 until batching, so cache/shuffle/prefetch buffers
+# cost H*W*3 bytes per image rather than 4x that in float32.
+
+AUTOTUNE = tf.data.AUTOTUNE
+CLASS_NAMES = ["Healthy", "Diseased"]
+
+@dataclass
+class LoaderConfig:
+    cache: str = "none"          # none | memory | file
+    cache_dir: str = ""          # for cache=file; default <crop>/_tfdata_cache
+    prefetch: int = AUTOTUNE     # batches to prefetch; 0 = off, -1 = autotune
+    parallel: int = AUTOTUNE     # parallel decode calls; -1 = autotune
+    shuffle_buffer: int = 0      # 0 = as much of the split as the RAM budget allows
+    ram_budget_mb: int = 1024    # memory cache + shuffle buffer + prefetch must fit in this
+
+    def label(self) -> str:
+        def knob(v: int) -> str:
+            return "auto" if v == AUTOTUNE else str(v)
+        return f"cache={self.cache} prefetch={knob(self.prefetch)} parallel={knob(self.parallel)}"
+
+@dataclass
+class InputSource:
+    kind: str                    # tensor | shards | files
+    root: Path                   # processed/<crop>
+    df: pd.DataFrame             # manifest
+    img_size: Tuple[int, int]
+    use_deriv: bool
+    manifest_sha1: str
+    shard_dir: Optional[Path] = None
+    shard_index: Optional[Dict] = None
+    tensor_dir: Optional[Path] = None
+
+    def describe(self) -> str:
+        pixels = f"derivatives (deriv_{self.img_size[0]})" if self.use_deriv else "full resolution"
+        return {"tensor": f"pre-decoded tensor cache {self.tensor_dir.name if self.tensor_dir else ''}",
+                "shards": f"{pixels}, TFRecord shards",
+                "files": f"{pixels}, loose files"}[self.kind]
+
+def select_source(root: Path, img_size: Tuple[int, int]) -> InputSource:
+    """Pick the cheapest input layout available for the current manifest and img_size."""
+    manifest = root / "manifest.csv"
+    df = pd.read_csv(manifest)
+    sha1 = hashlib.sha1(manifest.read_bytes()).hexdigest()
+    deriv_col = f"deriv_{img_size[0]}"
+    use_deriv = bool(img_size[0] == img_size[1] and deriv_col in df.columns
+                     and df[deriv_col].notna().all())
+    src = InputSource("files", root, df, img_size, use_deriv, sha1)
+
+    tensor_dir = find_tensor_cache(root, img_size)
+    if tensor_dir is not None:
+        return replace(src, kind="tensor", tensor_dir=tensor_dir)
+
+    index_path = root / "_shards" / (str(img_size[0]) if use_deriv else "full") / "index.json"
+    if index_path.exists():
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+        if index.get("manifest_sha1") == sha1:
+            return replace(src, kind="shards", shard_dir=index_path.parent, shard_index=index)
+        print(f"(ignoring stale shards in {index_path.parent}; rerun prepare_v1.py --shards)")
+    return src
+
+def split_paths_labels(src: InputSource, split: str) -> Tuple[np.ndarray, np.ndarray]:
+    """File paths and label ids for a split, built column-wise (no per-row Python loop)."""
+    d = src.df[src.df["split"] == split]
+    processed_root = str(src.root.parent) + "/"
+    if src.use_deriv:
+        paths = processed_root + d[f"deriv_{src.img_size[0]}"].astype(str)
+    else:
+        paths = processed_root + d["filepath"].astype(str)
+        if "storage" in d.columns:
+            # manifest-only prepares write nothing under processed/; read the cleaned source
+            paths = paths.where(d["storage"] != "manifest-only", d["source"].astype(str))
+    labels = d["class"].map({c: i for i, c in enumerate(CLASS_NAMES)})
+    return paths.to_numpy(dtype=str), labels.to_numpy(dtype=np.int32)
+
+def split_keys(src: InputSource, split: str) -> np.ndarray:
+    """Manifest filepath of each row in a split, in manifest order."""
+    return src.df.loc[src.df["split"] == split, "filepath"].to_numpy(dtype=str)
+
+def split_size(src: InputSource, split: str) -> int:
+    return int((src.df["split"] == split).sum())
+
+# ---- element decoders (uint8 out) ----
+def _decode(img_bytes, src: InputSource):
+    img = tf.io.decode_jpeg(img_bytes, channels=3)  # force RGB
+    if not src.use_deriv:
+        img = tf.cast(tf.round(tf.image.resize(img, src.img_size)), tf.uint8)
+    img.set_shape((*src.img_size, 3))                # enforce static shape
+    return img
+
+def _elements_files(src: InputSource, split: str, cfg: LoaderConfig,
+                    with_keys: bool = False) -> tf.data.Dataset:
+    paths, labels = split_paths_labels(src, split)
+    if with_keys:
+        ds = tf.data.Dataset.from_tensor_slices((paths, labels, split_keys(src, split)))
+        return ds.map(lambda p, y, k: (_decode(tf.io.read_file(p), src), y, k),
+                      num_parallel_calls=cfg.parallel)
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    return ds.map(lambda p, y: (_decode(tf.io.read_file(p), src), y), num_parallel_calls=cfg.parallel)
+
+def _elements_shards(src: InputSource, split: str, cfg: LoaderConfig, shuffle: bool,
+                     seed: int, with_keys: bool = False) -> tf.data.Dataset:
+    files = [str(src.shard_dir / s["file"]) for s in src.shard_index["splits"][split]["shards"]]
+    ds = tf.data.Dataset.from_tensor_slices(files)
+    if shuffle:
+        ds = ds.shuffle(len(files), seed=seed)
+    # Several shards stream at once; each is one large sequential read
+    ds = ds.interleave(
+        lambda f: tf.data.TFRecordDataset(f, buffer_size=8 << 20),
+        cycle_length=max(1, min(len(files), 8)),
+        num_parallel_calls=cfg.parallel,
+        deterministic=not shuffle,
+    )
+    spec = {"image": tf.io.FixedLenFeature([], tf.string),
+            "label": tf.io.FixedLenFeature([], tf.int64)}
+    if with_keys:
+        # Interleaved shards don't come back in manifest order; the record carries its filepath
+        spec["filepath"] = tf.io.FixedLenFeature([], tf.string)
+
+    def _parse(record):
+        ex = tf.io.parse_single_example(record, spec)
+        out = (_decode(ex["image"], src), tf.cast(ex["label"], tf.int32))
+        return out + (ex["filepath"],) if with_keys else out
+
+    return ds.map(_parse, num_parallel_calls=cfg.parallel)
+
+def _batches_tensor(src: InputSource, split: str, cfg: LoaderConfig, shuffle: bool,
+                    batch_size: int, seed: int, drop_remainder: bool,
+                    with_keys: bool = False) -> tf.data.Dataset:
+    images, labels = open_split(src.tensor_dir, split)  # read-only mmap, shared page cache
+    keys = split_keys(src, split) if with_keys else None
+    n = len(labels)
+    rng = np.random.default_rng(seed)
+    n_batches = n // batch_size if drop_remainder else -(-n // batch_size)
+
+    def _batches():
+        order = rng.permutation(n) if shuffle else np.arange(n)
+        for s in range(n_batches):
+            # Sorted gather walks the memmap forward; order inside a batch doesn't matter
+            idx = np.sort(order[s * batch_size:(s + 1) * batch_size])
+            if with_keys:
+                yield images[idx], labels[idx], keys[idx]
+            else:
+                yield images[idx], labels[idx]
+
+    batch_dim = batch_size if drop_remainder else None
+    signature = (
+        tf.TensorSpec((batch_dim, *src.img_size, 3), tf.uint8),
+        tf.TensorSpec((batch_dim,), tf.int32),
+    )
+    if with_keys:
+        signature += (tf.TensorSpec((batch_dim,), tf.string),)
+    return tf.data.Dataset.from_generator(_batches, output_signature=signature)
+
+# ---- RAM budget ----
+def plan_memory(src: InputSource, split: str, cfg: LoaderConfig, batch_size: int) -> Tuple[LoaderConfig, List[str]]:
+    """
+    Fit cache/shuffle/prefetch into cfg.ram_budget_mb: a memory cache that would not
+    fit drops to the file cache, the auto shuffle buffer takes what is left, and a
+    fixed prefetch depth is capped. Returns the adjusted config and notes on what changed.
+    """
+    notes = []
+    h, w = src.img_size
+    img_bytes = h * w * 3
+    budget = cfg.ram_budget_mb << 20
+    n = split_size(src, split)
+
+    if src.kind == "tensor" and cfg.cache != "none":
+        cfg = replace(cfg, cache="none")
+        notes.append("tensor cache is already decoded; tf.data cache skipped")
+    if cfg.cache == "memory":
+        if n * img_bytes > budget // 2:
+            cfg = replace(cfg, cache="file")
+            notes.append(f"memory cache ({n * img_bytes >> 20} MB) over half the RAM budget; using file cache")
+        else:
+            budget -= n * img_bytes
+
+    batch_bytes = batch_size * img_bytes * 4  # float32 after the cast
+    if cfg.prefetch > 0 and cfg.prefetch * batch_bytes > budget // 4:
+        depth = max(1, (budget // 4) // batch_bytes)
+        notes.append(f"prefetch {cfg.prefetch} -> {depth} batches to fit the RAM budget")
+        cfg = replace(cfg, prefetch=depth)
+    budget -= max(cfg.prefetch, 2) * batch_bytes  # autotune keeps a few batches
+
+    fit = max(batch_size, budget // img_bytes)
+    if cfg.shuffle_buffer <= 0:
+        cfg = replace(cfg, shuffle_buffer=int(min(n, fit)) or 1)
+    elif cfg.shuffle_buffer > fit:
+        notes.append(f"shuffle buffer {cfg.shuffle_buffer} -> {fit} to fit the RAM budget")
+        cfg = replace(cfg, shuffle_buffer=int(fit))
+    return cfg, notes
+
+def make_dataset(src: InputSource, split: str, cfg: LoaderConfig, shuffle: bool = True,
+                 batch_size: int = 16, seed: int = 42, drop_remainder: bool = True,
+                 verbose: bool = True, with_keys: bool = False) -> tf.data.Dataset:
+    """
+    (float32 images 0..255, int32 labels) batches for a split, per cfg.
+    with_keys adds a third element, each image's manifest filepath (for per-sample output).
+    """
+    cfg, notes = plan_memory(src, split, cfg, batch_size)
+    if verbose:
+        for note in notes:
+            print(f"  [{split}] {note}")
+
+    if src.kind == "tensor":
+        ds = _batches_tensor(src, split, cfg, shuffle, batch_size, seed, drop_remainder, with_keys)
+    else:
+        if src.kind == "shards":
+            ds = _elements_shards(src, split, cfg, shuffle, seed, with_keys)
+        else:
+            ds = _elements_files(src, split, cfg, with_keys)
+        if cfg.cache == "memory":
+            ds = ds.cache()
+        elif cfg.cache == "file":
+            cache_dir = Path(cfg.cache_dir) if cfg.cache_dir else src.root / "_tfdata_cache"
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            h, w = src.img_size
+            # Keyed like the tensor cache: a new manifest or size never reads old entries
+            keyed = "_keys" if with_keys else ""  # different element structure, separate file
+            ds = ds.cache(str(cache_dir / f"{src.manifest_sha1[:16]}_{h}x{w}_{src.kind}_{split}{keyed}"))
+        if shuffle:
+            ds = ds.shuffle(buffer_size=cfg.shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        ds = ds.batch(batch_size, drop_remainder=drop_remainder)
+
+    ds = ds.map(lambda x, y, *k: (tf.cast(x, tf.float32), y, *k), num_parallel_calls=cfg.parallel)
+    if cfg.prefetch != 0:
+        ds = ds.prefetch(cfg.prefetch)
+    return ds
+
+# ---- --benchmark-input ----
+def benchmark_configs(base: LoaderConfig) -> List[LoaderConfig]:
+    """cache x prefetch x parallel grid around the base config (RAM budget kept)."""
+    out = []
+    for cache in ("none", "memory", "file"):
+        for prefetch in (0, AUTOTUNE):
+            for parallel in (1, AUTOTUNE):
+                out.append(replace(base, cache=cache, prefetch=prefetch, parallel=parallel))
+    return out
+
+def benchmark_input(src: InputSource, configs: List[LoaderConfig], split: str = "train",
+                    batch_size: int = 16, epochs: int = 2, seed: int = 42) -> List[Dict]:
+    """
+    Iterate the input pipeline alone (no model) for each config and report images/sec
+    per epoch: epoch 1 includes filling any cache, later epochs read from it.
+    """
+    results = []
+    for cfg in configs:
+        planned, _ = plan_memory(src, split, cfg, batch_size)
+        if planned.cache == "file":
+            # Start every run cold so configs compare fairly
+            cache_dir = Path(cfg.cache_dir) if cfg.cache_dir else src.root / "_tfdata_cache"
+            for f in cache_dir.glob(f"{src.manifest_sha1[:16]}_*_{split}*"):
+                f.unlink()
+        ds = make_dataset(src, split, cfg, shuffle=True, batch_size=batch_size, seed=seed, verbose=False)
+        per_epoch = []
+        for _ in range(epochs):
+            n = 0
+            t0 = time.perf_counter()
+            for imgs, _ in ds:
+                n += int(imgs.shape[0])
+            dt = time.perf_counter() - t0
+            per_epoch.append(n / dt if dt > 0 else 0.0)
+        results.append({"config": cfg.label(), "effective": planned.label(),
+                        "shuffle_buffer": planned.shuffle_buffer, "img_per_s": per_epoch})
+    return results
+
+def print_benchmark(src: InputSource, results: List[Dict]) -> None:
+    print(f"\nInput benchmark ({src.describe()}):")
+    n_epochs = len(results[0]["img_per_s"]) if results else 0
+    head = "".join(f"{'epoch ' + str(i + 1):>10}" for i in range(n_epochs))
+    print(f"  {'config':<42}{head}  (images/sec)")
+    for r in results:
+        cells = "".join(f"{v:>10.1f}" for v in r["img_per_s"])
+        note = "" if r["effective"] == r["config"] else f"  -> {r['effective']}"
+        print(f"  {r['config']:<42}{cells}{note}")
+    best = max(results, key=lambda r: r["img_per_s"][-1])
+    print(f"  Best steady-state: {best['effective']} ({best['img_per_s'][-1]:.1f} img/s)")
@@ -0,0 +1,74 @@
+import errno
+import os
+import shutil
+from pathlib import Path
+
+# ---------------- Materialization modes ----------------
+# How a file from an earlier stage shows up in a later one:
+#   copy          full copy (shutil.copy2), works everywhere
+#   hardlink      same inode, zero extra space; same filesystem only
+#   symlink       link to the absolute source path
+#   reflink       copy-on-write clone (btrfs/XFS/bcachefs via FICLONE); same filesystem only
+#   manifest-only nothing on disk; manifests/indexes point at the source
+# Link modes that the filesystem refuses (cross-device, unsupported, no permission)
+# fall back to copy, so a run never fails just because of where the data lives.
+
+MODES = ("copy", "hardlink", "symlink", "reflink", "manifest-only")
+
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+# errnos meaning "this link type can't be used here", not "the data is broken"
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EOPNOTSUPP,
+                    errno.ENOTTY, errno.EINVAL, errno.ENOSYS, errno.EMLINK}
+
+def _reflink(src: Path, dst: Path) -> None:
+    import fcntl  # POSIX only; ImportError -> caller falls back
+    with open(src, "rb") as fs, open(dst, "wb") as fd:
+        try:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        except OSError:
+            fd.close()
+            dst.unlink()
+            raise
+    shutil.copystat(src, dst)
+
+def _clear(dst: Path) -> None:
+    if dst.is_symlink() or dst.exists():
+        dst.unlink()
+
+def materialize(src: Path, dst: Path, mode: str = "copy") -> str:
+    """
+    Make dst refer to src's content using mode. Returns the mode actually used
+    ("copy" after a fallback, "manifest-only" when nothing was written).
+    """
+    if mode not in MODES:
+        raise ValueError(f"unknown materialize mode: {mode}")
+    if mode == "manifest-only":
+        return mode
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if mode != "copy":
+        try:
+            if mode == "hardlink":
+                if dst.exists() and os.path.samefile(src, dst):
+                    return mode
+                _clear(dst)
+                os.link(src, dst)
+            elif mode == "symlink":
+                target = str(Path(src).resolve())
+                if dst.is_symlink() and os.readlink(dst) == target:
+                    return mode
+                _clear(dst)
+                os.symlink(target, dst)
+            elif mode == "reflink":
+                _clear(dst)
+                _reflink(src, dst)
+            return mode
+        except ImportError:
+            pass
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+    _clear(dst)
+    shutil.copy2(src, dst)
+    return "copy"
@@ -0,0 +1,105 @@
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# ---------------- Near-duplicate hash index ----------------
+# Multi-index hashing over packed integers. The hash is cut into m disjoint
+# blocks; by pigeonhole, any hash within distance r of the query is within
+# r // m of it on at least one block. Each block gets a dict bucket, and a lookup
+# probes every block value within r // m, so it only verifies the few hashes that
+# share a probed key instead of scanning all of them.
+
+HashLike = Union[str, int]
+
+def hex_to_int(h: str) -> int:
+    """imagehash hex string (str(imagehash.phash(img))) -> packed integer, same bit order."""
+    return int(h, 16)
+
+def popcount(x: int) -> int:
+    return bin(x).count("1")
+
+class PHashIndex:
+    """
+    Radius-query index for perceptual hashes (default 64-bit phash).
+
+        idx = PHashIndex(radius=PHASH_CUTOFF)
+        if not idx.any_within(ph):
+            idx.add(ph, f.name)
+
+    Hashes may be imagehash hex strings or ints. Queries with a radius larger
+    than the build radius are still correct but fall back to a linear scan.
+    """
+
+    def __init__(self, radius: int = 5, nbits: int = 64, n_blocks: Optional[int] = None):
+        if radius < 0:
+            raise ValueError("radius must be >= 0")
+        self.radius = radius
+        self.nbits = nbits
+        if n_blocks is None:
+            # ~20-bit blocks keep buckets near-empty up to ~1M hashes while the
+            # per-block probe count stays small (1 + 21 probes at radius 5).
+            n_blocks = min(radius + 1, max(1, nbits // 20))
+        n_blocks = max(1, min(n_blocks, nbits))
+        self._sub_radius = radius // n_blocks
+        # Spread bits as evenly as possible: first (nbits % n_blocks) blocks get one extra
+        base, extra = divmod(nbits, n_blocks)
+        self._blocks: List[Tuple[int, int, List[int]]] = []  # (shift, mask, probe xor masks)
+        shift = 0
+        for i in range(n_blocks):
+            width = base + (1 if i < extra else 0)
+            probes = [0]
+            for k in range(1, self._sub_radius + 1):
+                for bits in combinations(range(width), k):
+                    probes.append(sum(1 << b for b in bits))
+            self._blocks.append((shift, (1 << width) - 1, probes))
+            shift += width
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in self._blocks]
+        self._hashes: List[int] = []
+        self._payloads: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    @staticmethod
+    def _as_int(h: HashLike) -> int:
+        return hex_to_int(h) if isinstance(h, str) else int(h)
+
+    def add(self, h: HashLike, payload: Any = None) -> None:
+        x = self._as_int(h)
+        item = len(self._hashes)
+        self._hashes.append(x)
+        self._payloads.append(payload)
+        for (shift, mask, _), bucket in zip(self._blocks, self._buckets):
+            bucket.setdefault((x >> shift) & mask, []).append(item)
+
+    def _candidates(self, x: int):
+        seen = set()
+        for (shift, mask, probes), bucket in zip(self._blocks, self._buckets):
+            key = (x >> shift) & mask
+            for flip in probes:
+                for item in bucket.get(key ^ flip, ()):
+                    if item not in seen:
+                        seen.add(item)
+                        yield item
+
+    def query(self, h: HashLike, radius: Optional[int] = None) -> List[Tuple[int, Any]]:
+        """All (distance, payload) within radius, closest first."""
+        x = self._as_int(h)
+        r = self.radius if radius is None else radius
+        items = self._candidates(x) if r <= self.radius else range(len(self._hashes))
+        hits = []
+        for item in items:
+            d = popcount(x ^ self._hashes[item])
+            if d <= r:
+                hits.append((d, self._payloads[item]))
+        hits.sort(key=lambda t: t[0])
+        return hits
+
+    def any_within(self, h: HashLike, radius: Optional[int] = None) -> bool:
+        """True as soon as one stored hash is within radius (cheaper than query)."""
+        x = self._as_int(h)
+        r = self.radius if radius is None else radius
+        items = self._candidates(x) if r <= self.radius else range(len(self._hashes))
+        for item in items:
+            if popcount(x ^ self._hashes[item]) <= r:
+                return True
+        return False
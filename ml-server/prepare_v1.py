@@ -1,10 +1,21 @@
 import os
 import csv
-import shutil
+import json
+import hashlib
 from pathlib import Path
-from typing import List, Tuple, Dict
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import List, Tuple, Dict, Optional
 
+import numpy as np
 from dotenv import load_dotenv
+from PIL import Image
+
+from materialize import MODES as MATERIALIZE_MODES, materialize
+from shards import ShardWriter, encode_example
+from work_units import WorkUnit, largest_first, list_crops
 
 # Optional: use sklearn for stratified splitting if available
 try:
@@ -27,6 +38,11 @@ PROCESSED_ROOT = PROCESSED_BASE / "processed"
 
 VALID_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"}
 SEED = 42
+DERIV_DIR = "_derivatives"  # processed/<crop>/_derivatives/<size>/<cleaned filename>
+MANIFEST_HEADER = ["filepath", "class", "split", "crop", "source", "storage"]
+SHARD_DIR = "_shards"  # processed/<crop>/_shards/<full|size>/<split>-00000-of-000NN.tfrecord
+V1_CLASSES = ["Healthy", "Diseased"]  # label ids stored in shards (same order as train_tf_v1)
+SPLIT_MODES = ("random", "hash")
 
 def list_images(folder: Path) -> List[Path]:
     if not folder.exists(): return []
@@ -93,80 +109,398 @@ def stratified_split(pairs: List[Tuple[Path, str]], seed: int = SEED):
         Xte += te; Yte += [lbl]*len(te)
     return (Xtr, Ytr), (Xv, Yv), (Xte, Yte)
 
-def copy_to_processed(crop: str, split_name: str, xs: List[str], ys: List[str]) -> List[Tuple[str, str, str, str]]:
+def hash_unit(image_id: str, seed: int = SEED) -> float:
+    """Stable position in [0, 1) for an image, from its ID alone."""
+    digest = hashlib.sha1(f"{seed}:{image_id}".encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2.0 ** 64
+
+def hash_split(pairs: List[Tuple[Path, str]], seed: int = SEED):
+    """
+    Deterministic 70/20/10 per interim class folder (finer than the v1 label, so
+    every disease keeps its share). Images are ordered by hash_unit() of the cleaned
+    filename, which is content-addressed, and each class is cut at its quotas in
+    that order. Adding or removing k images only moves images sitting near the two
+    cut points (about k at most); the rest keep their split.
+    Same return shape as stratified_split().
+    """
+    by_class: Dict[str, List[Tuple[Path, str]]] = defaultdict(list)
+    for path, lbl in pairs:
+        by_class[path.parent.name].append((path, lbl))
+
+    out = {"train": ([], []), "val": ([], []), "test": ([], [])}
+    for cls in sorted(by_class):
+        items = sorted(by_class[cls], key=lambda pl: (hash_unit(pl[0].stem, seed), pl[0].name))
+        n = len(items)
+        n_val, n_test = int(round(n * 0.20)), int(round(n * 0.10))
+        if n >= 3:
+            n_val, n_test = max(1, n_val), max(1, n_test)
+        n_train = n - n_val - n_test
+        for split, part in (("train", items[:n_train]), ("val", items[n_train:n_train + n_val]),
+                            ("test", items[n_train + n_val:])):
+            out[split][0].extend(str(p) for p, _ in part)
+            out[split][1].extend(lbl for _, lbl in part)
+    return out["train"], out["val"], out["test"]
+
+def read_manifest(path: Path) -> Tuple[List[str], Dict[str, Tuple]]:
+    """(header, {filepath: row}) of an existing manifest.csv; empty if there is none."""
+    if not path.exists():
+        return [], {}
+    with open(path, newline="", encoding="utf-8") as fp:
+        reader = csv.reader(fp)
+        header = next(reader, [])
+        return header, {row[0]: tuple(row) for row in reader if row}
+
+def plan_processed(crop: str, split_name: str, xs: List[str], ys: List[str], mode: str,
+                   rows: List[list], units: Dict[str, WorkUnit],
+                   previous: Optional[Dict[str, Tuple]] = None, reused: Optional[Counter] = None) -> None:
     """
-    Copy files into processed/<crop>/<split>/<Label>/ and return manifest rows:
-    (filepath_rel, class, split, crop)
+    Append this split's manifest rows to `rows`:
+    [filepath_rel, class, split, crop, source, storage]
+    and queue the files to materialize into processed/<crop>/<split>/<Label>/ on the
+    unit of their interim class (run_units() does the work and fills in `storage`:
+    how the file actually landed; link modes fall back to copy). With manifest-only
+    nothing is written and loaders read `source` directly.
+    Rows of `previous` (the last manifest) with the same source, a compatible storage
+    and the file still in place are kept without touching disk (counted in `reused`).
     """
-    rows = []
     root = PROCESSED_ROOT / crop / split_name
-    (root / "Healthy").mkdir(parents=True, exist_ok=True)
-    (root / "Diseased").mkdir(parents=True, exist_ok=True)
+    if mode != "manifest-only":
+        (root / "Healthy").mkdir(parents=True, exist_ok=True)
+        (root / "Diseased").mkdir(parents=True, exist_ok=True)
 
     for src, lbl in zip(xs, ys):
         srcp = Path(src)
-        dst_folder = root / lbl
-        dst_folder.mkdir(parents=True, exist_ok=True)
-        dst = dst_folder / srcp.name  # keep cleaned filename
-        shutil.copy2(srcp, dst)
+        dst = root / lbl / srcp.name  # keep cleaned filename
         rel = f"{crop}/{split_name}/{lbl}/{dst.name}"
-        rows.append((rel, lbl, split_name, crop))
-    return rows
+        source = str(srcp.resolve())
+        row = [rel, lbl, split_name, crop, source, mode]
+        rows.append(row)
+        old = (previous or {}).get(rel)
+        # A link mode that fell back to copy last time would fall back again
+        if (old is not None and len(old) > 5 and old[4] == source
+                and (old[5] == mode or (old[5] == "copy" and mode != "manifest-only"))
+                and (mode == "manifest-only" or dst.exists())):
+            row[5] = old[5]
+            if reused is not None:
+                reused[split_name] += 1
+        elif mode != "manifest-only":
+            unit = units.setdefault(srcp.parent.name, WorkUnit(crop, srcp.parent.name))
+            unit.items.append((materialize, (srcp, dst, mode), partial(row.__setitem__, 5)))
+            unit.cost += srcp.stat().st_size if mode in ("copy", "reflink") else 0
+
+def remove_stale(old_header: List[str], previous: Dict[str, Tuple],
+                 rows: List[Tuple], header: List[str]) -> int:
+    """
+    Delete processed files (and derivatives) the previous manifest put on disk but the
+    new one doesn't: images gone from interim, moved to another split, or now
+    manifest-only. Returns files removed.
+    """
+    keep = {row[0] for row in rows if row[5] != "manifest-only"}
+    keep_deriv = {v for row in rows for col, v in zip(header, row) if col.startswith("deriv_")}
+    removed = 0
+    for rel, old in previous.items():
+        targets = []
+        if rel not in keep and len(old) > 5 and old[5] != "manifest-only":
+            targets.append(PROCESSED_ROOT / rel)
+        targets += [PROCESSED_ROOT / v for col, v in zip(old_header, old)
+                    if col.startswith("deriv_") and v and v not in keep_deriv]
+        for path in targets:
+            if path.is_symlink() or path.exists():
+                path.unlink()
+                removed += 1
+    return removed
+
+# ---------------- Training-resolution derivatives ----------------
+def _tf_bilinear_taps(n_in: int, n_out: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Source indices and weights of tf.image.resize's bilinear kernel (half-pixel centers)."""
+    scale = np.float32(n_in) / np.float32(n_out)
+    pos = (np.arange(n_out, dtype=np.float32) + np.float32(0.5)) * scale - np.float32(0.5)
+    floor = np.floor(pos)
+    lower = np.maximum(floor, 0).astype(np.int64)
+    upper = np.minimum(np.ceil(pos), n_in - 1).astype(np.int64)
+    return lower, upper, (pos - floor).astype(np.float32)
+
+def resize_like_tf(rgb: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """
+    uint8 (H, W, 3) -> uint8 (*size, 3), computed as train_tf_v1 does for full-size
+    images: tf.image.resize (bilinear, no antialias) in float32, then round to nearest
+    even and cast. Same interpolation order as TF's kernel (x within each row, then y).
+    """
+    h, w = size
+    top_i, bottom_i, y_lerp = _tf_bilinear_taps(rgb.shape[0], h)
+    left_i, right_i, x_lerp = _tf_bilinear_taps(rgb.shape[1], w)
+    img = rgb.astype(np.float32)
+    x_lerp = x_lerp[None, :, None]
+    rows_top, rows_bottom = img[top_i], img[bottom_i]
+    top = rows_top[:, left_i] + (rows_top[:, right_i] - rows_top[:, left_i]) * x_lerp
+    bottom = rows_bottom[:, left_i] + (rows_bottom[:, right_i] - rows_bottom[:, left_i]) * x_lerp
+    out = top + (bottom - top) * y_lerp[:, None, None]
+    return np.clip(np.round(out), 0, 255).astype(np.uint8)
+
+def load_resized(path: Path, size: Tuple[int, int]) -> np.ndarray:
+    """Full-resolution decode (no JPEG draft scaling, which tf.io.decode_jpeg doesn't do) + resize_like_tf."""
+    with Image.open(path) as im:
+        rgb = np.asarray(im.convert("RGB"))
+    if rgb.shape[:2] == tuple(size):
+        return rgb
+    return resize_like_tf(rgb, size)
+
+def make_derivative(src: Path, dst: Path, size: int) -> bool:
+    """
+    Write src as a size x size JPEG, resized with resize_like_tf, so the loader
+    decodes a tiny file instead of a full photo. The pixels match what
+    tf.image.resize(img, (size, size)) gives train_tf_v1 for the full-size file up
+    to the q95 JPEG re-encode of the derivative: small, but not zero, so a model
+    trained on derivatives sees slightly different inputs than one served full-size
+    images. Skips dsts newer than src. Returns True if a file was written.
+    """
+    if dst.exists() and dst.stat().st_mtime_ns >= src.stat().st_mtime_ns:
+        return False
+    im = Image.fromarray(load_resized(src, (size, size)))
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".tmp")
+    im.save(tmp, format="JPEG", quality=95)
+    os.replace(tmp, dst)  # never leave a half-written derivative behind
+    return True
+
+def derivative_path(crop: str, src: Path, size: int) -> str:
+    """deriv_<size> value: relative to processed/, like filepath."""
+    return f"{crop}/{DERIV_DIR}/{size}/{src.stem}.jpg"
+
+def plan_derivatives(crop: str, rows: List[list], sizes: List[int], units: Dict[str, WorkUnit],
+                     made: Counter) -> None:
+    """
+    Append one deriv_<size> column per size to every row and queue the derivatives
+    that are missing or older than their source (counted in `made` once written).
+    Derivatives come from the cleaned source, so they work with every materialize
+    mode. Cleaned names are content-addressed, hence one file per image shared by
+    all splits.
+    """
+    for row in rows:
+        src = Path(row[4])
+        src_mtime = None
+        for size in sizes:
+            rel = derivative_path(crop, src, size)
+            row.append(rel)
+            dst = PROCESSED_ROOT / rel
+            src_mtime = src_mtime if src_mtime is not None else src.stat().st_mtime_ns
+            if dst.exists() and dst.stat().st_mtime_ns >= src_mtime:
+                continue
+            unit = units.setdefault(src.parent.name, WorkUnit(crop, src.parent.name))
+            unit.items.append((make_derivative, (src, dst, size),
+                               lambda written, size=size: made.update({size: int(written)})))
+            unit.cost += src.stat().st_size
+
+def run_units(units: List[WorkUnit], workers: int = 0) -> None:
+    """
+    Run every queued file job on one thread pool, largest unit first (Pillow and
+    file copies release the GIL, so threads scale here). Completion callbacks run
+    in this thread, in submission order.
+    """
+    jobs = [job for unit in largest_first(units) for job in unit.items]
+    if not jobs:
+        return
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as ex:
+        for (_, _, done), result in zip(jobs, ex.map(lambda job: job[0](*job[1]), jobs)):
+            done(result)
+
+def parse_sizes(text: str) -> List[int]:
+    sizes = sorted({int(t) for t in text.replace(" ", "").split(",") if t})
+    if any(s <= 0 for s in sizes):
+        raise SystemExit(f"❌ bad --derivatives: {text}")
+    return sizes
+
+# ---------------- TFRecord shards ----------------
+def write_shards(crop: str, rows: List[Tuple], header: List[str], variant: str,
+                 manifest_sha1: str, shard_mb: int = 128) -> Path:
+    """
+    Pack each split into ~shard_mb TFRecord shards of tf.train.Example
+    {image: JPEG bytes, label: int64, filepath: bytes}, in manifest order.
+    variant "full" packs the cleaned files, "<size>" the deriv_<size> derivatives.
+    index.json lists shards per split and the manifest sha1 they were built from
+    (loaders ignore stale shards); index.csv has each record's shard and byte offset.
+    """
+    out_dir = PROCESSED_ROOT / crop / SHARD_DIR / variant
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for old in out_dir.glob("*.tfrecord*"):
+        old.unlink()
+
+    col = header.index(f"deriv_{variant}") if variant != "full" else None
+    def image_path(row) -> Path:
+        return PROCESSED_ROOT / row[col] if col is not None else Path(row[4])
+
+    index = {"crop": crop, "variant": variant, "classes": V1_CLASSES,
+             "manifest_sha1": manifest_sha1, "splits": {}}
+    offsets = []
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        for split in ("train", "val", "test"):
+            split_rows = [r for r in rows if r[2] == split]
+            writer = ShardWriter(out_dir, split, shard_mb << 20)
+            # Read ahead in small windows: overlapped small-file reads, bounded memory
+            for i in range(0, len(split_rows), 64):
+                window = split_rows[i:i + 64]
+                for row, data in zip(window, ex.map(lambda r: image_path(r).read_bytes(), window)):
+                    writer.write(encode_example({"image": data, "label": V1_CLASSES.index(row[1]),
+                                                 "filepath": row[0].encode()}), key=row[0])
+            shards = writer.close()
+            index["splits"][split] = {"records": len(split_rows), "shards": shards}
+            offsets += [(shards[s]["file"], off, n, key) for s, off, n, key in writer.offsets()]
+
+    with open(out_dir / "index.json", "w", encoding="utf-8") as fp:
+        json.dump(index, fp, indent=2)
+    with open(out_dir / "index.csv", "w", newline="", encoding="utf-8") as fp:
+        w = csv.writer(fp)
+        w.writerow(["shard", "offset", "length", "filepath"])
+        w.writerows(offsets)
+    return out_dir
 
 def counts_by(labels: List[str]) -> Dict[str, int]:
-    from collections import Counter
     return dict(Counter(labels))
 
-def main(crop: str):
-    crop = crop.strip().lower()
-    print(f"Project: {PROJECT_ROOT}")
-    print(f"Interim root: {INTERIM_ROOT}")
-    print(f"Processed root: {PROCESSED_ROOT}")
-    print(f"Crop: {crop}")
+@dataclass
+class CropPlan:
+    """One crop's prepare run between planning and finish_crop()."""
+    crop: str
+    rows: List[list]
+    units: Dict[str, WorkUnit]
+    previous: Dict[str, Tuple]
+    old_header: List[str]
+    reused: int = 0
+    moved: int = 0
+    added: int = 0
+    made: Counter = field(default_factory=Counter)
 
+def plan_crop(crop: str, materialize_mode: str = "copy", derivatives: Optional[List[int]] = None,
+              split_mode: str = "random", rematerialize: bool = False) -> CropPlan:
+    """Split one crop and queue its file work; nothing is copied or resized yet."""
     pairs = collect_v1_pairs(crop)
     if not pairs:
-        raise SystemExit("❌ No images found in interim. Run cleaning first.")
+        raise SystemExit(f"❌ No images found in interim/{crop}. Run cleaning first.")
 
     # Split
-    (Xtr, Ytr), (Xv, Yv), (Xte, Yte) = stratified_split(pairs, seed=SEED)
+    if split_mode == "hash":
+        (Xtr, Ytr), (Xv, Yv), (Xte, Yte) = hash_split(pairs, seed=SEED)
+    else:
+        (Xtr, Ytr), (Xv, Yv), (Xte, Yte) = stratified_split(pairs, seed=SEED)
 
     # Sanity (before copying)
-    print("\nSanity (pre-copy):")
+    print(f"\nSanity (pre-copy, {crop}):")
     print(" Train:", counts_by(Ytr))
     print(" Val  :", counts_by(Yv))
     print(" Test :", counts_by(Yte))
 
-    # Copy to processed
-    rows = []
-    rows += copy_to_processed(crop, "train", Xtr, Ytr)
-    rows += copy_to_processed(crop, "val",   Xv,  Yv)
-    rows += copy_to_processed(crop, "test",  Xte, Yte)
+    # Plan processed/, keeping what the last manifest already put there
+    old_header, previous = read_manifest(PROCESSED_ROOT / crop / "manifest.csv")
+    reuse_from = {} if rematerialize else previous
+    plan = CropPlan(crop, [], {}, previous, old_header)
+    reused: Counter = Counter()
+    for split, xs, ys in (("train", Xtr, Ytr), ("val", Xv, Yv), ("test", Xte, Yte)):
+        plan_processed(crop, split, xs, ys, materialize_mode, plan.rows, plan.units, reuse_from, reused)
+    if derivatives:
+        plan_derivatives(crop, plan.rows, derivatives, plan.units, plan.made)
+
+    old_split = {old[4]: old[2] for old in previous.values() if len(old) > 4}
+    plan.reused = sum(reused.values())
+    plan.moved = sum(1 for row in plan.rows if row[4] in old_split and old_split[row[4]] != row[2])
+    plan.added = sum(1 for row in plan.rows if row[4] not in old_split)
+    return plan
+
+def finish_crop(plan: CropPlan, derivatives: Optional[List[int]] = None,
+                shards: bool = False, shard_mb: int = 128) -> None:
+    """Write manifest.csv, drop stale files, pack shards and report, once the file work ran."""
+    crop, rows = plan.crop, plan.rows
+    header = list(MANIFEST_HEADER) + [f"deriv_{size}" for size in derivatives or []]
 
-    # Write manifest
+    # Write manifest (source of truth for every mode), replaced in one step
     manifest = PROCESSED_ROOT / crop / "manifest.csv"
     manifest.parent.mkdir(parents=True, exist_ok=True)
-    with open(manifest, "w", newline="", encoding="utf-8") as fp:
+    tmp = manifest.with_name(manifest.name + ".tmp")
+    with open(tmp, "w", newline="", encoding="utf-8") as fp:
         w = csv.writer(fp)
-        w.writerow(["filepath", "class", "split", "crop"])
+        w.writerow(header)
         w.writerows(rows)
+    os.replace(tmp, manifest)
+    removed = remove_stale(plan.old_header, plan.previous, rows, header)
 
-    # Final sanity from the filesystem (post-copy)
-    def count_dir(d: Path): return len([p for p in d.glob("*/*/*") if p.is_file()])
+    shard_dirs = []
+    if shards:
+        manifest_sha1 = hashlib.sha1(manifest.read_bytes()).hexdigest()
+        for variant in [str(size) for size in derivatives or []] or ["full"]:
+            shard_dirs.append(write_shards(crop, rows, header, variant, manifest_sha1, shard_mb))
+
+    # Final sanity: files on disk per split (processed/<crop>/<split>/<Label>/<file>)
+    def count_dir(d: Path): return len([p for p in d.glob("*/*") if p.is_file()])
     final_counts = {
         "train": count_dir(PROCESSED_ROOT / crop / "train"),
         "val":   count_dir(PROCESSED_ROOT / crop / "val"),
         "test":  count_dir(PROCESSED_ROOT / crop / "test"),
     }
 
-    print("\n✅ Done")
+    print(f"\n✅ Done: {crop}")
     print(f" Manifest: {manifest}")
+    print(" Storage:", counts_by([row[5] for row in rows]))
+    if plan.previous:
+        print(f" Incremental: {plan.reused} unchanged, {plan.added} new, {plan.moved} moved between splits, "
+              f"{removed} stale files removed")
+    if derivatives:
+        print(" Derivatives written:", {size: plan.made[size] for size in derivatives},
+              f"(under {PROCESSED_ROOT / crop / DERIV_DIR})")
+    for d in shard_dirs:
+        print(f" Shards: {d} ({len(list(d.glob('*.tfrecord')))} files)")
     print(" Final counts (files):", final_counts)
     print(" Check:", PROCESSED_ROOT / crop)
 
+def main(crops: List[str], materialize_mode: str = "copy", derivatives: Optional[List[int]] = None,
+         shards: bool = False, shard_mb: int = 128, split_mode: str = "random",
+         rematerialize: bool = False, workers: int = 0):
+    """
+    Prepare each crop. Copies/links and derivatives of all crops run as per-class
+    work units on one shared pool, largest first (work_units.py); manifests and
+    shards are then written per crop exactly as for a single-crop run.
+    """
+    crops = [c.strip().lower() for c in crops]
+    print(f"Project: {PROJECT_ROOT}")
+    print(f"Interim root: {INTERIM_ROOT}")
+    print(f"Processed root: {PROCESSED_ROOT}")
+    print(f"Crop{'s' if len(crops) > 1 else ''}: {', '.join(crops)}")
+    print(f"Materialize: {materialize_mode}")
+    print(f"Derivatives: {', '.join(map(str, derivatives)) if derivatives else 'none'}")
+    print(f"Shards: {f'TFRecord, ~{shard_mb} MB each' if shards else 'none'}")
+    print(f"Split: {'hash (stable per image)' if split_mode == 'hash' else 'random (seeded, whole crop)'}")
+
+    plans = [plan_crop(crop, materialize_mode, derivatives, split_mode, rematerialize) for crop in crops]
+    run_units([unit for plan in plans for unit in plan.units.values()], workers)
+    for plan in plans:
+        finish_crop(plan, derivatives, shards, shard_mb)
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Collapse to v1 labels and split into train/val/test.")
-    parser.add_argument("--crop", required=True, help="e.g., tomato, rice")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--crop", help="e.g., tomato, rice")
+    target.add_argument("--all-crops", action="store_true",
+                        help="Prepare every crop under interim/ in one run, sharing one worker pool")
+    parser.add_argument("--materialize", choices=MATERIALIZE_MODES, default="copy",
+                        help="How split files land in processed/ (link modes fall back to copy; "
+                             "manifest-only writes just manifest.csv)")
+    parser.add_argument("--derivatives", default="",
+                        help="Comma-separated square sizes to pre-resize for training, e.g. 160,224 "
+                             "(recorded as deriv_<size> columns in manifest.csv)")
+    parser.add_argument("--shards", action="store_true",
+                        help="Also pack each split into TFRecord shards (the derivatives when given, "
+                             "else the full-size files) for sequential reads in train_tf_v1")
+    parser.add_argument("--shard-mb", type=int, default=128, help="Target shard size in MB")
+    parser.add_argument("--split", choices=SPLIT_MODES, default="random",
+                        help="random: seeded stratified re-split of the whole crop; hash: each image's "
+                             "split follows from its content hash, so new images don't reshuffle old ones")
+    parser.add_argument("--rematerialize", action="store_true",
+                        help="Write every processed file again (e.g. after switching --materialize)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Threads for copies/links and derivatives (default: min(8, CPUs))")
     args = parser.parse_args()
-    main(args.crop)
+    crops = list_crops(INTERIM_ROOT) if args.all_crops else [args.crop]
+    if not crops:
+        raise SystemExit(f"❌ no crop folders found under {INTERIM_ROOT}")
+    main(crops, materialize_mode=args.materialize, derivatives=parse_sizes(args.derivatives),
+         shards=args.shards, shard_mb=args.shard_mb, split_mode=args.split,
+         rematerialize=args.rematerialize, workers=args.workers)
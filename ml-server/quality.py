@@ -0,0 +1,91 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+import batch_metrics as bm
+
+# ---------------- Fast image-quality pre-checks ----------------
+# The At-Risk image-quality rule from docs/feature_scope.md (very dark, overexposed,
+# tiny subject) plus blur, shared by cleaning (clean_dataset --with-exposure/--with-blur)
+# and serving (inference_server), so both judge a photo the same way. Everything is
+# measured on a small luma image: JPEGs are decoded straight at reduced scale, so a
+# check costs well under a millisecond once the image is in memory and the model
+# never sees a photo that will get retake advice anyway.
+#
+# Blur variance depends on resolution: compare it only against thresholds chosen
+# for the same working size (cleaning uses CHECK_SIDE, serving THUMB_SIDE).
+
+DARK_MEAN = 40.0          # mean luma below this -> too dark
+BRIGHT_MEAN = 225.0       # mean luma above this -> overexposed
+CLIP_LEVEL = 250          # luma at or above this counts as blown out
+CLIP_FRACTION = 0.40      # share of blown-out pixels above this -> overexposed
+THUMB_SIDE = 128          # short side of the serving-path luma image
+
+def gray_thumbnail(img: Image.Image, side: int = THUMB_SIDE) -> np.ndarray:
+    """
+    2-D uint8 luma with short side >= side. An unloaded JPEG is decoded at 1/2..1/8
+    scale via draft(); anything larger is then reduced by an integer factor (box filter).
+    """
+    w, h = img.size
+    if img.format == "JPEG" and min(w, h) > side:
+        scale = min(w, h) / side
+        img.draft("L", (int(w / scale), int(h / scale)))
+    factor = int(min(img.size) // side)
+    if factor >= 2:
+        img = img.reduce(factor)
+    return bm.to_gray_array(img)
+
+def measure(gray: np.ndarray, blur: bool = True) -> Dict[str, Optional[float]]:
+    """Mean luma, blown-out fraction and (optionally) Laplacian variance of one luma image."""
+    g = np.asarray(gray)
+    return {
+        "luma_mean": float(g.mean()),
+        "clip_frac": float(np.count_nonzero(g >= CLIP_LEVEL)) / max(g.size, 1),
+        "blur_var": bm.laplacian_var(g) if blur else None,
+    }
+
+def measure_batch(grays: Sequence[np.ndarray], blur: bool = True) -> List[Dict[str, Optional[float]]]:
+    """
+    measure() for many luma images. Equally sized ones are stacked and measured in
+    one vectorized pass per metric; the numbers equal measure() image by image.
+    """
+    out: List[Dict[str, Optional[float]]] = [{} for _ in grays]
+    by_shape: Dict[Tuple[int, ...], List[int]] = defaultdict(list)
+    for i, g in enumerate(grays):
+        by_shape[np.shape(g)].append(i)
+    for idx in by_shape.values():
+        stack = np.stack([np.asarray(grays[i]) for i in idx])
+        flat = stack.reshape(len(idx), -1)
+        means = flat.mean(axis=1)
+        clips = np.count_nonzero(flat >= CLIP_LEVEL, axis=1) / max(flat.shape[1], 1)
+        blurs = bm.laplacian_var_batch(stack) if blur else [None] * len(idx)
+        for k, i in enumerate(idx):
+            out[i] = {"luma_mean": float(means[k]), "clip_frac": float(clips[k]),
+                      "blur_var": float(blurs[k]) if blur else None}
+    return out
+
+def quality_issues(stats: Dict[str, Optional[float]], full_size: Optional[Tuple[int, int]] = None,
+                   min_side: int = 0, blur_min: float = 0.0, exposure: bool = True) -> List[str]:
+    """
+    Failed checks, most actionable first: too_small, too_dark / overexposed, blurry.
+    A check is skipped when its threshold is 0 / off or its measurement is missing.
+    """
+    issues = []
+    if min_side and full_size is not None and min(full_size) < min_side:
+        issues.append("too_small")
+    if exposure and stats.get("luma_mean") is not None:
+        if stats["luma_mean"] < DARK_MEAN:
+            issues.append("too_dark")
+        elif stats["luma_mean"] > BRIGHT_MEAN or (stats.get("clip_frac") or 0.0) > CLIP_FRACTION:
+            issues.append("overexposed")
+    if blur_min and stats.get("blur_var") is not None and stats["blur_var"] < blur_min:
+        issues.append("blurry")
+    return issues
+
+def check_image(img: Image.Image, full_size: Tuple[int, int], min_side: int = 0,
+                blur_min: float = 0.0, side: int = THUMB_SIDE) -> Tuple[List[str], Dict[str, Optional[float]]]:
+    """Serving-path convenience: thumbnail, measure, judge -> (issues, stats)."""
+    stats = measure(gray_thumbnail(img, side), blur=bool(blur_min))
+    return quality_issues(stats, full_size, min_side, blur_min), stats
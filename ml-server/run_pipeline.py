@@ -0,0 +1,219 @@
+import ast
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from prepare_v1 import DATASET_ROOT, INTERIM_BASE, INTERIM_ROOT, PROCESSED_ROOT
+
+# ---------------- clean -> prepare -> train, with stage fingerprints ----------------
+# Each stage's fingerprint hashes what decides its result:
+#   code    the script plus every ml-server module it imports (AST, so comments and
+#           formatting don't count; thresholds like PHASH_CUTOFF, SEED live here)
+#   args    the extra CLI flags passed to the stage
+#   env     resolved dataset paths
+#   inputs  digest of what it reads: raw/<crop> (path, size, mtime) for clean, the
+#           content-addressed interim/<crop> listing for prepare, manifest.csv for train
+# A stage runs when its fingerprint differs from the last successful run or its
+# outputs were changed/removed since. Inputs are re-read after each upstream stage,
+# so a rerun that produces the same output (e.g. a threshold nothing was near)
+# stops the cascade there.
+# State: <INTERIM_PATH>/_pipeline/<crop>.json
+
+HERE = Path(__file__).resolve().parent
+RAW_ROOT = DATASET_ROOT / "raw"
+PIPELINE_DIR = INTERIM_BASE / "_pipeline"
+
+def _sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+def file_digest(path: Path) -> str:
+    """sha1 of a file's bytes, "" if it doesn't exist."""
+    try:
+        return _sha1(path.read_bytes())
+    except FileNotFoundError:
+        return ""
+
+def tree_digest(root: Path, with_mtime: bool, skip_top: Tuple[str, ...] = ()) -> str:
+    """
+    sha1 over (relative path, size[, mtime]) of every file under root, "" if root is missing.
+    Names at the top level starting with skip_top are left out (caches, logs).
+    """
+    if not root.exists():
+        return ""
+    entries = []
+    stack = [(root, "")]
+    while stack:
+        folder, rel = stack.pop()
+        with os.scandir(folder) as it:
+            for e in it:
+                if not rel and e.name.startswith(skip_top):
+                    continue
+                name = f"{rel}{e.name}"
+                if e.is_dir():
+                    stack.append((Path(e.path), name + "/"))
+                elif e.is_file():
+                    st = e.stat()
+                    entries.append(f"{name}\t{st.st_size}\t{st.st_mtime_ns if with_mtime else ''}")
+    entries.sort()
+    return _sha1("\n".join(entries).encode())
+
+def local_imports(script: Path, seen: Optional[Set[Path]] = None) -> Set[Path]:
+    """script plus every ml-server module it imports, recursively (function-level imports too)."""
+    seen = set() if seen is None else seen
+    if script in seen or not script.exists():
+        return seen
+    seen.add(script)
+    for node in ast.walk(ast.parse(script.read_text(encoding="utf-8"))):
+        if isinstance(node, ast.Import):
+            names = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            dep = HERE / f"{name.split('.')[0]}.py"
+            if dep.exists():
+                local_imports(dep, seen)
+    return seen
+
+def code_digest(script: Path) -> str:
+    parts = []
+    for path in sorted(local_imports(script)):
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        parts.append(f"{path.name}\n{ast.dump(tree)}")
+    return _sha1("\n".join(parts).encode())
+
+# ---------------- Stages ----------------
+@dataclass
+class Stage:
+    name: str
+    script: str
+    inputs: Callable[[str], str]   # crop -> digest of what the stage reads
+    outputs: Callable[[str], str]  # crop -> digest of what it writes ("" = nothing there)
+
+def raw_digest(crop: str) -> str:
+    return tree_digest(RAW_ROOT / crop, with_mtime=True)
+
+def interim_digest(crop: str) -> str:
+    # Kept files are named by content hash, so path + size stands in for the bytes
+    return tree_digest(INTERIM_ROOT / crop, with_mtime=False, skip_top=("_",))
+
+def manifest_digest(crop: str) -> str:
+    return file_digest(PROCESSED_ROOT / crop / "manifest.csv")
+
+def model_digest(crop: str) -> str:
+    return file_digest(PROCESSED_ROOT / crop / "best_model.keras")
+
+STAGES = [
+    Stage("clean", "clean_dataset.py", raw_digest, interim_digest),
+    Stage("prepare", "prepare_v1.py", interim_digest, manifest_digest),
+    Stage("train", "train_tf_v1.py", manifest_digest, model_digest),
+]
+
+def fingerprint(stage: Stage, crop: str, args: List[str]) -> Tuple[str, Dict]:
+    parts = {
+        "code": code_digest(HERE / stage.script),
+        "args": args,
+        "env": {"raw": str(RAW_ROOT), "interim": str(INTERIM_ROOT), "processed": str(PROCESSED_ROOT)},
+        "inputs": stage.inputs(crop),
+    }
+    return _sha1(json.dumps(parts, sort_keys=True).encode()), parts
+
+def load_state(crop: str) -> Dict:
+    path = PIPELINE_DIR / f"{crop}.json"
+    if not path.exists():
+        return {"crop": crop, "stages": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def save_state(crop: str, state: Dict) -> None:
+    PIPELINE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PIPELINE_DIR / f"{crop}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+def why_run(stage: Stage, crop: str, record: Optional[Dict], fp: str, parts: Dict,
+            force: bool) -> Optional[str]:
+    """Reason the stage has to run, or None if its last run still holds."""
+    if force:
+        return "forced"
+    if record is None:
+        return "no previous run"
+    if record["fingerprint"] != fp:
+        changed = [k for k in ("code", "args", "env", "inputs") if record["parts"].get(k) != parts[k]]
+        return f"{', '.join(changed)} changed"
+    if stage.outputs(crop) != record["output"]:
+        return "outputs changed or missing since the last run"
+    return None
+
+def run_stage(stage: Stage, crop: str, args: List[str]) -> Tuple[int, float]:
+    cmd = [sys.executable, str(HERE / stage.script), "--crop", crop, *args]
+    print(f"\n$ {' '.join(shlex.quote(c) for c in cmd)}", flush=True)
+    t0 = time.perf_counter()
+    code = subprocess.run(cmd, cwd=HERE).returncode
+    return code, time.perf_counter() - t0
+
+def run_pipeline(crop: str, stage_args: Dict[str, List[str]], selected: List[str],
+                 force: Set[str], dry_plan: bool = False) -> int:
+    state = load_state(crop)
+    upstream_pending: Optional[str] = None  # dry plan: earlier stage that would run
+    print(f"Pipeline for '{crop}' (state: {PIPELINE_DIR / (crop + '.json')})")
+    for stage in STAGES:
+        if stage.name not in selected:
+            continue
+        args = stage_args.get(stage.name, [])
+        fp, parts = fingerprint(stage, crop, args)
+        reason = why_run(stage, crop, state["stages"].get(stage.name), fp, parts, stage.name in force)
+
+        if dry_plan:
+            if reason:
+                print(f"  {stage.name:<8} RUN   ({reason})")
+                upstream_pending = stage.name
+            elif upstream_pending:
+                print(f"  {stage.name:<8} MAYBE (runs if {upstream_pending} changes its output)")
+            else:
+                print(f"  {stage.name:<8} skip  (fingerprint {fp[:12]} unchanged)")
+            continue
+
+        if not reason:
+            print(f"\n⏭  {stage.name}: up to date (fingerprint {fp[:12]})")
+            continue
+        print(f"\n▶  {stage.name}: {reason}")
+        code, seconds = run_stage(stage, crop, args)
+        if code != 0:
+            print(f"❌ {stage.name} failed (exit {code}); later stages not run")
+            return code
+        state["stages"][stage.name] = {"fingerprint": fp, "parts": parts, "output": stage.outputs(crop),
+                                       "seconds": round(seconds, 1), "finished_at": time.time()}
+        save_state(crop, state)
+        print(f"✅ {stage.name} done in {seconds:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    import argparse
+    names = [s.name for s in STAGES]
+    parser = argparse.ArgumentParser(description="Run clean -> prepare -> train, skipping stages whose inputs, "
+                                                 "code and settings haven't changed")
+    parser.add_argument("--crop", required=True, help="e.g., tomato, rice")
+    parser.add_argument("--stages", default=",".join(names), help="subset to consider, e.g. clean,prepare")
+    parser.add_argument("--force", default="", help="comma-separated stages to rerun regardless")
+    parser.add_argument("--dry-plan", action="store_true", help="print what would run and why, run nothing")
+    parser.add_argument("--clean-args", default="", help='extra clean_dataset.py flags; use the = form: --clean-args="--with-blur --fast-check"')
+    parser.add_argument("--prepare-args", default="", help='extra prepare_v1.py flags, e.g. --prepare-args="--derivatives 160"')
+    parser.add_argument("--train-args", default="", help='extra train_tf_v1.py flags, e.g. --train-args="--head-only"')
+    args = parser.parse_args()
+
+    selected = [s for s in args.stages.split(",") if s]
+    force = {s for s in args.force.split(",") if s}
+    if any(s not in names for s in selected + sorted(force)):
+        raise SystemExit(f"❌ stages must be from {', '.join(names)}")
+    stage_args = {"clean": shlex.split(args.clean_args), "prepare": shlex.split(args.prepare_args),
+                  "train": shlex.split(args.train_args)}
+    raise SystemExit(run_pipeline(args.crop.strip().lower(), stage_args, selected, force, args.dry_plan))
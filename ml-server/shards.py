@@ -0,0 +1,196 @@
+import struct
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+
+# Optional: C implementations of CRC32C; the NumPy version below is used otherwise
+try:
+    import google_crc32c
+except ImportError:
+    google_crc32c = None
+try:
+    import crc32c as _crc32c_mod
+except ImportError:
+    _crc32c_mod = None
+
+# ---------------- TFRecord shards (no TensorFlow needed to write them) ----------------
+# File format, per record (as tf.io.TFRecordWriter writes it):
+#   uint64 length | uint32 masked_crc32c(length) | data | uint32 masked_crc32c(data)
+# Each record is a serialized tf.train.Example, so tf.data.TFRecordDataset +
+# tf.io.parse_single_example read them directly.
+
+SHARD_EXT = ".tfrecord"
+
+# ---- CRC32C (Castagnoli), which TFRecord framing requires ----
+_POLY = 0x82F63B78
+_TABLE = []
+for _i in range(256):
+    _c = _i
+    for _ in range(8):
+        _c = (_c >> 1) ^ _POLY if _c & 1 else _c >> 1
+    _TABLE.append(_c)
+_TABLE_NP = np.array(_TABLE, dtype=np.uint32)
+_CHUNK = 256  # bytes per lane in the vectorized path
+
+def _crc_update(c: int, data: bytes) -> int:
+    for b in data:
+        c = _TABLE[(c ^ b) & 0xFF] ^ (c >> 8)
+    return c
+
+@lru_cache(maxsize=None)
+def _shift_tables(n: int) -> Tuple[List[int], ...]:
+    """Byte tables for the linear map 'feed n zero bytes' (CRC combine, as in zlib)."""
+    basis = [_crc_update(1 << i, bytes(n)) for i in range(32)]
+    tables = []
+    for k in range(4):
+        t = [0] * 256
+        for v in range(1, 256):
+            low = v & -v
+            t[v] = t[v ^ low] ^ basis[8 * k + low.bit_length() - 1]
+        tables.append(t)
+    return tuple(tables)
+
+def crc32c(data: bytes) -> int:
+    if google_crc32c is not None:
+        return google_crc32c.value(data)
+    if _crc32c_mod is not None:
+        return _crc32c_mod.crc32c(data)
+    # CRCs of fixed-size chunks are computed side by side in NumPy (one table
+    # lookup per byte position across all chunks), then folded in order.
+    n_chunks, head = divmod(len(data), _CHUNK)
+    c = _crc_update(0xFFFFFFFF, data[:head])
+    if n_chunks:
+        lanes = np.frombuffer(data, dtype=np.uint8, offset=head).reshape(n_chunks, _CHUNK)
+        cs = np.zeros(n_chunks, dtype=np.uint32)
+        for j in range(_CHUNK):
+            cs = _TABLE_NP[(cs ^ lanes[:, j]) & 0xFF] ^ (cs >> 8)
+        t0, t1, t2, t3 = _shift_tables(_CHUNK)
+        for ci in cs.tolist():
+            c = t0[c & 0xFF] ^ t1[(c >> 8) & 0xFF] ^ t2[(c >> 16) & 0xFF] ^ t3[c >> 24] ^ ci
+    return c ^ 0xFFFFFFFF
+
+def masked_crc(data: bytes) -> int:
+    c = crc32c(data)
+    return (((c >> 15) | (c << 17)) + 0xA282EAD8) & 0xFFFFFFFF
+
+# ---- tf.train.Example encoding (just bytes and int64 features) ----
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+def _field(num: int, payload: bytes) -> bytes:
+    return _varint(num << 3 | 2) + _varint(len(payload)) + payload
+
+def encode_example(features: Dict[str, Union[bytes, int]]) -> bytes:
+    """{name: bytes | int} -> serialized tf.train.Example (BytesList / Int64List features)."""
+    entries = []
+    for key, val in features.items():
+        if isinstance(val, int):
+            feat = _field(3, _field(1, _varint(val)))  # Feature.int64_list, packed value
+        else:
+            feat = _field(1, _field(1, val))           # Feature.bytes_list
+        entries.append(_field(1, _field(1, key.encode()) + _field(2, feat)))
+    return _field(1, b"".join(entries))                # Example.features
+
+def _read_varint(buf: bytes, i: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = buf[i]
+        i += 1
+        n |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return n, i
+        shift += 7
+
+def _fields(buf: bytes) -> Iterator[Tuple[int, bytes]]:
+    i = 0
+    while i < len(buf):
+        tag, i = _read_varint(buf, i)
+        size, i = _read_varint(buf, i)  # encode_example only emits length-delimited fields
+        yield tag >> 3, buf[i:i + size]
+        i += size
+
+def decode_example(buf: bytes) -> Dict[str, Union[bytes, int]]:
+    """Inverse of encode_example (single-valued features), for checks and non-TF readers."""
+    out: Dict[str, Union[bytes, int]] = {}
+    for _, features in _fields(buf):
+        for _, entry in _fields(features):
+            parts = dict(_fields(entry))
+            kind, lst = next(_fields(parts[2]))
+            _, val = next(_fields(lst))
+            out[parts[1].decode()] = _read_varint(val, 0)[0] if kind == 3 else val
+    return out
+
+# ---- Record framing ----
+def frame(record: bytes) -> bytes:
+    length = struct.pack("<Q", len(record))
+    return length + struct.pack("<I", masked_crc(length)) + record + struct.pack("<I", masked_crc(record))
+
+def iter_records(path: Path, verify: bool = True) -> Iterator[bytes]:
+    with open(path, "rb") as fp:
+        while True:
+            head = fp.read(12)
+            if not head:
+                return
+            length = head[:8]
+            if verify and struct.unpack("<I", head[8:])[0] != masked_crc(length):
+                raise ValueError(f"corrupt length in {path}")
+            data = fp.read(struct.unpack("<Q", length)[0])
+            footer = fp.read(4)
+            if verify and struct.unpack("<I", footer)[0] != masked_crc(data):
+                raise ValueError(f"corrupt record in {path}")
+            yield data
+
+class ShardWriter:
+    """
+    Write records to <prefix>-00000-of-000NN.tfrecord files of about shard_bytes each.
+    Shard names get their final count in close(), which returns
+    [{"file", "records", "bytes"}, ...]; offsets() lists (shard index, offset, length, key).
+    """
+
+    def __init__(self, out_dir: Path, prefix: str, shard_bytes: int):
+        self.out_dir = Path(out_dir)
+        self.prefix = prefix
+        self.shard_bytes = shard_bytes
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self._fp = None
+        self._shards: List[Dict] = []
+        self._offsets: List[Tuple[int, int, int, str]] = []
+
+    def _tmp(self, i: int) -> Path:
+        return self.out_dir / f"{self.prefix}-{i:05d}{SHARD_EXT}.tmp"
+
+    def write(self, record: bytes, key: str = "") -> None:
+        if self._fp is None or self._shards[-1]["bytes"] >= self.shard_bytes:
+            if self._fp is not None:
+                self._fp.close()
+            self._shards.append({"file": "", "records": 0, "bytes": 0})
+            self._fp = open(self._tmp(len(self._shards) - 1), "wb")
+        cur = self._shards[-1]
+        framed = frame(record)
+        self._fp.write(framed)
+        self._offsets.append((len(self._shards) - 1, cur["bytes"], len(framed), key))
+        cur["records"] += 1
+        cur["bytes"] += len(framed)
+
+    def close(self) -> List[Dict]:
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        n = len(self._shards)
+        for i, shard in enumerate(self._shards):
+            shard["file"] = f"{self.prefix}-{i:05d}-of-{n:05d}{SHARD_EXT}"
+            self._tmp(i).replace(self.out_dir / shard["file"])
+        return self._shards
+
+    def offsets(self) -> List[Tuple[int, int, int, str]]:
+        return self._offsets
@@ -0,0 +1,132 @@
+import csv
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from prepare_v1 import PROCESSED_ROOT, V1_CLASSES, load_resized
+
+# ---------------- Pre-decoded tensor cache ----------------
+# processed/<crop>/_tensor_cache/<manifest sha1[:16]>_<H>x<W>/
+#   <split>_images.npy   uint8 (N, H, W, 3), opened with np.load(mmap_mode="r")
+#   <split>_labels.npy   int32 (N,), V1_CLASSES order
+#   meta.json
+# Built once per manifest + size; every later epoch (and every process reading it)
+# just pages pixels in from the OS cache, with no JPEG decode at all.
+
+CACHE_DIR = "_tensor_cache"
+SPLITS = ("train", "val", "test")
+
+def manifest_sha1(manifest: Path) -> str:
+    return hashlib.sha1(manifest.read_bytes()).hexdigest()
+
+def cache_dir_for(crop_root: Path, manifest: Path, img_size: Tuple[int, int]) -> Path:
+    h, w = img_size
+    return crop_root / CACHE_DIR / f"{manifest_sha1(manifest)[:16]}_{h}x{w}"
+
+def image_path(row: Dict[str, str], img_size: Tuple[int, int]) -> Path:
+    """Same file train_tf_v1 would read: the matching derivative, else the processed copy."""
+    h, w = img_size
+    deriv = row.get(f"deriv_{h}", "")
+    if h == w and deriv:
+        return PROCESSED_ROOT / deriv
+    if row.get("storage", "") == "manifest-only":
+        return Path(row["source"])
+    return PROCESSED_ROOT / row["filepath"]
+
+def load_pixels(path: Path, img_size: Tuple[int, int]) -> np.ndarray:
+    """
+    Decode to uint8 (H, W, 3) exactly as train_tf_v1's _decode would: derivatives
+    already at img_size pass through, anything else goes through resize_like_tf.
+    """
+    return load_resized(path, img_size)
+
+def build_tensor_cache(crop: str, img_size: Tuple[int, int], workers: int = 0) -> Path:
+    """Decode every manifest row once into per-split memmaps; no-op if already built."""
+    crop_root = PROCESSED_ROOT / crop
+    manifest = crop_root / "manifest.csv"
+    if not manifest.exists():
+        raise SystemExit(f"❌ Manifest not found: {manifest}. Run prepare_v1.py first.")
+    out = cache_dir_for(crop_root, manifest, img_size)
+    if (out / "meta.json").exists():
+        return out
+
+    with open(manifest, newline="", encoding="utf-8") as fp:
+        rows = list(csv.DictReader(fp))
+
+    # Build beside the final name and rename at the end, so readers never see a partial cache
+    tmp = out.with_name(out.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    h, w = img_size
+    counts: Dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as ex:
+        for split in SPLITS:
+            split_rows = [r for r in rows if r["split"] == split]
+            images = np.lib.format.open_memmap(tmp / f"{split}_images.npy", mode="w+",
+                                               dtype=np.uint8, shape=(len(split_rows), h, w, 3))
+
+            def fill(i: int) -> None:
+                images[i] = load_pixels(image_path(split_rows[i], img_size), img_size)
+
+            # Pillow drops the GIL while decoding; each thread writes its own slot
+            list(ex.map(fill, range(len(split_rows))))
+            images.flush()
+            del images
+            labels = np.array([V1_CLASSES.index(r["class"]) for r in split_rows], dtype=np.int32)
+            np.save(tmp / f"{split}_labels.npy", labels)
+            counts[split] = len(split_rows)
+
+    meta = {"crop": crop, "img_size": [h, w], "manifest_sha1": manifest_sha1(manifest),
+            "classes": V1_CLASSES, "splits": counts}
+    with open(tmp / "meta.json", "w", encoding="utf-8") as fp:
+        json.dump(meta, fp, indent=2)
+    shutil.rmtree(out, ignore_errors=True)
+    tmp.rename(out)
+    return out
+
+def open_split(cache_dir: Path, split: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Read-only memmap of a split's images (shared page cache) and its labels."""
+    return (np.load(cache_dir / f"{split}_images.npy", mmap_mode="r"),
+            np.load(cache_dir / f"{split}_labels.npy"))
+
+def find_tensor_cache(crop_root: Path, img_size: Tuple[int, int]) -> Optional[Path]:
+    manifest = crop_root / "manifest.csv"
+    if not manifest.exists():
+        return None
+    d = cache_dir_for(crop_root, manifest, img_size)
+    return d if (d / "meta.json").exists() else None
+
+def prune_stale(crop_root: Path, keep: List[Path]) -> int:
+    """Remove caches built for older manifests/sizes."""
+    removed = 0
+    for d in (crop_root / CACHE_DIR).glob("*"):
+        if d.is_dir() and d not in keep:
+            shutil.rmtree(d)
+            removed += 1
+    return removed
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Decode processed/<crop> once into uint8 memmaps for training")
+    parser.add_argument("--crop", required=True, help="e.g., tomato, rice")
+    parser.add_argument("--size", default="160", help="H or HxW, must match IMG_SIZE in train_tf_v1.py")
+    parser.add_argument("--workers", type=int, default=0, help="decode threads (default: min(8, CPUs))")
+    parser.add_argument("--prune", action="store_true", help="delete caches for other manifests/sizes")
+    args = parser.parse_args()
+
+    parts = [int(p) for p in args.size.lower().split("x")]
+    size = (parts[0], parts[-1])
+    crop = args.crop.strip().lower()
+    out = build_tensor_cache(crop, size, workers=args.workers)
+    meta = json.loads((out / "meta.json").read_text(encoding="utf-8"))
+    total_mb = sum(p.stat().st_size for p in out.glob("*.npy")) / 1e6
+    print(f"✅ Tensor cache: {out}")
+    print(f"   Splits: {meta['splits']}, {total_mb:.1f} MB")
+    if args.prune:
+        print(f"   Pruned {prune_stale(PROCESSED_ROOT / crop, [out])} stale cache(s)")
@@ -104,11 +104,22 @@
 
 import os
 import csv
-from collections import defaultdict
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
+from PIL import Image, UnidentifiedImageError
+
+from work_units import list_crops
+
+# Thresholds the --deep report predicts rejects for
+from clean_dataset import ASPECT_MAX, ASPECT_MIN, EXIF_ORIENTATION, MAX_PIXELS, MIN_SIDE
 
 # ---------- Setup & config ----------
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -125,43 +136,61 @@ RAW_ROOT = DATASET_ROOT / "raw"
 INTERIM_BASE = Path(os.getenv("INTERIM_PATH", str(DATASET_ROOT))).resolve()
 INTERIM_ROOT = INTERIM_BASE / "interim"
 
+# Directory mtimes + counts from the last audit (interim is writable, raw may not be)
+AUDIT_CACHE = INTERIM_ROOT / "_audit_cache.json"
+
 VALID_IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"}
 SKIP_FILENAMES = {"Thumbs.db", ".DS_Store"}
 
-print("Project root:", PROJECT_ROOT)
-print("Using .env at:", ENV_PATH)
-print("RAW root:", RAW_ROOT, "exists:", RAW_ROOT.exists())
-print("INTERIM root:", INTERIM_ROOT, "exists:", INTERIM_ROOT.exists())
+# --deep histogram bin edges (bins are [edge, next edge)); cleaning thresholds are edges
+SIDE_EDGES = sorted({128, MIN_SIDE, 512, 1024, 2048})         # short side, px
+ASPECT_EDGES = [ASPECT_MIN, 0.75, 1.0, 1.34, ASPECT_MAX]       # width / height after EXIF
+MP_EDGES = [0.25, 1, 4, 12, 24]                                # megapixels (decode cost)
+KB_EDGES = [50, 200, 500, 1000, 5000]                          # file size, KB
+HEADER_CHUNK = 256  # files per header-reading task
+HEADER_PEEK = 4096       # first read per file: SOF is usually within it
+HEADER_READ = 64 * 1024  # retry size when a JPEG's EXIF block is bigger (else fall back to PIL)
 
 # ---------- Helpers ----------
 def nice_name(s: str) -> str:
     return s.replace("_", " ").strip().title()
 
+def list_subdirs(path: Path) -> List[str]:
+    """Names of the directories directly under path ([] if it doesn't exist)."""
+    try:
+        # scandir reports the entry type from the directory listing itself, so there is
+        # no stat per entry (each one is a round trip on /mnt/d under WSL)
+        with os.scandir(path) as it:
+            return [e.name for e in it if e.is_dir()]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+def list_class_dirs(root_crop_path: Path) -> List[Path]:
+    """Class folders under a crop root, Healthy first then alphabetical."""
+    names = sorted(list_subdirs(root_crop_path), key=lambda n: (n != "healthy", n))
+    return [root_crop_path / n for n in names]
+
+def _is_image(e: os.DirEntry) -> bool:
+    # Name checks first: is_file() only needs a stat when the type is unknown
+    return (e.name not in SKIP_FILENAMES
+            and os.path.splitext(e.name)[1].lower() in VALID_IMAGE_EXTS
+            and e.is_file())
+
 def count_images(folder: Path) -> int:
     """Count only valid image files directly under folder (non-recursive)."""
-    if not folder.exists():
+    try:
+        with os.scandir(folder) as it:
+            return sum(1 for e in it if _is_image(e))
+    except (FileNotFoundError, NotADirectoryError):
         return 0
-    count = 0
-    for f in folder.iterdir():
-        if f.is_file() and f.name not in SKIP_FILENAMES and f.suffix.lower() in VALID_IMAGE_EXTS:
-            count += 1
-    return count
 
-def audit_split(root_crop_path: Path) -> List[Tuple[str, int]]:
-    """
-    Count images per class folder under a crop root (non-recursive).
-    Returns: [(class_name, count), ...] with Healthy first then alphabetical.
-    """
-    summary: List[Tuple[str, int]] = []
-    if not root_crop_path.exists():
-        return summary
-
-    class_dirs = [d for d in root_crop_path.iterdir() if d.is_dir()]
-    class_dirs.sort(key=lambda p: (p.name != "healthy", p.name))
-
-    for cls_dir in class_dirs:
-        summary.append((cls_dir.name, count_images(cls_dir)))
-    return summary
+def list_images(folder: Path) -> List[str]:
+    """Names of the files count_images() counts."""
+    try:
+        with os.scandir(folder) as it:
+            return [e.name for e in it if _is_image(e)]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
 
 def read_rejects_from_csv(crop: str) -> Dict[str, Dict[str, int]]:
     """
@@ -180,89 +209,439 @@ def read_rejects_from_csv(crop: str) -> Dict[str, Dict[str, int]]:
             for row in reader:
                 cls = row.get("class", "").strip()
                 status = (row.get("status_or_reason", "") or "").strip()
-                dst = (row.get("dst_path", "") or "").strip()
                 if status and status != "ok":
                     out[cls][status] += 1
     except Exception:
         return {}
     return out
 
-def audit_crop_pair(crop: str) -> Dict[str, any]:
-    """Audit one crop in both raw and interim (if exists)."""
-    raw_classes = audit_split(RAW_ROOT / crop)
-    interim_classes = audit_split(INTERIM_ROOT / crop)
-
-    raw_total = sum(c for _, c in raw_classes)
-    interim_total = sum(c for _, c in interim_classes)
+# ---------- Deep audit (headers only) ----------
+# SOFn markers carry the frame size; C4/C8/CC share the range but are DHT/JPG/DAC
+JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
 
-    rejects_by_reason = read_rejects_from_csv(crop)  # per-class breakdown
+def exif_orientation(tiff: bytes) -> int:
+    """Orientation tag (0x0112) from IFD0 of a TIFF-structured EXIF block; 0 if absent."""
+    order = {b"II": "little", b"MM": "big"}.get(tiff[:2])
+    if order is None or len(tiff) < 8:
+        return 0
+    ifd = int.from_bytes(tiff[4:8], order)
+    if ifd + 2 > len(tiff):
+        return 0
+    for k in range(int.from_bytes(tiff[ifd:ifd + 2], order)):
+        e = ifd + 2 + 12 * k
+        if e + 12 > len(tiff):
+            break
+        if int.from_bytes(tiff[e:e + 2], order) == EXIF_ORIENTATION:
+            return int.from_bytes(tiff[e + 8:e + 10], order)  # SHORT, left-justified
+    return 0
+
+def jpeg_header(data: bytes) -> Optional[Tuple[int, int, int]]:
+    """
+    (width, height, orientation) by walking JPEG markers up to the first SOFn, or
+    None if data doesn't get that far (not a JPEG, truncated, oversized APP segments).
+    Same numbers as Image.open(...).size / getexif() at a fraction of the cost.
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    i, n, orient = 2, len(data), 0
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # standalone markers, no length
+            i += 2
+            continue
+        seg_len = int.from_bytes(data[i + 2:i + 4], "big")
+        if marker in JPEG_SOF:
+            if i + 9 > n:
+                return None
+            h = int.from_bytes(data[i + 5:i + 7], "big")
+            w = int.from_bytes(data[i + 7:i + 9], "big")
+            return w, h, orient
+        if marker == 0xDA:  # scan data before any frame header
+            return None
+        if marker == 0xE1 and not orient and data[i + 4:i + 10] == b"Exif\x00\x00":
+            orient = exif_orientation(data[i + 10:i + 2 + seg_len])
+        i += 2 + seg_len
+    return None
+
+def read_headers(folder: Path, names: List[str]) -> List[Tuple[int, int, int, str, int]]:
+    """
+    (width, height, EXIF orientation, format, file bytes) per file, from the header
+    alone: JPEGs via jpeg_header() on the first few KB, anything else via
+    Image.open, which parses up to the pixel data and decodes nothing.
+    Width/height are as displayed (after orientation); 0 x 0 if the header is unreadable.
+    """
+    out = []
+    for name in names:
+        path = folder / name
+        try:
+            with open(path, "rb", buffering=0) as fp:
+                nbytes = os.fstat(fp.fileno()).st_size
+                head = fp.read(HEADER_PEEK)
+                fast = jpeg_header(head)
+                if fast is None and head[:2] == b"\xff\xd8" and nbytes > HEADER_PEEK:
+                    fast = jpeg_header(head + fp.read(HEADER_READ - HEADER_PEEK))
+        except OSError:
+            out.append((0, 0, 0, "unreadable", 0))
+            continue
+        if fast is not None:
+            w, h, orient = fast
+            if orient in (5, 6, 7, 8):
+                w, h = h, w
+            out.append((w, h, orient, "JPEG", nbytes))
+            continue
+        try:
+            with Image.open(path) as im:
+                w, h = im.size
+                fmt = im.format or "?"
+                orient = 0
+                # PNG getexif() would decode the whole image looking for a trailing eXIf chunk
+                if not (fmt == "PNG" and "exif" not in im.info):
+                    orient = int(im.getexif().get(EXIF_ORIENTATION, 0) or 0)
+        except Image.DecompressionBombError:
+            out.append((0, 0, 0, "too_large", nbytes))
+            continue
+        except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+            out.append((0, 0, 0, "unreadable", 0))
+            continue
+        if orient in (5, 6, 7, 8):  # 90/270 degree variants
+            w, h = h, w
+        out.append((w, h, orient, fmt, nbytes))
+    return out
 
+def _hist(values: np.ndarray, edges: List[float]) -> List[int]:
+    return np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1).tolist()
+
+def header_stats(rows: List[Tuple[int, int, int, str, int]]) -> Dict[str, Any]:
+    """Histograms + predicted clean_dataset rejects for one class folder."""
+    w = np.array([r[0] for r in rows], dtype=np.int64)
+    h = np.array([r[1] for r in rows], dtype=np.int64)
+    nbytes = np.array([r[4] for r in rows], dtype=np.int64)
+    fmts = [r[3] for r in rows]
+    ok = (w > 0) & (h > 0)
+    w, h = w[ok], h[ok]
+    pixels = w * h
+    aspect = w / np.maximum(h, 1)
+    # Same order as clean_dataset.accept_dims: pixel budget, then min side, then aspect
+    too_large = pixels > MAX_PIXELS
+    too_small = ~too_large & (np.minimum(w, h) < MIN_SIDE)
+    bad_aspect = ~too_large & ~too_small & ((aspect < ASPECT_MIN) | (aspect > ASPECT_MAX))
     return {
-        "crop": crop,
-        "raw": raw_classes,
-        "raw_total": raw_total,
-        "interim": interim_classes,
-        "interim_total": interim_total,
-        "rejects_by_reason": rejects_by_reason,
+        "files": len(rows),
+        "bytes": int(nbytes.sum()),
+        "megapixels": round(float(pixels.sum()) / 1e6, 1),
+        "short_side": _hist(np.minimum(w, h), SIDE_EDGES),
+        "aspect": _hist(aspect, ASPECT_EDGES),
+        "mp": _hist(pixels / 1e6, MP_EDGES),
+        "file_kb": _hist(nbytes[ok] / 1024, KB_EDGES),
+        "format": dict(sorted(Counter(f for f, k in zip(fmts, ok) if k).items())),
+        "orientation": dict(sorted(Counter(str(r[2] or "none") for r, k in zip(rows, ok) if k).items())),
+        "would_reject": {"corrupt": fmts.count("unreadable"),
+                         "too_large": int(too_large.sum()) + fmts.count("too_large"),
+                         "too_small": int(too_small.sum()),
+                         "bad_aspect_ratio": int(bad_aspect.sum())},
     }
 
+def bin_labels(edges: List[float]) -> List[str]:
+    labels = [f"<{edges[0]:g}"]
+    labels += [f"{a:g}-{b:g}" for a, b in zip(edges, edges[1:])]
+    return labels + [f">={edges[-1]:g}"]
+
+# ---------- Incremental cache ----------
+class AuditCache:
+    """
+    Image counts keyed by folder path + mtime, so unchanged class folders are not
+    listed again. Adding, removing or renaming a file bumps its folder's mtime;
+    editing one in place does not, but that doesn't change the count either.
+    Cleaning logs are keyed by size + mtime the same way.
+    """
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.dirs: Dict[str, Dict[str, int]] = {}
+        self.logs: Dict[str, Dict[str, Any]] = {}
+        self.deep: Dict[str, Dict[str, Any]] = {}
+        if path is not None and path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                self.dirs, self.logs = data.get("dirs", {}), data.get("logs", {})
+                # --deep stats are only valid for the bin edges they were built with
+                if data.get("deep_edges") == self._edges():
+                    self.deep = data.get("deep", {})
+            except (OSError, ValueError):
+                pass  # unreadable cache: rescan everything
+        self.seen: set = set()
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    def count(self, folder: Path) -> int:
+        key = str(folder)
+        try:
+            # mtime before listing: a change during the scan shows up as a miss next time
+            mtime = os.stat(folder).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+        rec = self.dirs.get(key)
+        if rec is not None and rec["mtime_ns"] == mtime:
+            with self._lock:
+                self.seen.add(key)
+                self.hits += 1
+            return rec["count"]
+        n = count_images(folder)
+        with self._lock:
+            self.dirs[key] = {"mtime_ns": mtime, "count": n}
+            self.seen.add(key)
+            self.misses += 1
+        return n
+
+    def rejects(self, crop: str) -> Dict[str, Dict[str, int]]:
+        csv_path = INTERIM_ROOT / crop / "_clean_index.csv"
+        key = str(csv_path)
+        try:
+            st = csv_path.stat()
+        except FileNotFoundError:
+            return {}
+        rec = self.logs.get(key)
+        if rec is not None and rec["size"] == st.st_size and rec["mtime_ns"] == st.st_mtime_ns:
+            with self._lock:
+                self.seen.add(key)
+            return rec["rejects"]
+        out = read_rejects_from_csv(crop)
+        with self._lock:
+            self.logs[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "rejects": out}
+            self.seen.add(key)
+        return out
+
+    @staticmethod
+    def _edges() -> List[Any]:
+        return [SIDE_EDGES, ASPECT_EDGES, MP_EDGES, KB_EDGES, MIN_SIDE, MAX_PIXELS]
+
+    def deep_lookup(self, folder: Path) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """(cached header stats or None, folder mtime to store fresh stats under)."""
+        key = str(folder)
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except FileNotFoundError:
+            return None, None
+        rec = self.deep.get(key)
+        with self._lock:
+            self.seen.add(key)
+        if rec is not None and rec["mtime_ns"] == mtime:
+            return rec["stats"], mtime
+        return None, mtime
+
+    def deep_store(self, folder: Path, mtime: int, stats: Dict[str, Any]) -> None:
+        with self._lock:
+            self.deep[str(folder)] = {"mtime_ns": mtime, "stats": stats}
+
+    def save(self) -> None:
+        """Write back what this run saw (folders that disappeared drop out)."""
+        if self.path is None or not self.path.parent.exists():
+            return
+        data = {"dirs": {k: v for k, v in self.dirs.items() if k in self.seen},
+                "logs": {k: v for k, v in self.logs.items() if k in self.seen},
+                "deep_edges": self._edges(),
+                # a plain audit counts every class folder, so it keeps their --deep stats too
+                "deep": {k: v for k, v in self.deep.items() if k in self.seen}}
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, self.path)
+
 # ---------- Main audit ----------
-# Build the union of crop names present in raw/ and interim/
-crops = set()
-if RAW_ROOT.exists():
-    crops.update([d.name for d in RAW_ROOT.iterdir() if d.is_dir()])
-if INTERIM_ROOT.exists():
-    crops.update([d.name for d in INTERIM_ROOT.iterdir() if d.is_dir()])
+def find_crops() -> List[str]:
+    """Union of crop names present in raw/ and interim/ (_rejects, _profile etc. excluded)."""
+    return list_crops(RAW_ROOT, INTERIM_ROOT)
 
-crops = sorted(crops)
+def deep_audit(folders: List[Path], cache: AuditCache, pool: ThreadPoolExecutor) -> Dict[Path, Dict[str, Any]]:
+    """
+    Header stats per class folder. Headers are read in HEADER_CHUNK-file tasks on
+    the shared pool, so one huge class doesn't serialize the run; folders whose
+    mtime is unchanged come from the cache.
+    """
+    out: Dict[Path, Dict[str, Any]] = {}
+    todo = []
+    for folder in folders:
+        stats, mtime = cache.deep_lookup(folder)
+        if stats is not None:
+            out[folder] = stats
+        elif mtime is not None:
+            todo.append((folder, mtime))
+    listings = list(pool.map(lambda fm: list_images(fm[0]), todo))
+    tasks = [(folder, mtime, [pool.submit(read_headers, folder, names[i:i + HEADER_CHUNK])
+                              for i in range(0, len(names), HEADER_CHUNK)])
+             for (folder, mtime), names in zip(todo, listings)]
+    for folder, mtime, futs in tasks:
+        stats = header_stats([row for f in futs for row in f.result()])
+        cache.deep_store(folder, mtime, stats)
+        out[folder] = stats
+    return out
 
-results = [audit_crop_pair(c) for c in crops]
+def run_audit(workers: int = 16, use_cache: bool = True,
+              deep: bool = False) -> Tuple[List[Dict[str, Any]], AuditCache]:
+    """
+    Audit every crop in raw/ and interim/. Folder listings are I/O-bound, so one
+    thread pool lists all crop roots, then counts all class folders, at once.
+    Returns one dict per crop: raw/interim [(class, count), ...], totals, rejects_by_reason,
+    and with deep=True "deep": {class: header stats} for raw/ (see header_stats()).
+    """
+    cache = AuditCache(AUDIT_CACHE if use_cache else None)
+    crops = find_crops()
+    roots = [root / crop for crop in crops for root in (RAW_ROOT, INTERIM_ROOT)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        class_dirs = dict(zip(roots, pool.map(list_class_dirs, roots)))
+        folders = [d for dirs in class_dirs.values() for d in dirs]
+        counts = dict(zip(folders, pool.map(cache.count, folders)))
+        rejects = dict(zip(crops, pool.map(cache.rejects, crops)))
+        raw_folders = [d for crop in crops for d in class_dirs[RAW_ROOT / crop]]
+        headers = deep_audit(raw_folders, cache, pool) if deep else {}
+
+    results = []
+    for crop in crops:
+        raw_classes = [(d.name, counts[d]) for d in class_dirs[RAW_ROOT / crop]]
+        interim_classes = [(d.name, counts[d]) for d in class_dirs[INTERIM_ROOT / crop]]
+        results.append({
+            "crop": crop,
+            "raw": raw_classes,
+            "raw_total": sum(c for _, c in raw_classes),
+            "interim": interim_classes,
+            "interim_total": sum(c for _, c in interim_classes),
+            "rejects_by_reason": rejects[crop],
+        })
+        if deep:
+            results[-1]["deep"] = {d.name: headers[d] for d in class_dirs[RAW_ROOT / crop]}
+    return results, cache
 
 # ---------- Write report ----------
-DOCS_DIR.mkdir(exist_ok=True)
-audit_file = DOCS_DIR / "data_audit.md"
-
-with open(audit_file, "w", encoding="utf-8") as f:
-    f.write("# Dataset Audit\n\n")
-    f.write(f"- **RAW root**: `{RAW_ROOT}`\n")
-    f.write(f"- **INTERIM root**: `{INTERIM_ROOT}`\n\n")
-
-    for r in results:
-        crop = r["crop"]
-        f.write(f"## {nice_name(crop)}\n\n")
-
-        # RAW
-        f.write("### Raw\n")
-        if r["raw"]:
-            for cls, cnt in r["raw"]:
-                f.write(f"- **{nice_name(cls)}**: {cnt} images\n")
-            f.write(f"\n**Total (raw)**: {r['raw_total']} images\n\n")
-        else:
-            f.write("_No raw data found._\n\n")
-
-        # INTERIM
-        f.write("### Interim (cleaned)\n")
-        if r["interim"]:
-            for cls, cnt in r["interim"]:
-                f.write(f"- **{nice_name(cls)}**: {cnt} images\n")
-            f.write(f"\n**Total (interim)**: {r['interim_total']} images\n\n")
-        else:
-            f.write("_No interim data found._\n\n")
-
-        # REJECTS (from CSV)
-        rej = r["rejects_by_reason"]
-        if rej:
-            f.write("### Rejects (from cleaning log)\n")
-            # per class breakdown
-            total_rej = 0
-            for cls in sorted(rej.keys()):
-                reasons = rej[cls]
-                cls_total = sum(reasons.values())
-                total_rej += cls_total
-                pretty = ", ".join([f"{nice_name(reason)}: {count}" for reason, count in sorted(reasons.items())])
-                f.write(f"- **{nice_name(cls)}**: {cls_total} ({pretty})\n")
-            f.write(f"\n**Total rejects (logged)**: {total_rej}\n\n")
-
-        f.write("\n")
-
-print(f"\n✅ Audit results written to {audit_file}")
+def write_markdown(results: List[Dict[str, Any]], audit_file: Path) -> None:
+    with open(audit_file, "w", encoding="utf-8") as f:
+        f.write("# Dataset Audit\n\n")
+        f.write(f"- **RAW root**: `{RAW_ROOT}`\n")
+        f.write(f"- **INTERIM root**: `{INTERIM_ROOT}`\n\n")
+
+        for r in results:
+            crop = r["crop"]
+            f.write(f"## {nice_name(crop)}\n\n")
+
+            # RAW
+            f.write("### Raw\n")
+            if r["raw"]:
+                for cls, cnt in r["raw"]:
+                    f.write(f"- **{nice_name(cls)}**: {cnt} images\n")
+                f.write(f"\n**Total (raw)**: {r['raw_total']} images\n\n")
+            else:
+                f.write("_No raw data found._\n\n")
+
+            # INTERIM
+            f.write("### Interim (cleaned)\n")
+            if r["interim"]:
+                for cls, cnt in r["interim"]:
+                    f.write(f"- **{nice_name(cls)}**: {cnt} images\n")
+                f.write(f"\n**Total (interim)**: {r['interim_total']} images\n\n")
+            else:
+                f.write("_No interim data found._\n\n")
+
+            # REJECTS (from CSV)
+            rej = r["rejects_by_reason"]
+            if rej:
+                f.write("### Rejects (from cleaning log)\n")
+                # per class breakdown
+                total_rej = 0
+                for cls in sorted(rej.keys()):
+                    reasons = rej[cls]
+                    cls_total = sum(reasons.values())
+                    total_rej += cls_total
+                    pretty = ", ".join([f"{nice_name(reason)}: {count}" for reason, count in sorted(reasons.items())])
+                    f.write(f"- **{nice_name(cls)}**: {cls_total} ({pretty})\n")
+                f.write(f"\n**Total rejects (logged)**: {total_rej}\n\n")
+
+            if r.get("deep"):
+                write_deep_markdown(f, r["deep"])
+
+            f.write("\n")
+
+def _md_table(f, title: str, columns: List[str], rows: List[Tuple[str, List[Any]]]) -> None:
+    f.write(f"**{title}**\n\n")
+    f.write("| Class | " + " | ".join(columns) + " |\n")
+    f.write("|---|" + "---:|" * len(columns) + "\n")
+    for name, cells in rows:
+        f.write(f"| {nice_name(name)} | " + " | ".join(str(c) for c in cells) + " |\n")
+    f.write("\n")
+
+def write_deep_markdown(f, deep: Dict[str, Dict[str, Any]]) -> None:
+    """Compact per-class histograms for one crop's raw/ (headers only)."""
+    f.write("### Raw header statistics\n\n")
+    classes = list(deep.items())
+    _md_table(f, "Overview", ["Files", "MB", "Megapixels"],
+              [(c, [s["files"], round(s["bytes"] / 1e6, 1), s["megapixels"]]) for c, s in classes])
+    reasons = ["corrupt", "too_large", "too_small", "bad_aspect_ratio"]
+    _md_table(f, f"Would reject (MIN_SIDE={MIN_SIDE}, AR=({ASPECT_MIN}, {ASPECT_MAX}))",
+              [nice_name(x) for x in reasons] + ["Kept"],
+              [(c, [s["would_reject"][x] for x in reasons]
+                + [s["files"] - sum(s["would_reject"].values())]) for c, s in classes])
+    for key, title, edges in (("short_side", "Short side (px)", SIDE_EDGES),
+                              ("aspect", "Aspect ratio (w/h)", ASPECT_EDGES),
+                              ("mp", "Megapixels", MP_EDGES),
+                              ("file_kb", "File size (KB)", KB_EDGES)):
+        _md_table(f, title, bin_labels(edges), [(c, s[key]) for c, s in classes])
+    for key, title in (("format", "Format"), ("orientation", "EXIF orientation")):
+        cols = sorted({k for _, s in classes for k in s[key]})
+        _md_table(f, title, cols, [(c, [s[key].get(k, 0) for k in cols]) for c, s in classes])
+
+def write_json(results: List[Dict[str, Any]], json_file: Path) -> None:
+    """Same numbers as data_audit.md for scripts: classes keep the report's order."""
+    data = {
+        "raw_root": str(RAW_ROOT),
+        "interim_root": str(INTERIM_ROOT),
+        "crops": [{
+            "crop": r["crop"],
+            "raw": dict(r["raw"]),
+            "raw_total": r["raw_total"],
+            "interim": dict(r["interim"]),
+            "interim_total": r["interim_total"],
+            "rejects_by_reason": {cls: dict(sorted(reasons.items()))
+                                  for cls, reasons in sorted(r["rejects_by_reason"].items())},
+            **({"deep": r["deep"]} if "deep" in r else {}),
+        } for r in results],
+        "totals": {"raw": sum(r["raw_total"] for r in results),
+                   "interim": sum(r["interim_total"] for r in results)},
+    }
+    if any("deep" in r for r in results):
+        data["deep_bins"] = {"short_side": bin_labels(SIDE_EDGES), "aspect": bin_labels(ASPECT_EDGES),
+                             "mp": bin_labels(MP_EDGES), "file_kb": bin_labels(KB_EDGES)}
+    with open(json_file, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, indent=2)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Count raw/interim images per crop and class -> docs/data_audit.{md,json}")
+    parser.add_argument("--workers", type=int, default=16, help="threads listing folders in parallel")
+    parser.add_argument("--deep", action="store_true",
+                        help="Also read raw/ image headers: resolution, aspect, size, format, "
+                             "EXIF orientation histograms and predicted cleaning rejects")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Ignore {AUDIT_CACHE.name} and list every folder")
+    args = parser.parse_args()
+
+    print("Project root:", PROJECT_ROOT)
+    print("Using .env at:", ENV_PATH)
+    print("RAW root:", RAW_ROOT, "exists:", RAW_ROOT.exists())
+    print("INTERIM root:", INTERIM_ROOT, "exists:", INTERIM_ROOT.exists())
+
+    t0 = time.perf_counter()
+    results, cache = run_audit(args.workers, use_cache=not args.no_cache, deep=args.deep)
+    cache.save()
+    elapsed = time.perf_counter() - t0
+
+    DOCS_DIR.mkdir(exist_ok=True)
+    audit_file = DOCS_DIR / "data_audit.md"
+    json_file = DOCS_DIR / "data_audit.json"
+    write_markdown(results, audit_file)
+    write_json(results, json_file)
+
+    print(f"\nScanned {cache.hits + cache.misses} class folders in {elapsed:.2f}s "
+          f"({cache.misses} listed, {cache.hits} unchanged since the last audit)")
+    print(f"✅ Audit results written to {audit_file}\n   JSON: {json_file}")
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+from synth_dataset import SynthSpec, generate  # noqa: E402
+
+ML_SERVER = Path(__file__).resolve().parents[1]
+
+@pytest.fixture
+def dataset(tmp_path):
+    generate(tmp_path, SynthSpec(crops=("rice",), classes=("healthy",), per_class=8))
+    return tmp_path
+
+def clean(dataset: Path, *args: str) -> str:
+    env = {**os.environ, "DATASET_PATH": str(dataset), "INTERIM_PATH": str(dataset / "out")}
+    return subprocess.run([sys.executable, str(ML_SERVER / "clean_dataset.py"), "--crop", "rice", *args],
+                          cwd=ML_SERVER, env=env, check=True, capture_output=True, text=True,
+                          timeout=300).stdout
+
+def kept_files(dataset: Path):
+    return sorted((dataset / "out" / "interim" / "rice" / "healthy").glob("*.jpg"))
+
+def test_dry_run_does_not_make_real_run_skip_work(dataset):
+    clean(dataset, "--dry-run")
+    assert not kept_files(dataset)
+    out = clean(dataset)
+    assert "0 unchanged" in out
+    kept = kept_files(dataset)
+    assert kept and all(Image.open(p).size for p in kept)
+
+def test_truncated_output_is_rewritten(dataset):
+    clean(dataset)
+    victim = kept_files(dataset)[0]
+    size = victim.stat().st_size
+    with open(victim, "r+b") as fp:
+        fp.truncate(100)
+    clean(dataset)
+    assert victim.stat().st_size == size
+    Image.open(victim).load()
+    assert not list((dataset / "out").rglob("*.tmp"))
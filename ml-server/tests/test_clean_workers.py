@@ -0,0 +1,41 @@
+import csv
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+from synth_dataset import SynthSpec, generate  # noqa: E402
+
+ML_SERVER = Path(__file__).resolve().parents[1]
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    root = tmp_path_factory.mktemp("synth")
+    generate(root, SynthSpec(crops=("rice", "tomato"), classes=("healthy", "leaf_blast"), per_class=16))
+    return root
+
+def clean(dataset: Path, name: str, crops, *args: str):
+    """Run clean_dataset.py into <dataset>/<name>; index rows per crop with the output root stripped."""
+    out = dataset / name
+    env = {**os.environ, "DATASET_PATH": str(dataset), "INTERIM_PATH": str(out)}
+    # A hang (e.g. a worker forked while pipeline threads hold locks) fails here instead of blocking CI
+    subprocess.run([sys.executable, str(ML_SERVER / "clean_dataset.py"), "--with-blur", "--no-cache", *args],
+                   cwd=ML_SERVER, env=env, check=True, capture_output=True, timeout=300)
+    rows = {}
+    for crop in crops:
+        with open(out / "interim" / crop / "_clean_index.csv", newline="", encoding="utf-8") as fp:
+            rows[crop] = [[v.replace(str(out), "<out>") for v in row] for row in csv.reader(fp)]
+    return rows
+
+def test_workers_match_serial_single_crop(dataset):
+    serial = clean(dataset, "serial_rice", ["rice"], "--crop", "rice")
+    assert clean(dataset, "parallel_rice", ["rice"], "--crop", "rice", "--workers", "2") == serial
+    assert any(row[4] == "near_duplicate" for row in serial["rice"])
+
+def test_workers_match_serial_all_crops(dataset):
+    crops = ["rice", "tomato"]
+    serial = clean(dataset, "serial_all", crops, "--all-crops")
+    assert clean(dataset, "parallel_all", crops, "--all-crops", "--workers", "2") == serial
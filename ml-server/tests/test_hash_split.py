@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from prepare_v1 import hash_split
+
+def pairs_for(cls, ids):
+    return [(Path(f"/interim/rice/{cls}/{cls}_{i:032x}.jpg"), "Diseased") for i in ids]
+
+def assignments(pairs):
+    train, val, test = hash_split(pairs)
+    return {p: split for split, (paths, _) in (("train", train), ("val", val), ("test", test)) for p in paths}
+
+def test_deterministic_and_proportional():
+    pairs = pairs_for("brown_spot", range(200)) + pairs_for("leaf_blast", range(1000, 1100))
+    first = assignments(pairs)
+    assert first == assignments(list(reversed(pairs)))  # input order doesn't matter
+    counts = {s: sum(1 for v in first.values() if v == s) for s in ("train", "val", "test")}
+    assert counts == {"train": 210, "val": 60, "test": 30}
+
+def test_adding_images_moves_few():
+    old = pairs_for("brown_spot", range(500))
+    new = old + pairs_for("brown_spot", range(5000, 5050))  # +10%
+    before, after = assignments(old), assignments(new)
+    moved = sum(1 for p, split in before.items() if after[p] != split)
+    # Only images near the two cut points can shift; a random re-split would move ~45%
+    assert moved <= 50
+
+def test_small_class_gets_every_split():
+    train, val, test = hash_split(pairs_for("healthy", range(3)))
+    assert (len(train[0]), len(val[0]), len(test[0])) == (1, 1, 1)
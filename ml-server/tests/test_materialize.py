@@ -0,0 +1,46 @@
+import errno
+import os
+
+import pytest
+
+from materialize import materialize
+
+@pytest.fixture
+def src(tmp_path):
+    p = tmp_path / "src.jpg"
+    p.write_bytes(b"image bytes")
+    return p
+
+@pytest.mark.parametrize("mode", ["copy", "hardlink", "symlink"])
+def test_modes_and_rerun(src, tmp_path, mode):
+    dst = tmp_path / "out" / "dst.jpg"
+    assert materialize(src, dst, mode) == mode
+    assert materialize(src, dst, mode) == mode  # idempotent
+    assert dst.read_bytes() == b"image bytes"
+    assert dst.is_symlink() == (mode == "symlink")
+
+def test_manifest_only_writes_nothing(src, tmp_path):
+    dst = tmp_path / "out" / "dst.jpg"
+    assert materialize(src, dst, "manifest-only") == "manifest-only"
+    assert not dst.parent.exists()
+
+def test_refused_link_falls_back_to_copy(src, tmp_path, monkeypatch):
+    def cross_device(*_args):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+    monkeypatch.setattr(os, "link", cross_device)
+    dst = tmp_path / "dst.jpg"
+    assert materialize(src, dst, "hardlink") == "copy"
+    assert dst.read_bytes() == b"image bytes" and not dst.is_symlink()
+
+def test_other_errors_are_not_swallowed(src, tmp_path, monkeypatch):
+    def broken(*_args):
+        raise OSError(errno.EIO, "I/O error")
+    monkeypatch.setattr(os, "link", broken)
+    with pytest.raises(OSError):
+        materialize(src, tmp_path / "dst.jpg", "hardlink")
+
+def test_mode_switch_replaces_link_with_copy(src, tmp_path):
+    dst = tmp_path / "dst.jpg"
+    materialize(src, dst, "symlink")
+    assert materialize(src, dst, "copy") == "copy"
+    assert not dst.is_symlink() and dst.read_bytes() == b"image bytes"
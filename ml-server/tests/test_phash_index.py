@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from phash_index import PHashIndex, popcount
+
+def brute_force(stored, x, radius):
+    return sorted(d for d in (popcount(x ^ h) for h in stored) if d <= radius)
+
+def make_hashes(n, seed):
+    """Random 64-bit hashes plus near copies (1..8 bits flipped) so every radius has hits."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        if out and rng.random() < 0.4:
+            x = rng.choice(out)
+            for b in rng.sample(range(64), rng.randint(1, 8)):
+                x ^= 1 << b
+        else:
+            x = rng.getrandbits(64)
+        out.append(x)
+    return out
+
+@pytest.mark.parametrize("radius", [0, 1, 3, 5, 8])
+def test_query_matches_brute_force(radius):
+    stored = make_hashes(400, seed=radius)
+    idx = PHashIndex(radius=radius)
+    for i, h in enumerate(stored):
+        idx.add(h, i)
+    for x in make_hashes(200, seed=100 + radius) + stored[:50]:
+        expected = brute_force(stored, x, radius)
+        assert [d for d, _ in idx.query(x)] == expected
+        assert idx.any_within(x) == bool(expected)
+
+def test_wider_query_radius_falls_back_to_scan():
+    stored = make_hashes(300, seed=7)
+    idx = PHashIndex(radius=2)
+    for h in stored:
+        idx.add(h)
+    for x in make_hashes(100, seed=8):
+        assert [d for d, _ in idx.query(x, radius=10)] == brute_force(stored, x, 10)
+
+def test_hex_strings_and_payloads():
+    idx = PHashIndex(radius=5)
+    idx.add("ffffffffffffffff", "a.jpg")
+    idx.add(0, "b.jpg")
+    assert idx.query("fffffffffffffff0") == [(4, "a.jpg")]
+    assert not idx.any_within("00000000ffffffff")
+    assert len(idx) == 2
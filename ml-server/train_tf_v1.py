@@ -1,20 +1,52 @@
 import os
+import json
+import argparse
 import numpy as np
 import pandas as pd
-from pathlib import Path
 import tensorflow as tf
 
+from input_pipeline import (AUTOTUNE, LoaderConfig, benchmark_configs, benchmark_input,
+                            make_dataset, print_benchmark, select_source)
+from prepare_v1 import PROCESSED_ROOT  # PROCESSED_PATH / INTERIM_PATH / DATASET_PATH from .env
+
 # ===================== USER CONFIG =====================
-PROCESSED_ROOT = Path("/home/sanjana/datasets/agritech_work/processed")
-CROP = "tomato"  # or "rice"
+CROP = "tomato"  # or "rice"; --crop overrides
 IMG_SIZE = (160, 160)   # smaller to save memory
 BATCH_SIZE = 16         # smaller batches
 SEED = 42
 EPOCHS = 15
 # ======================================================
 
+parser = argparse.ArgumentParser(description="Train the v1 Healthy/Diseased classifier")
+parser.add_argument("--crop", default=CROP, help="processed/<crop> to train on (e.g., tomato, rice)")
+parser.add_argument("--cache", choices=["none", "memory", "file"], default="none",
+                    help="Cache decoded images in RAM or in a file under <crop>/_tfdata_cache")
+parser.add_argument("--cache-dir", default="", help="Directory for --cache file")
+parser.add_argument("--prefetch", type=int, default=AUTOTUNE,
+                    help="Batches to prefetch (0 = off, -1 = autotune)")
+parser.add_argument("--parallel", type=int, default=AUTOTUNE,
+                    help="Parallel decode calls (-1 = autotune)")
+parser.add_argument("--shuffle-buffer", type=int, default=0,
+                    help="Shuffle buffer in images (0 = as much as the RAM budget allows)")
+parser.add_argument("--ram-budget-mb", type=int, default=1024,
+                    help="RAM for the memory cache, shuffle buffer and prefetch together")
+parser.add_argument("--benchmark-input", action="store_true",
+                    help="Measure input images/sec over a cache/prefetch/parallel grid and exit (no model)")
+parser.add_argument("--benchmark-epochs", type=int, default=2)
+parser.add_argument("--head-only", action="store_true",
+                    help="Run the frozen backbone once per image, cache pooled embeddings and "
+                         "train/evaluate only the Dense head on them")
+parser.add_argument("--aug-views", type=int, default=0,
+                    help="--head-only: extra augmented views of each train image to embed")
+parser.add_argument("--dropout", type=float, default=0.2)
+parser.add_argument("--lr", type=float, default=1e-3)
+args = parser.parse_args()
+loader_cfg = LoaderConfig(cache=args.cache, cache_dir=args.cache_dir, prefetch=args.prefetch,
+                          parallel=args.parallel, shuffle_buffer=args.shuffle_buffer,
+                          ram_budget_mb=args.ram_budget_mb)
+
 print("TensorFlow:", tf.__version__)
-ROOT = PROCESSED_ROOT / CROP
+ROOT = PROCESSED_ROOT / args.crop.strip().lower()
 MANIFEST = ROOT / "manifest.csv"
 
 if not MANIFEST.exists():
@@ -28,34 +60,30 @@ print("\nManifest head:\n", df.head())
 class_names = ["Healthy", "Diseased"]
 class_to_idx = {cls: i for i, cls in enumerate(class_names)}
 
-# --- 2) Make TensorFlow datasets from manifest ---
-def make_dataset(df_split, shuffle=True):
-    paths = [str(ROOT / row.filepath.split(f"{CROP}/",1)[1]) for _, row in df_split.iterrows()]
-    labels = [class_to_idx[row["class"]] for _, row in df_split.iterrows()]
-
-    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
-
-    def _load_img(path, label):
-        img = tf.io.read_file(path)
-        img = tf.io.decode_jpeg(img, channels=3)  # force RGB
-        img = tf.image.resize(img, IMG_SIZE)
-        img.set_shape((*IMG_SIZE, 3))             # enforce static shape
-        return img, label
-
-    ds = ds.map(_load_img, num_parallel_calls=tf.data.AUTOTUNE)
-    if shuffle:
-        ds = ds.shuffle(buffer_size=200, seed=SEED)  # smaller buffer
-    # batch without prefetch (save RAM)
-    ds = ds.batch(BATCH_SIZE, drop_remainder=True)
-    return ds
+# --- 2) Make TensorFlow datasets (see input_pipeline.py for the layouts it can read) ---
+source = select_source(ROOT, IMG_SIZE)
+print(f"\nInput images: {source.describe()}")
+print(f"Loader: {loader_cfg.label()}, RAM budget {loader_cfg.ram_budget_mb} MB")
+
+if args.benchmark_input:
+    results = benchmark_input(source, benchmark_configs(loader_cfg), split="train",
+                              batch_size=BATCH_SIZE, epochs=args.benchmark_epochs, seed=SEED)
+    print_benchmark(source, results)
+    out_json = ROOT / "input_benchmark.json"
+    with open(out_json, "w", encoding="utf-8") as fp:
+        json.dump({"source": source.describe(), "batch_size": BATCH_SIZE, "results": results}, fp, indent=2)
+    print(f"  Saved: {out_json}")
+    raise SystemExit(0)
 
 train_df = df[df["split"] == "train"]
 val_df   = df[df["split"] == "val"]
 test_df  = df[df["split"] == "test"]
 
-train_ds = make_dataset(train_df, shuffle=True)
-val_ds   = make_dataset(val_df, shuffle=False)
-test_ds  = make_dataset(test_df, shuffle=False)
+train_ds = make_dataset(source, "train", loader_cfg, shuffle=True, batch_size=BATCH_SIZE, seed=SEED)
+val_ds   = make_dataset(source, "val", loader_cfg, shuffle=False, batch_size=BATCH_SIZE, seed=SEED)
+# Evaluation scores every test image once: keep the last partial batch, carry filepaths
+test_ds  = make_dataset(source, "test", loader_cfg, shuffle=False, batch_size=BATCH_SIZE, seed=SEED,
+                        drop_remainder=False, with_keys=True)
 
 print("\nCounts from manifest:")
 print(train_df["class"].value_counts())
@@ -96,12 +124,12 @@ x = data_augment(inputs)
 x = tf.keras.layers.Lambda(preprocess)(x)
 x = base(x, training=False)
 x = tf.keras.layers.GlobalAveragePooling2D()(x)
-x = tf.keras.layers.Dropout(0.2)(x)
-outputs = tf.keras.layers.Dense(2, activation="softmax")(x)
+x = tf.keras.layers.Dropout(args.dropout, name="head_dropout")(x)
+outputs = tf.keras.layers.Dense(2, activation="softmax", name="head")(x)
 model = tf.keras.Model(inputs, outputs)
 
 model.compile(
-    optimizer=tf.keras.optimizers.Adam(1e-3),
+    optimizer=tf.keras.optimizers.Adam(args.lr),
     loss="sparse_categorical_crossentropy",
     metrics=[tf.keras.metrics.SparseCategoricalAccuracy(name="acc")],
 )
@@ -118,35 +146,64 @@ callbacks = [
 ]
 
 # --- 6) Train ---
-history = model.fit(
-    train_ds,
-    validation_data=val_ds,
-    epochs=EPOCHS,
-    class_weight=class_weight,
-    callbacks=callbacks,
-)
-
-# --- 7) Evaluate ---
-test_metrics = model.evaluate(test_ds, return_dict=True)
-print("\nTest metrics:", test_metrics)
-
-# --- 8) Confusion matrix + classification report ---
-y_true, y_prob = [], []
-for imgs, labels in test_ds:
-    probs = model.predict(imgs, verbose=0)
-    y_prob.append(probs)
-    y_true.append(labels.numpy())
-
-y_true = np.concatenate(y_true, axis=0)
-y_prob = np.concatenate(y_prob, axis=0)
-y_pred = np.argmax(y_prob, axis=1)
-
-cm = tf.math.confusion_matrix(y_true, y_pred, num_classes=2).numpy()
-print("\nConfusion matrix:\n", cm)
-
-try:
-    from sklearn.metrics import classification_report
-    print("\nClassification report (Healthy=0, Diseased=1):")
-    print(classification_report(y_true, y_pred, target_names=class_names, digits=4))
-except Exception:
-    print("\n(sklearn not available) Simple metrics only.")
+if args.head_only:
+    # Backbone runs once per image (per view); every epoch after that is a tiny Dense fit
+    from embedding_cache import cache_dir_for, embedding_model, load_keys, load_or_build, make_head
+
+    tf.keras.utils.set_random_seed(SEED)  # fixed augmentation views
+    views = 1 + max(0, args.aug_views)
+    emb_dir = cache_dir_for(ROOT, source.manifest_sha1, "mobilenet_v2_imagenet", IMG_SIZE, views)
+    print(f"\nEmbeddings: {emb_dir} ({'cached' if (emb_dir / 'meta.json').exists() else 'building'})")
+    # Every image exactly once, in order: no shuffle, keep the last partial batch
+    emb_sets = {split: make_dataset(source, split, loader_cfg, shuffle=False, batch_size=BATCH_SIZE,
+                                    seed=SEED, drop_remainder=False, verbose=False, with_keys=True)
+                for split in ("train", "val", "test")}
+    feats = load_or_build(emb_dir, emb_sets, embedding_model(base, IMG_SIZE, preprocess),
+                          augment=data_augment, views=views,
+                          meta={"backbone": "mobilenet_v2_imagenet", "img_size": list(IMG_SIZE),
+                                "manifest_sha1": source.manifest_sha1})
+    (xtr, ytr), (xv, yv), (xte, yte) = feats["train"], feats["val"], feats["test"]
+
+    head = make_head(xtr.shape[1], args.dropout)
+    head.compile(
+        optimizer=tf.keras.optimizers.Adam(args.lr),
+        loss="sparse_categorical_crossentropy",
+        metrics=[tf.keras.metrics.SparseCategoricalAccuracy(name="acc")],
+    )
+    history = head.fit(
+        xtr.astype(np.float32), ytr,
+        validation_data=(xv.astype(np.float32), yv),
+        batch_size=BATCH_SIZE,
+        epochs=EPOCHS,
+        shuffle=True,
+        class_weight=class_weight,
+        callbacks=[tf.keras.callbacks.EarlyStopping(patience=3, restore_best_weights=True,
+                                                    monitor="val_acc")],
+    )
+    # Drop the trained head into the full classifier so best_model.keras works as usual
+    model.get_layer("head").set_weights(head.get_layer("head").get_weights())
+    model.save(ROOT / "best_model.keras")
+else:
+    history = model.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=EPOCHS,
+        class_weight=class_weight,
+        callbacks=callbacks,
+    )
+
+# --- 7) Evaluate: one pass over test, every sample, per-sample predictions on disk ---
+from evaluate import array_batches, evaluate_stream, print_report, save_report, tf_batches
+
+pred_csv = ROOT / "predictions_test.csv"
+if args.head_only:
+    test_batches = array_batches(xte, yte, load_keys(emb_dir, "test"), BATCH_SIZE)
+    predict = lambda x: head(x, training=False).numpy()
+else:
+    test_batches = tf_batches(test_ds)
+    predict = lambda x: model(x, training=False).numpy()
+report = evaluate_stream(test_batches, predict, pred_csv)
+print_report(report)
+save_report(report, ROOT / "eval_test.json", split="test", source=source.describe(),
+            head_only=bool(args.head_only))
+print(f"\nPredictions: {pred_csv}")
@@ -0,0 +1,28 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, List
+
+# ---------------- All-crops work units ----------------
+# --all-crops runs every crop in one process: each (crop, class) becomes a work unit,
+# all units go onto one shared worker pool, largest first, so a crop with few classes
+# no longer leaves workers idle and the biggest class doesn't start last and decide
+# the tail. Outputs stay per crop and in the same order as a single-crop run.
+
+@dataclass
+class WorkUnit:
+    crop: str
+    cls: str
+    items: List[Any] = field(default_factory=list)
+    cost: int = 0  # bytes still to be processed; cached / skipped items add nothing
+
+def list_crops(*roots: Path) -> List[str]:
+    """Crop folders under any of roots ("_rejects", "_pipeline", dotfiles excluded)."""
+    names = set()
+    for root in roots:
+        if root.is_dir():
+            names |= {d.name for d in root.iterdir() if d.is_dir() and not d.name.startswith(("_", "."))}
+    return sorted(names)
+
+def largest_first(units: List[WorkUnit]) -> List[WorkUnit]:
+    """Longest-processing-time order: cost, then item count, ties by name."""
+    return sorted(units, key=lambda u: (-u.cost, -len(u.items), u.crop, u.cls))